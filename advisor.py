@@ -0,0 +1,161 @@
+import re
+
+
+_SCORE_PATTERN = re.compile(r"([^,:]+):\s*(-?\d+)")
+
+
+def parse_qa_scores(qa_scores):
+    """
+    Returns QA scores as a dict, whether they are already one or rendered as in the prompts ("Security: 1, ...").
+
+    Args:
+        qa_scores (dict or str): The QA scores.
+
+    Returns:
+        dict: The score of each quality attribute.
+    """
+    if isinstance(qa_scores, dict):
+        return qa_scores
+    return {attr.strip(): int(score) for attr, score in _SCORE_PATTERN.findall(qa_scores or "")}
+
+
+class Advice:
+    """
+    Evaluation of one design option by the RuleBasedAdvisor.
+
+    Attributes:
+        option (str): The name of the option.
+        deficit (int): Total amount by which the QA scores it affects end up below zero.
+        negative_attributes (list): The quality attributes it leaves negative.
+        score_gain (int): Change of the game score (stakeholder satisfaction) it causes, ignoring the negative rule.
+        weighted_impact (int): Sum of its impacts weighted by the stakeholders' priorities.
+    """
+    def __init__(self, option, deficit, negative_attributes, score_gain, weighted_impact):
+        """
+        Initializes an Advice object.
+
+        Args:
+            option (str): The name of the option.
+            deficit (int): Total amount by which the QA scores it affects end up below zero.
+            negative_attributes (list): The quality attributes it leaves negative.
+            score_gain (int): Change of the game score it causes.
+            weighted_impact (int): Sum of its impacts weighted by the stakeholders' priorities.
+        """
+        self.option = option
+        self.deficit = deficit
+        self.negative_attributes = negative_attributes
+        self.score_gain = score_gain
+        self.weighted_impact = weighted_impact
+
+
+class RuleBasedAdvisor:
+    """
+    Deterministic local advisor, used when the LLM does not answer in time and usable on its own.
+
+    Options are ranked by negative-score risk first (a game with a negative QA score is lost), then by the score
+    they add right away, then by their impacts weighted by the stakeholders' priorities. Ranking a card takes a few
+    microseconds.
+
+    Attributes:
+        stakeholder_cards (list): The stakeholders whose priorities weight the impacts.
+        weights (dict): Sum of the stakeholders' priorities per quality attribute.
+
+    Methods:
+        rank(design_options, qa_scores): Returns the evaluation of every option, best first.
+        best(design_options, qa_scores): Returns the name of the best option.
+        explain(design_options, qa_scores): Returns the best option and its rationale.
+        suggest(design_options, qa_scores): Returns the best option and its rationale as a suggestion text.
+    """
+
+    def __init__(self, stakeholder_cards):
+        """
+        Initializes the advisor.
+
+        Args:
+            stakeholder_cards (list): The stakeholders whose priorities weight the impacts.
+        """
+        self.stakeholder_cards = stakeholder_cards
+        self.weights = {}
+        self._priorities = {}
+        for stakeholder in stakeholder_cards:
+            for attr, priority in stakeholder.quality_attributes.items():
+                self.weights[attr] = self.weights.get(attr, 0) + priority
+                self._priorities.setdefault(attr, []).append(priority)
+
+    def _evaluate(self, option, impacts, qa_scores):
+        deficit = gain = weighted = 0
+        negative = []
+        for attr, impact in impacts.items():
+            old = qa_scores.get(attr, 0)
+            new = old + impact
+            if new < 0:
+                deficit -= new
+                negative.append(attr)
+            weighted += self.weights.get(attr, 0) * impact
+            for priority in self._priorities.get(attr, ()):
+                gain += max(0, new - priority) - max(0, old - priority)
+        return Advice(option, deficit, negative, gain, weighted)
+
+    def rank(self, design_options, qa_scores):
+        """
+        Evaluates every design option in the current game state.
+
+        Args:
+            design_options (dict): The impacts of each option, keyed by name, as returned by ConcernCard.design_options.
+            qa_scores (dict or str): The current QA scores, or their prompt rendering.
+
+        Returns:
+            list: The Advice of every option, best first. Ties keep the order of the card.
+        """
+        qa_scores = parse_qa_scores(qa_scores)
+        advices = [self._evaluate(option, impacts, qa_scores) for option, impacts in design_options.items()]
+        return sorted(advices, key=lambda advice: (advice.deficit, -advice.score_gain, -advice.weighted_impact))
+
+    def best(self, design_options, qa_scores):
+        """
+        Returns the name of the best design option.
+
+        Args:
+            Same as rank.
+
+        Returns:
+            str: The name of the best option.
+        """
+        return self.rank(design_options, qa_scores)[0].option
+
+    def explain(self, design_options, qa_scores):
+        """
+        Returns the best design option with the reasons of its ranking.
+
+        Args:
+            Same as rank.
+
+        Returns:
+            tuple: The name of the best option and its rationale.
+        """
+        ranking = self.rank(design_options, qa_scores)
+        best = ranking[0]
+        if best.negative_attributes:
+            risk = (f"it leaves {', '.join(best.negative_attributes)} negative, "
+                    f"with the smallest deficit of all options")
+        else:
+            risk = "it keeps every quality attribute it affects non-negative"
+        reasons = [risk, f"it changes the stakeholders' satisfaction by {best.score_gain:+d}",
+                   f"its priority-weighted impact is {best.weighted_impact:+d}"]
+        if len(ranking) > 1:
+            reasons.append(f"the next best option is {ranking[1].option}")
+        rationale = "; ".join(reasons)
+        return best.option, f"{rationale[0].upper()}{rationale[1:]}."
+
+    def suggest(self, design_options, qa_scores):
+        """
+        Returns the best design option with a short rationale, worded like an assistant suggestion.
+
+        Args:
+            Same as rank.
+
+        Returns:
+            str: The suggestion.
+        """
+        option, rationale = self.explain(design_options, qa_scores)
+        return f"Suggested design option: {option}. Rationale (rule-based): {rationale}"
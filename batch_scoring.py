@@ -0,0 +1,142 @@
+import numpy as np
+
+from models import Vocabulary
+
+
+def impact_vector(vocabulary, impacts, dtype=np.int32):
+    """
+    Packs a {quality attribute: value} dict into a vector indexed by the codes of a vocabulary. Every attribute must
+    already have a code.
+
+    Args:
+        vocabulary (models.Vocabulary): The quality attribute columns.
+        impacts (dict): The value of each quality attribute.
+        dtype (numpy.dtype): The type of the vector.
+
+    Returns:
+        numpy.ndarray: A vector of length len(vocabulary), zero for the attributes not in impacts.
+    """
+    vector = np.zeros(len(vocabulary), dtype=dtype)
+    for name, value in impacts.items():
+        vector[vocabulary.code(name)] = value
+    return vector
+
+
+class BatchScorer:
+    """
+    Scores many candidate decision sequences of one game setup at once with NumPy.
+
+    The design options of every concern card are packed into an impact matrix and the stakeholder priorities into
+    a priority matrix, both indexed by the codes of a models.Vocabulary of the game's quality attributes; it is
+    local to the scorer, so that the matrices only have the columns of this game. A candidate sequence is a row of
+    option indices, one per concern card (-1 when the card is not played), so N sequences are scored with a few
+    array operations instead of N dict loops. The scoring rules are the ones of DecidArchGame.calculate_score.
+
+    Attributes:
+        vocabulary (models.Vocabulary): The quality attribute columns.
+        option_names (list): For each concern card, the names of its options in index order.
+        impact_matrix (numpy.ndarray): (options + 1, attributes) impacts of every option, with a zero last row.
+        option_offsets (numpy.ndarray): Row of the first option of each concern card in impact_matrix.
+        priority_matrix (numpy.ndarray): (stakeholders, attributes) priority of each stakeholder.
+        priority_mask (numpy.ndarray): (stakeholders, attributes) True where the stakeholder cares about the attribute.
+
+    Methods:
+        qa_scores(selections): Returns the QA totals of each candidate sequence.
+        score(selections): Returns the game score of each candidate sequence.
+        all_selections(): Returns every possible sequence that plays all concern cards.
+    """
+
+    def __init__(self, stakeholder_cards, concern_cards):
+        """
+        Packs the stakeholder priorities and the concern cards' options into matrices.
+
+        Args:
+            stakeholder_cards (list): The StakeholderCard objects of the game.
+            concern_cards (list): The ConcernCard objects of the game, in play order.
+        """
+        self.vocabulary = Vocabulary(
+            attr for stakeholder in stakeholder_cards for attr in stakeholder.quality_attributes)
+        self.option_names = []
+        option_impacts = []
+        for concern_card in concern_cards:
+            options = concern_card.design_options()
+            self.option_names.append(list(options))
+            for impacts in options.values():
+                for attr in impacts:
+                    self.vocabulary.code(attr)
+                option_impacts.append(impacts)
+
+        self.impact_matrix = np.zeros((len(option_impacts) + 1, len(self.vocabulary)), dtype=np.int32)
+        for row, impacts in enumerate(option_impacts):
+            self.impact_matrix[row] = impact_vector(self.vocabulary, impacts)
+        counts = [len(names) for names in self.option_names]
+        self.option_offsets = (np.cumsum(counts, dtype=np.intp) - counts).astype(np.intp)
+        self._option_counts = np.array(counts, dtype=np.intp)
+
+        self.priority_matrix = np.zeros((len(stakeholder_cards), len(self.vocabulary)), dtype=np.int32)
+        self.priority_mask = np.zeros(self.priority_matrix.shape, dtype=bool)
+        for row, stakeholder in enumerate(stakeholder_cards):
+            for attr, priority in stakeholder.quality_attributes.items():
+                column = self.vocabulary.code(attr)
+                self.priority_matrix[row, column] = priority
+                self.priority_mask[row, column] = True
+
+    def qa_scores(self, selections):
+        """
+        Returns the QA totals of each candidate sequence.
+
+        Args:
+            selections (array-like): (N, concern cards) option index chosen for each card, -1 for an unplayed card.
+
+        Returns:
+            numpy.ndarray: (N, attributes) total impact on each quality attribute.
+
+        Raises:
+            IndexError: If a selection does not have one index per concern card, or an index is not -1 nor an
+                option of its card.
+        """
+        selections = np.asarray(selections, dtype=np.intp)
+        if selections.ndim != 2 or selections.shape[1] != len(self.option_names):
+            raise IndexError(f"Expected (N, {len(self.option_names)}) selections, got {selections.shape}.")
+        invalid = (selections < -1) | (selections >= self._option_counts)
+        if invalid.any():
+            row, card = np.argwhere(invalid)[0]
+            raise IndexError(f"Selection {row} chooses option {selections[row, card]} of concern card {card}, "
+                             f"which has {self._option_counts[card]} options.")
+        rows = np.where(selections < 0, len(self.impact_matrix) - 1, self.option_offsets + selections)
+        # one (N, attributes) gather per card keeps memory linear in N, instead of an (N, cards, attributes) one
+        totals = np.zeros((len(rows), self.impact_matrix.shape[1]), dtype=self.impact_matrix.dtype)
+        for card_rows in rows.T:
+            totals += self.impact_matrix[card_rows]
+        return totals
+
+    def score(self, selections):
+        """
+        Returns the game score of each candidate sequence: the stakeholders' satisfaction, max(0, score - priority)
+        summed over their quality attributes, or -1 when any QA total is negative.
+
+        Args:
+            selections (array-like): (N, concern cards) option index chosen for each card, -1 for an unplayed card.
+
+        Returns:
+            numpy.ndarray: (N,) score of each sequence.
+        """
+        totals = self.qa_scores(selections)
+        satisfaction = np.zeros(len(totals), dtype=np.int64)
+        # one (N, attributes) pass per stakeholder keeps memory linear in N
+        for priorities, mask in zip(self.priority_matrix, self.priority_mask):
+            satisfaction += (np.maximum(totals - priorities, 0) * mask).sum(axis=1)
+        return np.where((totals < 0).any(axis=1), -1, satisfaction)
+
+    def all_selections(self):
+        """
+        Returns every sequence that plays all concern cards, one option per card.
+
+        Returns:
+            numpy.ndarray: (product of the option counts, concern cards) option indices.
+        """
+        counts = [len(names) for names in self.option_names]
+        if not counts:
+            return np.zeros((1, 0), dtype=np.intp)
+        grids = np.meshgrid(*[np.arange(count, dtype=np.intp) for count in counts], indexing="ij")
+        return np.stack(grids, axis=-1).reshape(-1, len(counts))
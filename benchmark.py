@@ -0,0 +1,421 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import configuration
+import simulator
+from compact import GameSnapshot
+from decidarch_assistant import DecidArchAssistant
+from models import StakeholderCard, ConcernCard, EventCard
+from ollama_stub import StubOllamaServer
+
+
+# modules that must import without langchain: the game engine, and the assistant until a chain is run
+LLM_FREE_MODULES = ("models", "score_state", "simulator", "main", "decidarch_assistant", "game_server")
+
+
+def scenario():
+    """
+    Returns the game state used by every benchmark request, taken from the demos.
+
+    Returns:
+        dict: The inputs of a suggestion request and of a review request, under "suggestion" and "review".
+    """
+    stakeholder_cards = [
+        StakeholderCard("Owner", "Ensure project success", {"Availability": 3, "Security": 2, "Cost": 1}),
+        StakeholderCard("User", "Use the app effectively", {"Usability": 4, "Performance": 3, "Security": 1})
+    ]
+    decision_template = [
+        {"Security": -1, "Availability": 2},
+        {"Performance": 3, "Usability": -1}
+    ]
+    qa_scores = {"Security": 1, "Performance": 2, "Usability": 3, "Availability": 3, "Cost": 0}
+    concern_card = ConcernCard(1, "Security Breach", {
+        "Implement Advanced Encryption": {"Security": +2, "Performance": -1, "Cost": -2},
+        "Reduce Security Testing to Meet Deadlines": {"Security": -2, "Cost": +2, "Performance": +1},
+        "Add Redundancy to Servers": {"Availability": +3, "Cost": -3, "Security": -1},
+    })
+    event_card = EventCard(
+        title="Server Outage Incident",
+        description="A critical server outage has occurred, causing system downtime.",
+        consequence="The project must ensure high availability and implement server redundancy."
+    )
+    common = dict(
+        project_description="New Web App - Develop a scalable web application for e-commerce",
+        stakeholders=stakeholder_cards,
+        current_design_decisions=decision_template,
+        current_qa_scores=qa_scores,
+        ongoing_events=f"{event_card.title}: {event_card.description}. {event_card.consequence}",
+    )
+    return {
+        "suggestion": dict(common, concern_card_description=concern_card.concern,
+                           design_options=concern_card.design_decisions),
+        "review": common,
+    }
+
+
+def describe_error(errors):
+    """
+    Describes the first error of a benchmark run.
+
+    Args:
+        errors (list): The exceptions raised by the failed requests, in order.
+
+    Returns:
+        str or None: The type and message of the first exception, None if no request failed.
+    """
+    return f"{type(errors[0]).__name__}: {errors[0]}" if errors else None
+
+
+def summarize_latencies(latencies, wall_time, errors=()):
+    """
+    Summarizes the latencies of a benchmark run.
+
+    Args:
+        latencies (list): The latency of each request in seconds, None for a failed request.
+        wall_time (float): The duration of the whole run, in seconds.
+        errors (list): The exceptions raised by the failed requests, in order.
+
+    Returns:
+        dict: The p50/p95/p99 latencies of the successful requests in milliseconds, the throughput in successful
+            requests per second, the number of errors and the first of them, as returned by describe_error.
+    """
+    succeeded = [latency for latency in latencies if latency is not None]
+    if len(succeeded) > 1:
+        quantiles = statistics.quantiles(succeeded, n=100, method="inclusive")
+    else:
+        quantiles = (succeeded or [float("nan")]) * 99
+    return {
+        "requests": len(succeeded),
+        "errors": len(latencies) - len(succeeded),
+        "p50_ms": quantiles[49] * 1000,
+        "p95_ms": quantiles[94] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "throughput": len(succeeded) / wall_time,
+        "first_error": describe_error(list(errors)),
+    }
+
+
+def run_sync(call, inputs, concurrency, requests):
+    """
+    Sends requests through a blocking assistant method from a pool of threads.
+
+    Args:
+        call (callable): The assistant method, e.g. assistant.extract_suggestion_chain.
+        inputs (dict): Its keyword arguments.
+        concurrency (int): Number of requests in flight at once.
+        requests (int): Total number of requests.
+
+    Returns:
+        dict: The latency summary, as returned by summarize_latencies.
+    """
+    errors = []
+
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            call(**inputs)
+        except Exception as error:
+            errors.append(error)
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, range(requests)))
+    return summarize_latencies(latencies, time.perf_counter() - start, errors)
+
+
+def run_async(call, inputs, concurrency, requests):
+    """
+    Sends requests through an async assistant method from a single event loop.
+
+    Args:
+        call (callable): The async assistant method, e.g. assistant.aextract_suggestion_chain.
+        inputs (dict): Its keyword arguments.
+        concurrency (int): Number of requests in flight at once.
+        requests (int): Total number of requests.
+
+    Returns:
+        dict: The latency summary, as returned by summarize_latencies.
+    """
+    errors = []
+
+    async def run():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def timed():
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    await call(**inputs)
+                except Exception as error:
+                    errors.append(error)
+                    return None
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[timed() for _ in range(requests)])
+        return summarize_latencies(latencies, time.perf_counter() - start, errors)
+
+    return asyncio.run(run())
+
+
+def measure_allocations(call, inputs, requests=10, mode="sync"):
+    """
+    Measures the memory allocated on the client side by an assistant method.
+
+    Args:
+        call (callable): The assistant method, blocking in sync mode and async in async mode.
+        inputs (dict): Its keyword arguments.
+        requests (int): Number of sequential requests to average over.
+        mode (str): "sync" to call the method directly, "async" to await it on an event loop.
+
+    Returns:
+        dict: The peak traced memory and the number of allocated blocks still alive, per request, and the first
+            error of the failed requests, as returned by describe_error.
+    """
+    errors = []
+    # in async mode the requests are awaited one at a time on a loop created before tracing starts
+    loop = asyncio.new_event_loop() if mode == "async" else None
+
+    def attempt():
+        try:
+            if loop is not None:
+                loop.run_until_complete(call(**inputs))
+            else:
+                call(**inputs)
+        except Exception as error:
+            errors.append(error)
+
+    try:
+        attempt()  # warm up the prepared chains and the connection pool
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for _ in range(requests):
+            attempt()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        if loop is not None:
+            loop.close()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {"peak_kib": peak / 1024, "retained_blocks_per_request": blocks / requests,
+            "allocation_error": describe_error(errors)}
+
+
+def measure_session(assistant, turns=9):
+    """
+    Plays the turns of one game with stateless suggestion requests, then in an AssistantSession, and compares the
+    prompt tokens evaluated by Ollama and the time spent evaluating them (prefill).
+
+    Args:
+        assistant (DecidArchAssistant): The assistant to measure, without a suggestion cache.
+        turns (int): Number of suggestion requests of the game, e.g. one per concern card.
+
+    Returns:
+        dict: Per mode ("stateless" and "session"), the prompt tokens, the prefill time in milliseconds and the mean
+            time to first token in milliseconds, plus the share of prompt tokens saved by the session.
+    """
+    inputs = scenario()["suggestion"]
+
+    def play(stream_suggestion):
+        streams = []
+        for _ in range(turns):
+            stream = stream_suggestion(**inputs)
+            for _ in stream:
+                pass
+            streams.append(stream)
+        return {
+            "prompt_tokens": sum(stream.metadata.get("prompt_eval_count") or 0 for stream in streams),
+            "prefill_ms": sum(stream.metadata.get("prompt_eval_duration") or 0 for stream in streams) / 1e6,
+            "ttft_ms": statistics.fmean(stream.time_to_first_token or 0.0 for stream in streams) * 1000,
+        }
+
+    stateless = play(assistant.stream_suggestion_chain)
+    session = assistant.start_session()
+    with_session = play(session.stream_suggestion_chain)
+    # the one-off priming request is part of the session's cost
+    with_session["prompt_tokens"] = session.prompt_tokens
+    with_session["prefill_ms"] = session.prefill_time * 1000
+    return {
+        "stateless": stateless,
+        "session": with_session,
+        "prompt_tokens_saved": 1 - with_session["prompt_tokens"] / max(1, stateless["prompt_tokens"]),
+    }
+
+
+def measure_models(data, games=1000, snapshots=1000):
+    """
+    Measures the memory of simulated games and the cost of game snapshots, binary against JSON.
+
+    Args:
+        data (dict): A table description, as accepted by simulator.load_table.
+        games (int): Number of greedy games kept alive to measure their memory.
+        snapshots (int): Number of snapshots written and read per format.
+
+    Returns:
+        dict: The memory per game in bytes, and per format ("binary" and "json") the size of a snapshot in bytes and
+            the time to write and to read one in microseconds.
+    """
+    table = simulator.load_table(data)
+    shared = {}
+    played = [simulator.SimulatedGame(table, random.Random(seed), shared) for seed in range(games)]
+    for game in played:
+        game.play(simulator.greedy_policy)
+    tracemalloc.start()
+    played = [simulator.SimulatedGame(table, random.Random(seed), shared) for seed in range(games)]
+    for game in played:
+        game.play(simulator.greedy_policy)
+    game_bytes = tracemalloc.get_traced_memory()[0] / games
+    tracemalloc.stop()
+
+    decisions = played[0].score_state.decisions
+    index = played[0].current_concern_index
+
+    def timed(call):
+        start = time.perf_counter()
+        for _ in range(snapshots):
+            result = call()
+        return result, (time.perf_counter() - start) / snapshots * 1e6
+
+    binary, binary_write = timed(lambda: GameSnapshot(table, decisions, index).dumps())
+    _, binary_read = timed(lambda: GameSnapshot.loads(binary))
+    text, json_write = timed(lambda: json.dumps({"table": data, "decisions": decisions, "index": index}))
+    _, json_read = timed(lambda: simulator.load_table(json.loads(text)["table"]))
+    return {
+        "bytes_per_game": game_bytes,
+        "binary": {"size": len(binary), "write_us": binary_write, "read_us": binary_read},
+        "json": {"size": len(text), "write_us": json_write, "read_us": json_read},
+    }
+
+
+def measure_imports(modules=LLM_FREE_MODULES, repeat=5):
+    """
+    Measures the import time of modules, each in fresh interpreters, and whether importing them loads langchain.
+
+    Args:
+        modules (iterable): The names of the modules.
+        repeat (int): Number of interpreters per module; the median time is reported.
+
+    Returns:
+        dict: Per module, the import time in milliseconds and whether langchain was loaded.
+    """
+    code = ("import sys, time; start = time.perf_counter(); import {module}; "
+            "print(time.perf_counter() - start, 'langchain' in sys.modules)")
+    results = {}
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            output = subprocess.run([sys.executable, "-c", code.format(module=module)], capture_output=True,
+                                    text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            elapsed, langchain = output.stdout.split()
+            times.append(float(elapsed))
+        results[module] = {"import_ms": statistics.median(times) * 1000, "langchain": langchain == "True"}
+    return results
+
+
+def benchmark(assistant, concurrency_levels=(1, 4, 16), requests=64, mode="sync"):
+    """
+    Benchmarks the suggestion and review requests of an assistant at several concurrency levels.
+
+    Args:
+        assistant (DecidArchAssistant): The assistant to benchmark, usually pointed at a StubOllamaServer.
+        concurrency_levels (iterable): The numbers of requests in flight to measure.
+        requests (int): Number of requests per measurement.
+        mode (str): "sync" for the blocking methods on threads, "async" for the async methods on one event loop.
+
+    Returns:
+        list: One result dict per operation and concurrency level.
+    """
+    inputs = scenario()
+    operations = {
+        "suggestion": (assistant.extract_suggestion_chain, assistant.aextract_suggestion_chain),
+        "review": (assistant.extract_review_suggestion_chain, assistant.aextract_review_suggestion_chain),
+    }
+
+    results = []
+    for name, (sync_call, async_call) in operations.items():
+        allocations = measure_allocations(async_call if mode == "async" else sync_call, inputs[name], mode=mode)
+        for concurrency in concurrency_levels:
+            if mode == "async":
+                summary = run_async(async_call, inputs[name], concurrency, requests)
+            else:
+                summary = run_sync(sync_call, inputs[name], concurrency, requests)
+            results.append(dict(operation=name, mode=mode, concurrency=concurrency, **summary, **allocations))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DecidArch assistant against a stub Ollama server.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--prompt-token-delay", type=float, default=0.0005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--session-turns", type=int, default=9)
+    parser.add_argument("--table", help="JSON table description, to also measure game memory and snapshots")
+    parser.add_argument("--imports", action="store_true",
+                        help="only measure the import times, failing if langchain is loaded or one is too slow")
+    parser.add_argument("--max-import-ms", type=float, default=500.0)
+    args = parser.parse_args()
+
+    if args.imports:
+        imports = measure_imports()
+        print(f"{'module':<22}{'import ms':>10}{'langchain':>11}")
+        for module, result in imports.items():
+            print(f"{module:<22}{result['import_ms']:>10.1f}{str(result['langchain']):>11}")
+        slow = [module for module, result in imports.items()
+                if result["langchain"] or result["import_ms"] > args.max_import_ms]
+        if slow:
+            parser.exit(1, f"import regression: {', '.join(slow)}\n")
+        return
+
+    with StubOllamaServer(first_token_delay=args.first_token_delay, token_delay=args.token_delay,
+                          error_rate=args.error_rate, prompt_token_delay=args.prompt_token_delay) as server:
+        config = configuration.Configuration()
+        config.uri_ollama = server.url
+        config.max_concurrent_requests = max(args.concurrency)
+        assistant = DecidArchAssistant(config)
+
+        print(f"{'operation':<12}{'conc':>6}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}"
+              f"{'peak KiB':>10}{'blocks/req':>12}")
+        for result in benchmark(assistant, args.concurrency, args.requests, args.mode):
+            print(f"{result['operation']:<12}{result['concurrency']:>6}{result['errors']:>8}{result['p50_ms']:>10.1f}"
+                  f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['throughput']:>10.1f}"
+                  f"{result['peak_kib']:>10.1f}{result['retained_blocks_per_request']:>12.1f}")
+            error = result["first_error"] or result["allocation_error"]
+            if error:
+                print(f"  first error: {error}")
+
+        if args.error_rate == 0:
+            session = measure_session(assistant, args.session_turns)
+            print(f"\n{str(args.session_turns) + '-turn game':<12}{'prompt tokens':>16}{'prefill ms':>12}{'ttft ms':>10}")
+            for mode in ("stateless", "session"):
+                print(f"{mode:<12}{session[mode]['prompt_tokens']:>16}{session[mode]['prefill_ms']:>12.1f}"
+                      f"{session[mode]['ttft_ms']:>10.1f}")
+            print(f"prompt tokens saved by the session: {session['prompt_tokens_saved']:.0%}")
+
+    if args.table:
+        with open(args.table) as table_file:
+            models = measure_models(json.load(table_file))
+        print(f"\nmemory per simulated game: {models['bytes_per_game']:.0f} bytes")
+        print(f"{'snapshot':<12}{'bytes':>8}{'write us':>10}{'read us':>10}")
+        for encoding in ("binary", "json"):
+            print(f"{encoding:<12}{models[encoding]['size']:>8}{models[encoding]['write_us']:>10.1f}"
+                  f"{models[encoding]['read_us']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
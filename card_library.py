@@ -0,0 +1,378 @@
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+import configuration
+from compact import GameSnapshot
+from simulator import load_table
+
+
+CACHE_SUFFIX = ".dagc"
+_CACHE_MAGIC = b"DCL1"
+# source file modification time and size, then the limits the library was validated against
+_CACHE_HEADER = struct.Struct("<qQ7i")
+
+# bounds of the compact encoding of the cards
+_MIN_IMPACT, _MAX_IMPACT = -128, 127
+_MAX_ATTRIBUTES = 256
+
+# libraries loaded by this process, by file and version
+_libraries = OrderedDict()
+_LIBRARY_CACHE_SIZE = 32
+_libraries_lock = threading.Lock()
+
+
+class CardLibraryError(ValueError):
+    """
+    Raised when a card library is invalid.
+
+    Attributes:
+        errors (list): Every problem found, each prefixed by the path of the offending entry.
+    """
+    def __init__(self, errors):
+        super().__init__("Invalid card library: " + "; ".join(errors))
+        self.errors = errors
+
+
+def _limits(limits):
+    return (limits.MIN_PLAYERS, limits.MAX_PLAYERS, limits.MAX_STAKEHOLDERS, limits.MAX_CONCERNS, limits.MAX_EVENTS,
+            limits.MIN_PRIORITY, limits.MAX_PRIORITY)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_text(errors, path, entry, key, optional=False):
+    value = entry.get(key)
+    if value is None and optional:
+        return
+    if not isinstance(value, str) or not value.strip():
+        errors.append(f"{path}.{key}: expected a non-empty string")
+
+
+def _check_entries(errors, data, key, fields, required=True):
+    entries = data.get(key)
+    if entries is None and not required:
+        return []
+    if not isinstance(entries, list):
+        errors.append(f"{key}: expected a list")
+        return []
+    valid = []
+    for i, entry in enumerate(entries):
+        path = f"{key}[{i}]"
+        if not isinstance(entry, dict):
+            errors.append(f"{path}: expected an object")
+            continue
+        unknown = set(entry) - set(fields)
+        if unknown:
+            errors.append(f"{path}: unknown fields {', '.join(sorted(unknown))}")
+        valid.append((path, entry))
+    return valid
+
+
+def _check_impacts(errors, path, impacts, attributes):
+    if not isinstance(impacts, dict) or not impacts:
+        errors.append(f"{path}: expected a non-empty object of quality attribute impacts")
+        return
+    for attr, impact in impacts.items():
+        attributes.add(attr)
+        if not _is_int(impact) or not _MIN_IMPACT <= impact <= _MAX_IMPACT:
+            errors.append(f"{path}.{attr}: expected an integer impact between {_MIN_IMPACT} and {_MAX_IMPACT}")
+
+
+def validate_library(data, limits):
+    """
+    Checks a card library against the game limits of the configuration, before any card is built.
+
+    Args:
+        data (dict): The library, as accepted by simulator.load_table.
+        limits (Configuration): The configuration holding the limits.
+
+    Returns:
+        list: The problems found, empty if the library is valid.
+    """
+    if not isinstance(data, dict):
+        return ["expected an object with project, stakeholders, concerns and, optionally, players and events"]
+    errors = []
+    unknown = set(data) - {"players", "project", "stakeholders", "concerns", "events"}
+    if unknown:
+        errors.append(f"unknown sections {', '.join(sorted(unknown))}")
+
+    players = _check_entries(errors, data, "players", ("first_name", "last_name"), required=False)
+    # a library may leave the players to the table
+    if players and not limits.MIN_PLAYERS <= len(players) <= limits.MAX_PLAYERS:
+        errors.append(f"players: number of players must be between {limits.MIN_PLAYERS} and {limits.MAX_PLAYERS}")
+    for path, player in players:
+        _check_text(errors, path, player, "first_name")
+        _check_text(errors, path, player, "last_name")
+
+    project = data.get("project")
+    if not isinstance(project, dict):
+        errors.append("project: expected an object")
+    else:
+        unknown = set(project) - {"name", "purpose"}
+        if unknown:
+            errors.append(f"project: unknown fields {', '.join(sorted(unknown))}")
+        _check_text(errors, "project", project, "name")
+        _check_text(errors, "project", project, "purpose")
+
+    attributes = set()
+    stakeholders = _check_entries(errors, data, "stakeholders", ("role", "goal", "quality_attributes"))
+    if not 1 <= len(stakeholders) <= limits.MAX_STAKEHOLDERS:
+        errors.append(f"stakeholders: number of stakeholders must be between 1 and {limits.MAX_STAKEHOLDERS}")
+    for path, stakeholder in stakeholders:
+        _check_text(errors, path, stakeholder, "role")
+        _check_text(errors, path, stakeholder, "goal")
+        priorities = stakeholder.get("quality_attributes")
+        if not isinstance(priorities, dict) or not priorities:
+            errors.append(f"{path}.quality_attributes: expected a non-empty object of priorities")
+            continue
+        for attr, priority in priorities.items():
+            attributes.add(attr)
+            if not _is_int(priority) or not limits.MIN_PRIORITY <= priority <= limits.MAX_PRIORITY:
+                errors.append(f"{path}.quality_attributes.{attr}: expected an integer priority between "
+                              f"{limits.MIN_PRIORITY} and {limits.MAX_PRIORITY}")
+
+    concerns = _check_entries(errors, data, "concerns", ("card_id", "concern", "design_decisions"))
+    if not 1 <= len(concerns) <= limits.MAX_CONCERNS:
+        errors.append(f"concerns: number of concern cards must be between 1 and {limits.MAX_CONCERNS}")
+    card_ids = set()
+    for path, concern in concerns:
+        card_id = concern.get("card_id")
+        if not _is_int(card_id) or card_id < 0:
+            errors.append(f"{path}.card_id: expected a non-negative integer")
+        elif card_id in card_ids:
+            errors.append(f"{path}.card_id: duplicate card id {card_id}")
+        else:
+            card_ids.add(card_id)
+        _check_text(errors, path, concern, "concern")
+        decisions = concern.get("design_decisions")
+        path = f"{path}.design_decisions"
+        if isinstance(decisions, dict) and decisions and all(isinstance(v, dict) for v in decisions.values()):
+            if len(decisions) > 255:
+                errors.append(f"{path}: a concern card cannot offer more than 255 design options")
+            for option, impacts in decisions.items():
+                _check_impacts(errors, f"{path}.{option}", impacts, attributes)
+        else:
+            # the impacts of the card's single decision
+            _check_impacts(errors, path, decisions, attributes)
+
+    events = _check_entries(errors, data, "events", ("title", "description", "consequence", "quality_attributes"),
+                            required=False)
+    if len(events) > limits.MAX_EVENTS:
+        errors.append(f"events: number of event cards cannot exceed {limits.MAX_EVENTS}")
+    for path, event in events:
+        _check_text(errors, path, event, "title")
+        _check_text(errors, path, event, "description")
+        _check_text(errors, path, event, "consequence")
+        tags = event.get("quality_attributes", [])
+        if not isinstance(tags, list) or not all(isinstance(attr, str) and attr for attr in tags):
+            errors.append(f"{path}.quality_attributes: expected a list of quality attribute names")
+        elif len(tags) > 255:
+            errors.append(f"{path}.quality_attributes: an event cannot be tagged with more than 255 attributes")
+        else:
+            attributes.update(tags)
+
+    if len(attributes) > _MAX_ATTRIBUTES:
+        errors.append(f"a library cannot use more than {_MAX_ATTRIBUTES} quality attributes")
+    return errors
+
+
+def read_library(path):
+    """
+    Reads a card library file, as JSON or, for the .yaml and .yml extensions, as YAML.
+
+    Args:
+        path (str): The file.
+
+    Returns:
+        dict: The parsed library, not yet validated.
+
+    Raises:
+        CardLibraryError: If the file cannot be parsed.
+        ImportError: If the file is YAML and PyYAML is not installed.
+    """
+    with open(path, encoding="utf-8") as library_file:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+
+            try:
+                return yaml.safe_load(library_file)
+            except yaml.YAMLError as error:
+                raise CardLibraryError([f"{path}: {error}"])
+        try:
+            return json.load(library_file)
+        except ValueError as error:
+            raise CardLibraryError([f"{path}: {error}"])
+
+
+class CardLibrary:
+    """
+    Validated deck of cards with indexes from each quality attribute to the cards that affect it.
+
+    Attributes:
+        table (dict): The cards, as returned by simulator.load_table. Games of the same library share them.
+        concerns_by_attribute (dict): The concern cards whose design options affect each quality attribute.
+        options_by_attribute (dict): The (concern card, option name, impact) of each design option affecting each
+            quality attribute.
+        stakeholders_by_attribute (dict): The (stakeholder card, priority) of each stakeholder caring about each
+            quality attribute.
+        events_by_attribute (dict): The event cards tagged with each quality attribute.
+
+    Methods:
+        concerns_affecting(attr): Returns the concern cards affecting a quality attribute.
+        options_affecting(attr): Returns the design options affecting a quality attribute.
+    """
+    __slots__ = ("table", "concerns_by_attribute", "options_by_attribute", "stakeholders_by_attribute",
+                 "events_by_attribute")
+
+    def __init__(self, table):
+        """
+        Indexes the cards of a validated table.
+
+        Args:
+            table (dict): The cards, as returned by simulator.load_table.
+        """
+        self.table = table
+        self.concerns_by_attribute = {}
+        self.options_by_attribute = {}
+        self.stakeholders_by_attribute = {}
+        self.events_by_attribute = {}
+        for stakeholder in table["stakeholders"]:
+            for attr, priority in stakeholder.quality_attributes.items():
+                self.stakeholders_by_attribute.setdefault(attr, []).append((stakeholder, priority))
+        for concern in table["concerns"]:
+            for option, impacts in concern.design_options().items():
+                for attr, impact in impacts.items():
+                    self.options_by_attribute.setdefault(attr, []).append((concern, option, impact))
+                    concerns = self.concerns_by_attribute.setdefault(attr, [])
+                    if not concerns or concerns[-1] is not concern:
+                        concerns.append(concern)
+        for event in table["events"]:
+            for attr in event.quality_attributes:
+                self.events_by_attribute.setdefault(attr, []).append(event)
+
+    @classmethod
+    def from_data(cls, data, limits=None):
+        """
+        Validates a parsed card library and builds its cards.
+
+        Args:
+            data (dict): The library, as accepted by simulator.load_table.
+            limits (Configuration, optional): The configuration holding the game limits. Defaults to a new one.
+
+        Returns:
+            CardLibrary: The library.
+
+        Raises:
+            CardLibraryError: If the library is invalid.
+        """
+        errors = validate_library(data, limits or configuration.Configuration())
+        if errors:
+            raise CardLibraryError(errors)
+        return cls(load_table(data))
+
+    def concerns_affecting(self, attr):
+        """
+        Returns the concern cards with at least one design option affecting a quality attribute.
+
+        Args:
+            attr (str): The quality attribute.
+
+        Returns:
+            list: The concern cards, in deck order.
+        """
+        return self.concerns_by_attribute.get(attr, [])
+
+    def options_affecting(self, attr):
+        """
+        Returns the design options affecting a quality attribute.
+
+        Args:
+            attr (str): The quality attribute.
+
+        Returns:
+            list: The (concern card, option name, impact) of each option, in deck order.
+        """
+        return self.options_by_attribute.get(attr, [])
+
+
+def _read_compiled(cache_path, header):
+    try:
+        with open(cache_path, "rb") as cache_file:
+            data = cache_file.read()
+    except OSError:
+        return None
+    start = len(_CACHE_MAGIC) + _CACHE_HEADER.size
+    if data[:start] != header:
+        return None
+    try:
+        return GameSnapshot.loads(data[start:]).table
+    except (ValueError, IndexError, struct.error):
+        return None
+
+
+def _write_compiled(cache_path, header, table):
+    # written to a temporary file then renamed, so a concurrent load never reads a partial cache
+    temporary = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as cache_file:
+            cache_file.write(header)
+            cache_file.write(GameSnapshot(table).dumps())
+        os.replace(temporary, cache_path)
+    except OSError:
+        # a read-only deck directory only costs the parsing on the next run
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+
+def load_library(path, limits=None, cache=True):
+    """
+    Loads a card library file.
+
+    The parsed and validated cards are compiled into the binary encoding of compact.GameSnapshot, written next to
+    the file with the CACHE_SUFFIX extension, and reused while the file and the limits are unchanged. Within a
+    process, loading the same file again returns the same library.
+
+    Args:
+        path (str): A JSON or YAML file describing the project, stakeholders, concerns and, optionally, players and
+            events, as accepted by simulator.load_table.
+        limits (Configuration, optional): The configuration holding the game limits. Defaults to a new one.
+        cache (bool): Whether to read and write the compiled file.
+
+    Returns:
+        CardLibrary: The library.
+
+    Raises:
+        CardLibraryError: If the library is invalid.
+        OSError: If the file cannot be read.
+    """
+    limits = limits or configuration.Configuration()
+    status = os.stat(path)
+    key = (os.path.realpath(path), status.st_mtime_ns, status.st_size, _limits(limits))
+    with _libraries_lock:
+        library = _libraries.get(key)
+        if library is not None:
+            _libraries.move_to_end(key)
+            return library
+
+    header = _CACHE_MAGIC + _CACHE_HEADER.pack(status.st_mtime_ns, status.st_size, *_limits(limits))
+    cache_path = path + CACHE_SUFFIX
+    table = _read_compiled(cache_path, header) if cache else None
+    if table is None:
+        library = CardLibrary.from_data(read_library(path), limits)
+        if cache:
+            _write_compiled(cache_path, header, library.table)
+    else:
+        library = CardLibrary(table)
+
+    with _libraries_lock:
+        _libraries[key] = library
+        if len(_libraries) > _LIBRARY_CACHE_SIZE:
+            _libraries.popitem(last=False)
+    return library
@@ -0,0 +1,300 @@
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+
+from models import QA_VOCABULARY, Player, ProjectCard, StakeholderCard, ConcernCard, EventCard
+
+
+MAGIC = b"DAG2"
+
+_NONE = 0xFFFFFFFF
+_LENGTH = struct.Struct("<I")
+_CARD_ID = struct.Struct("<i")
+
+# the cards of the most recently restored tables, by encoding
+_decoded_tables = OrderedDict()
+_TABLE_CACHE_SIZE = 128
+_tables_lock = threading.Lock()
+
+
+def pack_impacts(impacts, codes):
+    """
+    Encodes the impacts of a design option, or the priorities of a stakeholder, as two small-int arrays.
+
+    Args:
+        impacts (dict): The value of each quality attribute, between -128 and 127.
+        codes (dict): The code of each quality attribute, below 256.
+
+    Returns:
+        tuple: The array("B") of attribute codes and the array("b") of values, in the same order.
+
+    Raises:
+        OverflowError: If a value or a code does not fit.
+    """
+    return array("B", [codes[attr] for attr in impacts]), array("b", impacts.values())
+
+
+def unpack_impacts(attributes, values, names):
+    """
+    Decodes the arrays returned by pack_impacts.
+
+    Args:
+        attributes (array): The attribute codes.
+        values (array): The values.
+        names (list): The name of each code.
+
+    Returns:
+        dict: The value of each quality attribute.
+    """
+    return {names[code]: value for code, value in zip(attributes, values)}
+
+
+class _Writer:
+    __slots__ = ("buffer", "codes")
+
+    def __init__(self, codes):
+        self.buffer = bytearray()
+        self.codes = codes
+
+    def length(self, value):
+        self.buffer += _LENGTH.pack(value)
+
+    def byte(self, value):
+        # bytearray.append raises ValueError, while the arrays of pack_impacts raise OverflowError
+        if not 0 <= value <= 0xFF:
+            raise OverflowError(f"{value} does not fit in a byte.")
+        self.buffer.append(value)
+
+    def text(self, value):
+        if value is None:
+            self.length(_NONE)
+            return
+        data = value.encode("utf-8")
+        self.length(len(data))
+        self.buffer += data
+
+    def impacts(self, impacts):
+        attributes, values = pack_impacts(impacts, self.codes)
+        self.byte(len(attributes))
+        self.buffer += attributes.tobytes()
+        self.buffer += values.tobytes()
+
+
+class _Reader:
+    __slots__ = ("data", "offset", "names")
+
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a game snapshot.")
+        self.data = memoryview(data)
+        self.offset = len(MAGIC)
+        self.names = []
+
+    def length(self):
+        value, = _LENGTH.unpack_from(self.data, self.offset)
+        self.offset += _LENGTH.size
+        return value
+
+    def text(self):
+        size = self.length()
+        if size == _NONE:
+            return None
+        value = str(self.data[self.offset:self.offset + size], "utf-8")
+        self.offset += size
+        return value
+
+    def impacts(self):
+        count = self.data[self.offset]
+        start = self.offset + 1
+        self.offset = start + 2 * count
+        attributes, values = array("B"), array("b")
+        attributes.frombytes(self.data[start:start + count])
+        values.frombytes(self.data[start + count:self.offset])
+        return unpack_impacts(attributes, values, self.names)
+
+
+class GameSnapshot:
+    """
+    State of a game that can be saved and restored: its cards, the decisions taken and the concern card in play.
+
+    The binary encoding is less than half the size of the same data as JSON: the quality attributes are written
+    once, in a vocabulary local to the snapshot, and every impact or priority as a pair of bytes (attribute code,
+    value). The cards are encoded again for every snapshot, as the table is a plain dict that may be changed between
+    two of them; the encoding of a table is the key under which its decoded cards are kept, so that restoring
+    several snapshots of the same game decodes its cards once. Snapshots are independent of the process that wrote
+    them.
+
+    The small-integer arrays only exist in the encoding: the cards of a game in memory, and the decisions, keep
+    their impacts and priorities as dicts keyed by the interned names of models.QA_VOCABULARY.
+
+    Attributes:
+        table (dict): The cards of the game, as returned by simulator.load_table.
+        decisions (list): The impacts of each decision taken, as in ScoreState.decisions.
+        current_concern_index (int): Index of the concern card in play.
+
+    Methods:
+        dumps(): Returns the binary encoding of the snapshot.
+        loads(data): Class method returning the snapshot of a binary encoding.
+    """
+    __slots__ = ("table", "decisions", "current_concern_index")
+
+    def __init__(self, table, decisions=(), current_concern_index=0):
+        """
+        Initializes a snapshot.
+
+        Args:
+            table (dict): The cards of the game, with "players", "project", "stakeholders", "concerns", "events".
+            decisions (list): The impacts of each decision taken.
+            current_concern_index (int): Index of the concern card in play.
+        """
+        self.table = table
+        self.decisions = list(decisions)
+        self.current_concern_index = current_concern_index
+
+    def _encode_table(self):
+        table = self.table
+        codes = {}
+        for stakeholder in table["stakeholders"]:
+            for attr in stakeholder.quality_attributes:
+                codes.setdefault(attr, len(codes))
+        for concern in table["concerns"]:
+            for impacts in concern.design_options().values():
+                for attr in impacts:
+                    codes.setdefault(attr, len(codes))
+        for event in table.get("events", ()):
+            for attr in event.quality_attributes:
+                codes.setdefault(attr, len(codes))
+        out = _Writer(codes)
+        out.length(len(codes))
+        for name in codes:
+            out.text(name)
+        out.length(len(table.get("players", ())))
+        for player in table.get("players", ()):
+            out.text(player.first_name)
+            out.text(player.last_name)
+        out.text(table["project"].name)
+        out.text(table["project"].purpose)
+        out.length(len(table["stakeholders"]))
+        for stakeholder in table["stakeholders"]:
+            out.text(stakeholder.role)
+            out.text(stakeholder.goal)
+            out.impacts(stakeholder.quality_attributes)
+        out.length(len(table["concerns"]))
+        for concern in table["concerns"]:
+            out.buffer += _CARD_ID.pack(-1 if concern.card_id is None else concern.card_id)
+            out.text(concern.concern)
+            options = concern.design_options()
+            # a single-decision card is written without option names, and rebuilt as such
+            single = options is not concern.design_decisions
+            out.byte(0 if single else len(options))
+            for option, impacts in options.items():
+                if not single:
+                    out.text(option)
+                out.impacts(impacts)
+        out.length(len(table.get("events", ())))
+        for event in table.get("events", ()):
+            out.text(event.title)
+            out.text(event.description)
+            out.text(event.consequence)
+            out.byte(len(event.quality_attributes))
+            for attr in event.quality_attributes:
+                out.byte(codes[attr])
+
+        return bytes(out.buffer), codes
+
+    def dumps(self):
+        """
+        Encodes the snapshot.
+
+        Returns:
+            bytes: The binary encoding.
+
+        Raises:
+            OverflowError: If there are more than 256 quality attributes, more than 255 on a stakeholder, an option
+                or an event, more than 255 options on a card, or an impact is outside -128..127.
+        """
+        encoded, codes = self._encode_table()
+        extra = {}
+        for decision in self.decisions:
+            for attr in decision:
+                if attr not in codes and attr not in extra:
+                    extra[attr] = len(codes) + len(extra)
+        out = _Writer(dict(codes, **extra) if extra else codes)
+        out.buffer += MAGIC
+        out.length(len(encoded))
+        out.buffer += encoded
+        out.length(len(extra))
+        for name in extra:
+            out.text(name)
+        out.length(len(self.decisions))
+        for decision in self.decisions:
+            out.impacts(decision)
+        out.length(self.current_concern_index)
+        return bytes(out.buffer)
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Decodes a snapshot.
+
+        Args:
+            data (bytes): The encoding returned by dumps.
+
+        Returns:
+            GameSnapshot: The snapshot. Snapshots of the same table share the same card objects.
+
+        Raises:
+            ValueError: If the data is not a snapshot.
+        """
+        source = _Reader(data)
+        size = source.length()
+        start = source.offset
+        encoded = bytes(source.data[start:start + size])
+        with _tables_lock:
+            cached = _decoded_tables.get(encoded)
+            if cached is not None:
+                _decoded_tables.move_to_end(encoded)
+        if cached is None:
+            cached = _decode_table(source)
+            with _tables_lock:
+                _decoded_tables[encoded] = cached
+                if len(_decoded_tables) > _TABLE_CACHE_SIZE:
+                    _decoded_tables.popitem(last=False)
+        table, names = cached
+        source.offset = start + size
+
+        source.names = names + [QA_VOCABULARY.intern(source.text()) for _ in range(source.length())]
+        decisions = [source.impacts() for _ in range(source.length())]
+        return cls(table, decisions, source.length())
+
+
+def _decode_table(source):
+    source.names = [QA_VOCABULARY.intern(source.text()) for _ in range(source.length())]
+    players = [Player(source.text(), source.text()) for _ in range(source.length())]
+    project = ProjectCard(source.text(), source.text())
+    stakeholders = [StakeholderCard(source.text(), source.text(), source.impacts())
+                    for _ in range(source.length())]
+    concerns = []
+    for _ in range(source.length()):
+        card_id, = _CARD_ID.unpack_from(source.data, source.offset)
+        source.offset += _CARD_ID.size
+        concern = source.text()
+        count = source.data[source.offset]
+        source.offset += 1
+        if count:
+            design_decisions = {source.text(): source.impacts() for _ in range(count)}
+        else:
+            design_decisions = source.impacts()
+        concerns.append(ConcernCard(None if card_id == -1 else card_id, concern, design_decisions))
+    events = []
+    for _ in range(source.length()):
+        title, description, consequence = source.text(), source.text(), source.text()
+        count = source.data[source.offset]
+        start = source.offset + 1
+        source.offset = start + count
+        tags = [source.names[code] for code in source.data[start:source.offset]]
+        events.append(EventCard(title, description, consequence, tags))
+    table = {"players": players, "project": project, "stakeholders": stakeholders, "concerns": concerns,
+             "events": events}
+    return table, source.names
@@ -2,10 +2,38 @@ class Configuration:
     def __init__(self):
         self.assistant_name = "DecidArchV2Assistant"
         self.uri_ollama = "http://127.0.0.1:11434"
+        # several servers, each {"url": ..., "models": [...]} or a URL serving any model, to spread the requests over;
+        # None sends every request to uri_ollama
+        self.ollama_backends = None
+        self.backend_probe_interval = 10.0
+        self.backend_failure_threshold = 3
+        self.backend_reset_timeout = 30.0
         self.model_name = "llama2"
+        self.max_concurrent_requests = 8
+        self.max_queued_requests = 64
+        self.max_queued_requests_per_session = 4
+        self.prompt_token_budget = 1024
+        self.suggestion_deadline = 20.0
+        # socket timeout of the Ollama requests; a non-streamed generation sends nothing until it is complete, so this
+        # must outlast the slowest generation, while suggestion_deadline only bounds the calls made with a deadline
+        self.request_timeout = 120.0
+        # seconds a speculative next-turn suggestion may wait for a scheduler slot before it is dropped
+        self.prefetch_timeout = 60.0
+        self.structured_output_retries = 2
+        self.semantic_cache_threshold = 0.9
+        self.semantic_cache_audit_rate = 0.05
+        self.embedding_model = None
+        self.few_shot_examples = 3
+        self.few_shot_token_budget = 256
+        self.keep_alive = "30m"
+        self.max_tables = 64
+        self.table_idle_timeout = 2 * 60 * 60
+        self.journal_snapshot_interval = 4
 
         self.MAX_PLAYERS = 4
         self.MIN_PLAYERS = 2
         self.MAX_STAKEHOLDERS = 2
         self.MAX_CONCERNS = 9
-        self.MAX_EVENTS = 5
\ No newline at end of file
+        self.MAX_EVENTS = 5
+        self.MIN_PRIORITY = 1
+        self.MAX_PRIORITY = 5
\ No newline at end of file
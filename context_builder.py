@@ -0,0 +1,227 @@
+import re
+
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def format_stakeholders(stakeholders):
+    """
+    Formats the stakeholders and their quality attribute priorities as the bullet list used in the prompts.
+
+    Args:
+        stakeholders (list): A list of stakeholders, where each stakeholder contains a role and quality attributes.
+
+    Returns:
+        str: One line per stakeholder.
+    """
+    return "\n".join([f"- {stakeholder.role}: {stakeholder.quality_attributes}" for stakeholder in stakeholders])
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of tokens of a text by counting words and punctuation marks. It undercounts the llama2
+    tokenizer a little, which is enough to compare prompt sizes and enforce a budget.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+class ContextBuilder:
+    """
+    Builds compact suggestion prompt inputs from the game state, within a token budget.
+
+    Only what matters for the concern card in play is sent: the decisions are restricted to the quality attributes
+    its options affect (the others are summarized by a count), the QA scores are the net totals of those attributes
+    plus any negative one, and duplicate stakeholders are removed. When the result is still over budget, the events
+    are shortened to their titles, then the oldest decisions and events are summarized away.
+
+    Attributes:
+        token_budget (int): Maximum number of tokens of the game state sent in a prompt.
+        count_tokens (callable): Function estimating the number of tokens of a text.
+        tokens_saved (int): Tokens saved over every build, compared to the full game state.
+        reviews_skipped (int): Number of events whose review was skipped, as no decision affected them.
+        last_report (dict, optional): Token counts of the last build.
+
+    Methods:
+        build(project_card, stakeholder_cards, score_state, event_cards, concern_card): Returns the prompt inputs.
+        build_review(project_card, stakeholder_cards, score_state, event_card): Returns the review prompt inputs, or
+            None when the event affects no decision.
+    """
+
+    def __init__(self, token_budget=1024, count_tokens=estimate_tokens):
+        """
+        Initializes the builder.
+
+        Args:
+            token_budget (int): Maximum number of tokens of the game state sent in a prompt.
+            count_tokens (callable): Function estimating the number of tokens of a text.
+        """
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.tokens_saved = 0
+        self.reviews_skipped = 0
+        self.last_report = None
+
+    def _size(self, inputs):
+        return sum(self.count_tokens(format_stakeholders(value) if key == "stakeholders" else str(value))
+                   for key, value in inputs.items())
+
+    @staticmethod
+    def _render_decisions(decisions, summarized):
+        text = ", ".join(
+            [", ".join([f"{k}: {v}" for k, v in decision.items()]) for decision in decisions])
+        if summarized:
+            note = f"{summarized} other decision(s) omitted"
+            text = f"{text} ({note})" if text else note
+        return text or "None"
+
+    @staticmethod
+    def _render_events(event_cards, titles_only, summarized):
+        text = ", ".join(
+            [event.title if titles_only else f"{event.title}: {event.description}" for event in event_cards])
+        if summarized:
+            note = f"{summarized} earlier event(s) omitted"
+            text = f"{text} ({note})" if text else note
+        return text or "None"
+
+    def build(self, project_card, stakeholder_cards, score_state, event_cards, concern_card):
+        """
+        Builds the inputs of the suggestion request for the concern card in play.
+
+        Args:
+            project_card (ProjectCard): The project of the game.
+            stakeholder_cards (list): The stakeholders of the game.
+            score_state (ScoreState): The decisions taken so far and the running QA scores.
+            event_cards (list): The ongoing events.
+            concern_card (ConcernCard): The concern card in play.
+
+        Returns:
+            dict: The keyword arguments of DecidArchAssistant.extract_suggestion_chain.
+        """
+        relevant = {attr for impacts in concern_card.design_options().values() for attr in impacts}
+
+        stakeholders = []
+        seen = set()
+        for stakeholder in stakeholder_cards:
+            identity = (stakeholder.role, tuple(sorted(stakeholder.quality_attributes.items())))
+            if identity not in seen:
+                seen.add(identity)
+                stakeholders.append(stakeholder)
+
+        decisions = []
+        summarized_decisions = 0
+        for decision in score_state.decisions:
+            impacts = {attr: impact for attr, impact in decision.items() if attr in relevant and impact}
+            if impacts:
+                decisions.append(impacts)
+            else:
+                summarized_decisions += 1
+
+        qa_scores = ", ".join(
+            [f"{k}: {v}" for k, v in score_state.qa_scores.items() if k in relevant or v < 0])
+        events = list(event_cards)
+        summarized_events = 0
+        titles_only = False
+
+        base = dict(
+            project_description=f"{project_card.name} - {project_card.purpose}",
+            stakeholders=stakeholders,
+            current_qa_scores=qa_scores or "None",
+            concern_card_description=concern_card.concern,
+            design_options=concern_card.design_decisions
+        )
+
+        def inputs():
+            return dict(
+                base,
+                current_design_decisions=self._render_decisions(decisions, summarized_decisions),
+                ongoing_events=self._render_events(events, titles_only, summarized_events),
+            )
+
+        # shortening in order of least useful information first, until the budget is met
+        result = inputs()
+        while self._size(result) > self.token_budget:
+            if events and not titles_only:
+                titles_only = True
+            elif decisions:
+                decisions.pop(0)
+                summarized_decisions += 1
+            elif events:
+                events.pop(0)
+                summarized_events += 1
+            else:
+                break
+            result = inputs()
+
+        full = dict(
+            base,
+            stakeholders=stakeholder_cards,
+            current_design_decisions=score_state.decisions_text(),
+            current_qa_scores=score_state.qa_scores_text(),
+            ongoing_events=", ".join([f"{event.title}: {event.description}" for event in event_cards]),
+        )
+        tokens_before, tokens_after = self._size(full), self._size(result)
+        self.tokens_saved += max(0, tokens_before - tokens_after)
+        self.last_report = {
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": tokens_before - tokens_after,
+            "summarized_decisions": summarized_decisions,
+            "summarized_events": summarized_events,
+        }
+        return result
+
+    def build_review(self, project_card, stakeholder_cards, score_state, event_card):
+        """
+        Builds the inputs of the review request for an event, restricted to the decisions it affects.
+
+        The affected quality attributes are the event's tags or, for an untagged card, the attributes of the game its
+        text mentions. Only the decisions with an impact on them are sent, numbered by their position in the game,
+        with the scores of those attributes. An event mentioning no known attribute is reviewed against every
+        decision, as nothing tells which of them it affects.
+
+        Args:
+            project_card (ProjectCard): The project of the game.
+            stakeholder_cards (list): The stakeholders of the game.
+            score_state (ScoreState): The decisions taken so far and the running QA scores.
+            event_card (EventCard): The event that occurred.
+
+        Returns:
+            dict: The keyword arguments of DecidArchAssistant.extract_review_suggestion_chain, or None when the
+                event affects no decision, in which case there is nothing to review.
+        """
+        known = set(score_state.qa_scores)
+        known.update(score_state.decisions_by_attribute)
+        attributes = event_card.affected_attributes(known)
+        if attributes:
+            indexes = score_state.decisions_affecting(attributes)
+        else:
+            indexes = range(len(score_state.decisions))
+        if not indexes:
+            self.reviews_skipped += 1
+            self.last_report = {"affected_attributes": sorted(attributes), "affected_decisions": 0,
+                                "skipped": True}
+            return None
+
+        decisions = "; ".join(
+            [f"Decision {i + 1}: " + ", ".join([f"{k}: {v}" for k, v in score_state.decisions[i].items()])
+             for i in indexes])
+        unaffected = len(score_state.decisions) - len(indexes)
+        if unaffected:
+            decisions += f" ({unaffected} unaffected decision(s) omitted)"
+        qa_scores = ", ".join(
+            [f"{k}: {v}" for k, v in score_state.qa_scores.items() if not attributes or k in attributes])
+        self.last_report = {"affected_attributes": sorted(attributes), "affected_decisions": len(indexes),
+                            "skipped": False}
+        return dict(
+            project_description=f"{project_card.name} - {project_card.purpose}",
+            stakeholders=stakeholder_cards,
+            current_design_decisions=decisions,
+            current_qa_scores=qa_scores or "None",
+            ongoing_events=f"{event_card.title}: {event_card.description}. {event_card.consequence}",
+        )
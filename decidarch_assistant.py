@@ -1,6 +1,184 @@
-from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
-from langchain import chains
-from langchain.llms import Ollama
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from advisor import RuleBasedAdvisor
+from context_builder import format_stakeholders
+from instrumentation import Instrumentation
+from models import ConcernCard
+from ollama_client import OllamaClient
+from ollama_pool import OllamaPool
+from scheduler import BATCH, INTERACTIVE, LLMScheduler, SchedulerOverloaded, current_scheduling, scheduling
+from structured_output import StructuredSuggestion, SuggestionFormatError, parse_suggestion, suggestion_schema
+from suggestion_cache import make_cache_key
+from suggestion_stream import AsyncSuggestionStream, SuggestionStream
+
+
+SUGGESTION_TEMPLATE = """
+        You are an AI assistant helping a team of software architects playing the game DecidArch. Your task is to suggest
+        the best design option for a given concern card, taking into account the stakeholders' quality attribute priorities
+        and any ongoing project events. Here's the information you'll need:
+
+        Project Description:
+        - {project_description}
+
+        Stakeholders and their Quality Attribute Priorities:
+        {stakeholders_info}
+
+        Current Game State:
+        - Current Design Decisions: {current_design_decisions}
+        - Current QA-Scores: {current_qa_scores}
+        - Ongoing Events: {ongoing_events}
+
+        Concern Card Description:
+        - {concern_card_description}
+
+        Possible Design Options:
+        - {design_options}
+{examples}
+        Based on this information, suggest the best design option that satisfies the stakeholders' priorities and 
+        considers any ongoing events. Provide a rationale for your suggestion.
+        """
+
+REVIEW_SUGGESTION_TEMPLATE = """
+        You are an AI assistant helping a team of software architects playing the game DecidArch. An unexpected event has occurred,
+        and it might require changes to the previous design decisions. Your task is to suggest which past design decision(s) should
+        be revised based on the new event. Here's the information you'll need:
+
+        Project Description:
+        - {project_description}
+
+        Stakeholders and their Quality Attribute Priorities:
+        {stakeholders_info}
+
+        Current Game State:
+        - Current Design Decisions: {current_design_decisions}
+        - Current QA-Scores: {current_qa_scores}
+
+        Ongoing Events:
+        {ongoing_events}
+
+        Based on this event, review the previous decisions and suggest necessary revisions. Provide a rationale for your suggestion.
+        """
+
+
+SESSION_PREFIX_TEMPLATE = """
+        You are an AI assistant helping a team of software architects playing the game DecidArch. During the game you
+        will be asked to suggest the best design option for the concern cards that are drawn, and to review past design
+        decisions when unexpected events occur, taking into account the stakeholders' quality attribute priorities.
+        Here's the information that holds for the whole game:
+
+        Project Description:
+        - {project_description}
+
+        Stakeholders and their Quality Attribute Priorities:
+        {stakeholders_info}
+
+        Reply with OK to start the game.
+        """
+
+SUGGESTION_TURN_TEMPLATE = """
+        A concern card has been drawn.
+
+        Current Game State:
+        - Current Design Decisions: {current_design_decisions}
+        - Current QA-Scores: {current_qa_scores}
+        - Ongoing Events: {ongoing_events}
+
+        Concern Card Description:
+        - {concern_card_description}
+
+        Possible Design Options:
+        - {design_options}
+{examples}
+        Suggest the best design option and provide a rationale for your suggestion.
+        """
+
+REVIEW_TURN_TEMPLATE = """
+        An unexpected event has occurred.
+
+        Current Game State:
+        - Current Design Decisions: {current_design_decisions}
+        - Current QA-Scores: {current_qa_scores}
+
+        Ongoing Events:
+        {ongoing_events}
+
+        Suggest which past design decision(s) should be revised and provide a rationale for your suggestion.
+        """
+
+# appended to the suggestion templates for structured output; the braces are escaped for the prompt templates
+STRUCTURED_OUTPUT_INSTRUCTIONS = """
+        Answer with a JSON object only, without any other text:
+        {{"option": "<the chosen design option, named exactly as in the possible design options>",
+        "rationale": "<the rationale for your suggestion>"}}
+        """
+
+STRUCTURED_SUGGESTION_TEMPLATE = SUGGESTION_TEMPLATE + STRUCTURED_OUTPUT_INSTRUCTIONS
+
+STRUCTURED_TURN_TEMPLATE = SUGGESTION_TURN_TEMPLATE + STRUCTURED_OUTPUT_INSTRUCTIONS
+
+STRUCTURED_RETRY_NOTE = """
+        Your previous answer could not be used: {error} Answer again with the JSON object only.
+        """
+
+
+@functools.lru_cache(maxsize=None)
+def _langchain():
+    # langchain takes seconds to import, so it is only loaded when the first chain is built or run; the async,
+    # streaming and session requests, the prompts and the game engine never need it
+    from langchain import chains
+    from langchain.callbacks.base import BaseCallbackHandler
+    from langchain.llms import Ollama
+    from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+
+    return types.SimpleNamespace(
+        chains=chains,
+        Ollama=Ollama,
+        ChatPromptTemplate=ChatPromptTemplate,
+        HumanMessagePromptTemplate=HumanMessagePromptTemplate,
+        # the timer only becomes a langchain callback once langchain is loaded
+        GenerationTimer=type("GenerationTimer", (GenerationTimer, BaseCallbackHandler), {}),
+    )
+
+
+class GenerationTimer:
+    """
+    Callback collecting the timestamps and the Ollama metadata of one LLM call made through a chain. Chains are
+    given its langchain callback subclass, built when langchain is first loaded.
+
+    Attributes:
+        llm_start (float, optional): perf_counter time at which the prompt was sent to the LLM.
+        first_token (float, optional): perf_counter time at which the first token arrived.
+        end (float, optional): perf_counter time at which the completion ended.
+        metadata (dict): The Ollama fields of the last chunk (token counts and durations).
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty timer.
+        """
+        super().__init__()
+        self.llm_start = None
+        self.first_token = None
+        self.end = None
+        self.metadata = {}
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.llm_start = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def on_llm_end(self, response, **kwargs):
+        self.end = time.perf_counter()
+        if response.generations and response.generations[0]:
+            self.metadata = response.generations[0][0].generation_info or {}
 
 
 class DecidArchAssistant:
@@ -10,24 +188,65 @@ class DecidArchAssistant:
     Attributes:
         configuration (object): Configuration object containing settings such as URI and model name for the LLM.
         system_template (str, optional): Custom system message template for the assistant. Defaults to a predefined template.
-        llm (Ollama): Language model instance used to generate suggestions based on provided data.
+        llm (Ollama): Language model instance used to generate suggestions based on provided data. It is created,
+            and langchain imported, on first use.
+        templates (dict): Prompt templates available to the assistant, keyed by name.
+        chains (dict): Prepared chains, keyed by (prompt template, system template), built once and reused.
+        suggestion_cache (SuggestionCache, optional): Cache of suggestions for identical requests. None disables caching.
+        semantic_cache (SemanticSuggestionCache, optional): Cache answering extract_suggestion_chain, in the assistant
+            and its sessions, for requests similar to earlier ones. None disables it.
+        example_store (ExampleStore, optional): Store of past decisions, from which the few-shot examples most relevant
+            to each suggestion request are added to its prompt. None adds no examples.
+        client (OllamaClient): Pooled HTTP client shared by the async suggestion methods. An OllamaPool spreading the
+            requests over the servers of configuration.ollama_backends when they are set; the langchain llm always
+            uses configuration.uri_ollama.
+        scheduler (LLMScheduler): Bounds the number of concurrent requests to Ollama, blocking and async, and orders
+            the waiting ones by priority, fairly across sessions.
+        priorities (dict): Default scheduling priority per template name; templates not listed are INTERACTIVE.
+        queued_requests (int): Number of requests waiting for the scheduler.
+        running_requests (int): Number of requests holding a scheduler slot.
+        instrumentation (Instrumentation): Timers and counters of every call (prompt, queue, request, time to first
+            token, generation, token counts).
 
     Methods:
-        __init__(configuration, system_template=None): Initializes the assistant with configuration and an optional system template.
+        __init__(configuration, system_template=None, suggestion_cache=None, instrumentation=None, semantic_cache=None, example_store=None): Initializes the assistant with configuration, an optional system template, suggestion caches, instrumentation and few-shot examples.
         create_chain(template): Creates and returns a language model chain based on a provided template.
+        register_template(name, template): Registers an additional prompt template under the given name.
+        get_chain(name): Returns the prepared chain for a registered template, building it on first use.
+        render_prompt(name, **inputs): Renders a registered template without langchain.
+        run_chain(name, **inputs): Runs the prepared chain for a registered template, going through the suggestion cache.
+        arun_chain(name, **inputs): Async variant of run_chain, sent through the pooled client and the scheduler.
+        stream_chain(name, **inputs): Streams the output for a registered template as it is generated.
+        astream_chain(name, **inputs): Async variant of stream_chain.
         extract_suggestion(): Generates a chain with a predefined template for suggesting the best design decision.
         extract_suggestion_chain(project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options):
             Generates a suggestion for the best design decision based on various inputs.
         extract_review_suggestion(): Generates a suggestion to review past design decisions based on a new event.
+        extract_review_suggestion_chain(project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events):
+            Generates a suggestion for revising past design decisions.
+        aextract_suggestion_chain(...), aextract_review_suggestion_chain(...): Async variants of the two methods above.
+        stream_suggestion_chain(...), astream_suggestion_chain(...): Streaming variants of extract_suggestion_chain.
+        extract_structured_suggestion(...), aextract_structured_suggestion(...): Variants of extract_suggestion_chain
+            returning the chosen option and its rationale as a StructuredSuggestion.
+        fallback_suggestion(stakeholders, current_qa_scores, concern_card_description, design_options): Returns the
+            rule-based suggestion used when the LLM misses a deadline.
+        fallback_structured_suggestion(...): Structured variant of fallback_suggestion.
+        select_examples(stakeholders, concern_card_description, design_options): Renders the few-shot examples of a
+            suggestion request.
+        start_session(): Opens a per-game session that sends the project and stakeholders to Ollama only once.
     """
 
-    def __init__(self, configuration, system_template=None):
+    def __init__(self, configuration, system_template=None, suggestion_cache=None, instrumentation=None, semantic_cache=None, example_store=None):
         """
         Initializes the DecidArchAssistant object with the provided configuration and an optional system template.
 
         Args:
             configuration (object): Configuration containing settings for the assistant, including URI and model name for the LLM.
             system_template (str, optional): Custom template for the system message. Defaults to a predefined message that describes the assistant's role.
+            suggestion_cache (SuggestionCache, optional): Cache used to answer identical requests without calling the LLM.
+            instrumentation (Instrumentation, optional): Where the timers and counters are recorded. Defaults to an in-process registry.
+            semantic_cache (SemanticSuggestionCache, optional): Cache used to answer similar suggestion requests without calling the LLM.
+            example_store (ExampleStore, optional): Past decisions from which few-shot examples are added to the suggestion prompts.
         """
         self.template = system_template or (
             "You operate as {self.assistant_name}, a virtual assistant specialized in assisting with design decisions "
@@ -36,12 +255,84 @@ class DecidArchAssistant:
 
         self.configuration = configuration
 
-        # initializing an llm using the Ollama API with the provided configuration.
-        self.llm = Ollama(
-            base_url=self.configuration.uri_ollama,
-            model=self.configuration.model_name,
-            system=self.template,
+        # the llm using the Ollama API with the provided configuration is created on first use
+        self._llm = None
+
+        # prompt templates by name, and the chains prepared from them
+        self.templates = {
+            "suggestion": SUGGESTION_TEMPLATE,
+            "review_suggestion": REVIEW_SUGGESTION_TEMPLATE,
+            "session_prefix": SESSION_PREFIX_TEMPLATE,
+            "suggestion_turn": SUGGESTION_TURN_TEMPLATE,
+            "review_suggestion_turn": REVIEW_TURN_TEMPLATE,
+            "structured_suggestion": STRUCTURED_SUGGESTION_TEMPLATE,
+            "structured_suggestion_turn": STRUCTURED_TURN_TEMPLATE,
+        }
+        self.chains = {}
+        self.suggestion_cache = suggestion_cache
+        self.semantic_cache = semantic_cache
+        self.example_store = example_store
+        # audits of semantic cache hits running in the background
+        self._audits = set()
+
+        self.instrumentation = instrumentation or Instrumentation()
+        # one connection pool and one concurrency bound shared by every async call of this assistant
+        if self.configuration.ollama_backends:
+            self.client = OllamaPool(
+                self.configuration.ollama_backends,
+                self.configuration.model_name,
+                system=self.template,
+                pool_size=self.configuration.max_concurrent_requests,
+                timeout=self.configuration.request_timeout,
+                keep_alive=self.configuration.keep_alive,
+                probe_interval=self.configuration.backend_probe_interval,
+                failure_threshold=self.configuration.backend_failure_threshold,
+                reset_timeout=self.configuration.backend_reset_timeout,
+                instrumentation=self.instrumentation,
+            )
+        else:
+            self.client = OllamaClient(
+                self.configuration.uri_ollama,
+                self.configuration.model_name,
+                system=self.template,
+                pool_size=self.configuration.max_concurrent_requests,
+                timeout=self.configuration.request_timeout,
+                keep_alive=self.configuration.keep_alive,
+            )
+        self.scheduler = LLMScheduler(
+            self.configuration.max_concurrent_requests,
+            max_queued=self.configuration.max_queued_requests,
+            max_queued_per_session=self.configuration.max_queued_requests_per_session,
+            instrumentation=self.instrumentation,
         )
+        self.priorities = {"review_suggestion": BATCH, "review_suggestion_turn": BATCH}
+        # runs the blocking calls that have a deadline, so that the caller can stop waiting for them; an abandoned
+        # call keeps its worker until the request completes or times out, so there is room for as many abandoned calls
+        # as live ones
+        self._deadline_executor = ThreadPoolExecutor(
+            max_workers=2 * self.configuration.max_concurrent_requests, thread_name_prefix="assistant")
+        # semantic cache lookups, stores and audits, kept off the workers of the calls with a deadline
+        self._cache_executor = ThreadPoolExecutor(
+            max_workers=self.configuration.max_concurrent_requests, thread_name_prefix="assistant-cache")
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._llm = _langchain().Ollama(
+                base_url=self.configuration.uri_ollama,
+                model=self.configuration.model_name,
+                system=self.template,
+                timeout=self.configuration.request_timeout,
+            )
+        return self._llm
+
+    @property
+    def queued_requests(self):
+        return self.scheduler.queued()
+
+    @property
+    def running_requests(self):
+        return self.scheduler.running
 
     def create_chain(self, template):
         """
@@ -53,51 +344,441 @@ class DecidArchAssistant:
         Returns:
             chains.LLMChain: A chain object that links the prompt template with the language model.
         """
-        prompt_template = ChatPromptTemplate(
+        langchain = _langchain()
+        prompt_template = langchain.ChatPromptTemplate(
             messages=[
-                HumanMessagePromptTemplate.from_template(template)
+                langchain.HumanMessagePromptTemplate.from_template(template)
             ]
         )
 
-        chain = chains.LLMChain(
+        chain = langchain.chains.LLMChain(
             prompt=prompt_template,
             llm=self.llm,
             verbose=1,
         )
         return chain
 
-    def extract_suggestion(self):
+    def register_template(self, name, template):
         """
-        Metodo per gestire la scelta della migliore opzione di design in base alla concern card pescata.
+        Registers a prompt template so that its chain can be prepared once and reused through get_chain.
+
+        Args:
+            name (str): The name the template is registered under. An existing template with the same name is replaced.
+            template (str): The prompt template.
         """
-        template = """
-        You are an AI assistant helping a team of software architects playing the game DecidArch. Your task is to suggest
-        the best design option for a given concern card, taking into account the stakeholders' quality attribute priorities
-        and any ongoing project events. Here's the information you'll need:
+        self.templates[name] = template
 
-        Project Description:
-        - {project_description}
+    def get_chain(self, name):
+        """
+        Returns the prepared chain for a registered template. The chain is built on first use and cached by
+        template and system prompt, so every later call reuses the same prompt and chain objects.
 
-        Stakeholders and their Quality Attribute Priorities:
-        {stakeholders_info}
+        Args:
+            name (str): The name of a registered template.
 
-        Current Game State:
-        - Current Design Decisions: {current_design_decisions}
-        - Current QA-Scores: {current_qa_scores}
-        - Ongoing Events: {ongoing_events}
+        Returns:
+            chains.LLMChain: The prepared chain for the template.
 
-        Concern Card Description:
-        - {concern_card_description}
+        Raises:
+            KeyError: If no template is registered under the given name.
+        """
+        key = (self.templates[name], self.template)
+        chain = self.chains.get(key)
+        if chain is None:
+            chain = self.create_chain(self.templates[name])
+            self.chains[key] = chain
+        return chain
 
-        Possible Design Options:
-        - {design_options}
+    def render_prompt(self, name, **inputs):
+        """
+        Renders a registered template into the prompt its chain would send, without building the chain, so that
+        the requests sent through the pooled client do not load langchain.
 
-        Based on this information, suggest the best design option that satisfies the stakeholders' priorities and 
-        considers any ongoing events. Provide a rationale for your suggestion.
+        Args:
+            name (str): The name of a registered template.
+            **inputs: The values the prompt template is rendered with.
+
+        Returns:
+            str: The prompt, as rendered by the chat prompt of a chain with a single human message.
+        """
+        return "Human: " + self.templates[name].format(**inputs)
+
+    def run_chain(self, name, **inputs):
+        """
+        Runs the prepared chain for a registered template. When a suggestion cache is configured, identical requests
+        for the same model, prompt template and system prompt are answered from the cache. The request waits for a
+        slot of the scheduler like arun_chain, blocking the calling thread.
+
+        Args:
+            name (str): The name of a registered template.
+            **inputs: The values the prompt template is rendered with.
+
+        Returns:
+            str: The output of the language model.
+        """
+        with self.instrumentation.span("assistant.call", template=name, model=self.configuration.model_name) as span:
+            key, suggestion = self._cached(name, inputs)
+            if suggestion is not None:
+                span.attributes["cache"] = "hit"
+                return suggestion
+
+            chain = self.get_chain(name)
+            timer = _langchain().GenerationTimer()
+            self._acquire(name)
+            try:
+                start = time.perf_counter()
+                suggestion = chain.run(callbacks=[timer], **inputs)
+            finally:
+                self._release()
+            self._record_generation(name, start, timer.llm_start, timer.first_token, timer.end, timer.metadata)
+
+            if key is not None:
+                self.suggestion_cache.set(key, suggestion)
+            return suggestion
+
+    async def arun_chain(self, name, **inputs):
+        """
+        Async variant of run_chain. The prompt is rendered as by the chain (render_prompt) and sent through the shared
+        connection pool; at most configuration.max_concurrent_requests requests are in flight at once, the others
+        wait in the scheduler. The session, priority and deadline of the request are taken from the enclosing
+        scheduler.scheduling block, if any.
+
+        Args:
+            name (str): The name of a registered template.
+            **inputs: The values the prompt template is rendered with.
+
+        Returns:
+            str: The output of the language model.
+        """
+        with self.instrumentation.span("assistant.call", template=name, model=self.configuration.model_name) as span:
+            key, suggestion = self._cached(name, inputs)
+            if suggestion is not None:
+                span.attributes["cache"] = "hit"
+                return suggestion
+
+            with self.instrumentation.span("assistant.prompt", template=name):
+                prompt = self.render_prompt(name, **inputs)
+            await self._aacquire(name)
+            try:
+                with self.instrumentation.span("assistant.request", template=name):
+                    response = await self.client.agenerate(prompt)
+            finally:
+                self._release()
+            self.instrumentation.record_generation(response, template=name, model=self.configuration.model_name)
+            suggestion = response["response"]
+
+            if key is not None:
+                self.suggestion_cache.set(key, suggestion)
+            return suggestion
+
+    def stream_chain(self, name, **inputs):
+        """
+        Streams the output for a registered template piece by piece, as Ollama generates it. A cached suggestion is
+        returned as a single piece.
+
+        Args:
+            name (str): The name of a registered template.
+            **inputs: The values the prompt template is rendered with.
+
+        Returns:
+            SuggestionStream: An iterable over the pieces of text, which also exposes the time to first token.
+        """
+        key, suggestion = self._cached(name, inputs)
+        if suggestion is not None:
+            return SuggestionStream(iter([{"response": suggestion, "done": True}]))
+
+        start = time.perf_counter()
+        prompt = self.render_prompt(name, **inputs)
+        self.instrumentation.record("assistant.prompt", time.perf_counter() - start, template=name)
+
+        def chunks():
+            # the slot is taken when the stream is iterated, so that the wait counts against a deadline of the stream
+            self._acquire(name)
+            try:
+                yield from self.client.stream(prompt)
+            finally:
+                self._release()
+
+        return SuggestionStream(chunks(), on_complete=self._completed(name, key))
+
+    def astream_chain(self, name, **inputs):
         """
-        return self.create_chain(template)
+        Async variant of stream_chain, scheduled like arun_chain.
+
+        Args:
+            name (str): The name of a registered template.
+            **inputs: The values the prompt template is rendered with.
 
-    def extract_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options):
+        Returns:
+            AsyncSuggestionStream: An async iterable over the pieces of text, which also exposes the time to first token.
+        """
+        key, suggestion = self._cached(name, inputs)
+        prompt = None if suggestion is not None else self.render_prompt(name, **inputs)
+
+        async def chunks():
+            if suggestion is not None:
+                yield {"response": suggestion, "done": True}
+                return
+            await self._aacquire(name)
+            try:
+                async for chunk in self.client.astream(prompt):
+                    yield chunk
+            finally:
+                self._release()
+
+        return AsyncSuggestionStream(chunks(), on_complete=None if suggestion is not None else self._completed(name, key))
+
+    def _scheduling(self, name, session):
+        context = dict(session=session, priority=self.priorities.get(name, INTERACTIVE), deadline=None)
+        context.update(current_scheduling())
+        return context
+
+    def _acquire(self, name, session=None):
+        context = self._scheduling(name, session)
+        with self.instrumentation.span("assistant.queue", template=name, priority=context["priority"]):
+            self.scheduler.acquire(context["session"], context["priority"], context["deadline"])
+
+    async def _aacquire(self, name, session=None):
+        context = self._scheduling(name, session)
+        with self.instrumentation.span("assistant.queue", template=name, priority=context["priority"]):
+            await self.scheduler.aacquire(context["session"], context["priority"], context["deadline"])
+
+    def _release(self):
+        self.scheduler.release()
+
+    def fallback_suggestion(self, stakeholders, current_qa_scores, concern_card_description, design_options):
+        """
+        Returns the suggestion of the local RuleBasedAdvisor, used when the LLM misses a deadline or fails.
+
+        Args:
+            stakeholders (list): The stakeholders whose priorities weight the impacts.
+            current_qa_scores (dict or str): The current QA scores, or their prompt rendering.
+            concern_card_description (str): The description of the concern card.
+            design_options (dict): The design options of the concern card.
+
+        Returns:
+            str: The best design option and a short rationale.
+        """
+        self.instrumentation.count("assistant.fallbacks")
+        options = ConcernCard(None, concern_card_description, design_options).design_options()
+        return RuleBasedAdvisor(stakeholders).suggest(options, current_qa_scores)
+
+    def fallback_structured_suggestion(self, stakeholders, current_qa_scores, concern_card_description, design_options):
+        """
+        Structured variant of fallback_suggestion.
+
+        Args:
+            Same as fallback_suggestion.
+
+        Returns:
+            StructuredSuggestion: The best design option and a short rationale, with source "advisor".
+        """
+        self.instrumentation.count("assistant.fallbacks", structured=True)
+        options = ConcernCard(None, concern_card_description, design_options).design_options()
+        option, rationale = RuleBasedAdvisor(stakeholders).explain(options, current_qa_scores)
+        return StructuredSuggestion(option, rationale, source="advisor", attempts=0)
+
+    def _before_deadline(self, call, deadline, fallback):
+        if deadline is None:
+            return call()
+        # the worker waits for its scheduler slot with the caller's scheduling context and the deadline
+        with scheduling(deadline=deadline):
+            context = contextvars.copy_context()
+        future = self._deadline_executor.submit(context.run, call)
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except SchedulerOverloaded:
+            raise
+        except Exception:
+            # timed out or failed; an answer arriving within the request timeout still fills the suggestion cache
+            return fallback()
+
+    async def _abefore_deadline(self, call, deadline, fallback):
+        if deadline is None:
+            return await call
+        try:
+            with scheduling(deadline=deadline):
+                return await asyncio.wait_for(call, max(0.0, deadline - time.monotonic()))
+        except SchedulerOverloaded:
+            raise
+        except Exception:
+            return fallback()
+
+    def _semantic_lookup(self, name, inputs):
+        with self.instrumentation.span("assistant.semantic_lookup", template=name) as span:
+            state = self.semantic_cache.state(self._cache_key(name, {}), **inputs)
+            match = self.semantic_cache.lookup(state)
+            span.attributes["hit"] = match is not None
+        self.instrumentation.count("assistant.semantic_hits" if match is not None else "assistant.semantic_misses",
+                                   template=name)
+        if match is not None:
+            self.instrumentation.observe("assistant.semantic_similarity", match.similarity, template=name)
+        return state, match
+
+    def _audited(self, name, false_hit):
+        self.instrumentation.count("assistant.semantic_audits", template=name)
+        if false_hit:
+            self.instrumentation.count("assistant.semantic_false_hits", template=name)
+
+    def _audit(self, name, state, match, call):
+        # the fresh answer is only a measurement, so it waits behind the requests of the games
+        with scheduling(priority=BATCH, deadline=None):
+            suggestion = call()
+        self._audited(name, self.semantic_cache.audit(state, match, suggestion))
+
+    async def _aaudit(self, name, state, match, call):
+        with scheduling(priority=BATCH, deadline=None):
+            suggestion = await call()
+        loop = asyncio.get_running_loop()
+        self._audited(name, await loop.run_in_executor(
+            self._cache_executor, self.semantic_cache.audit, state, match, suggestion))
+
+    def _semantic(self, name, inputs, call):
+        # answers from the semantic cache when a similar request was answered before, else calls and caches
+        if self.semantic_cache is None:
+            return call()
+        state, match = self._semantic_lookup(name, inputs)
+        if match is None:
+            suggestion = call()
+            self.semantic_cache.store(state, suggestion)
+            return suggestion
+        if self.semantic_cache.should_audit():
+            self._cache_executor.submit(self._audit, name, state, match, call)
+        return match.suggestion
+
+    async def _asemantic(self, name, inputs, call):
+        # call returns a new coroutine, so that an audit can send the request again
+        if self.semantic_cache is None:
+            return await call()
+        loop = asyncio.get_running_loop()
+        state, match = await loop.run_in_executor(self._cache_executor, self._semantic_lookup, name, inputs)
+        if match is None:
+            suggestion = await call()
+            await loop.run_in_executor(self._cache_executor, self.semantic_cache.store, state, suggestion)
+            return suggestion
+        if self.semantic_cache.should_audit():
+            task = asyncio.ensure_future(self._aaudit(name, state, match, call))
+            self._audits.add(task)
+            task.add_done_callback(self._audits.discard)
+        return match.suggestion
+
+    def _structured_answer(self, name, response, options, attempt):
+        try:
+            suggestion = parse_suggestion(response["response"], options)
+        except SuggestionFormatError as error:
+            self.instrumentation.count("assistant.malformed_outputs", template=name)
+            return None, STRUCTURED_RETRY_NOTE.format(error=error)
+        suggestion.attempts = attempt + 1
+        return suggestion, None
+
+    def _structured(self, name, key, cached, prompt, options, send):
+        # the answer is constrained to the schema by Ollama, and malformed ones are asked again a bounded number of
+        # times, with the reason appended to the prompt
+        with self.instrumentation.span("assistant.call", template=name, model=self.configuration.model_name) as span:
+            if cached is not None:
+                span.attributes["cache"] = "hit"
+                return parse_suggestion(cached, options)
+            schema, note = suggestion_schema(options), ""
+            for attempt in range(1 + self.configuration.structured_output_retries):
+                with self.instrumentation.span("assistant.request", template=name, attempt=attempt):
+                    response = send(prompt + note, schema)
+                suggestion, note = self._structured_answer(name, response, options, attempt)
+                if suggestion is not None:
+                    if key is not None:
+                        self.suggestion_cache.set(key, response["response"])
+                    return suggestion
+            raise SuggestionFormatError(f"No usable answer after {attempt + 1} attempts.")
+
+    async def _astructured(self, name, key, cached, prompt, options, send):
+        with self.instrumentation.span("assistant.call", template=name, model=self.configuration.model_name) as span:
+            if cached is not None:
+                span.attributes["cache"] = "hit"
+                return parse_suggestion(cached, options)
+            schema, note = suggestion_schema(options), ""
+            for attempt in range(1 + self.configuration.structured_output_retries):
+                with self.instrumentation.span("assistant.request", template=name, attempt=attempt):
+                    response = await send(prompt + note, schema)
+                suggestion, note = self._structured_answer(name, response, options, attempt)
+                if suggestion is not None:
+                    if key is not None:
+                        self.suggestion_cache.set(key, response["response"])
+                    return suggestion
+            raise SuggestionFormatError(f"No usable answer after {attempt + 1} attempts.")
+
+    def _structured_inputs(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options):
+        # the options are sent by name, so that single-decision cards also offer a name to answer with
+        options = ConcernCard(None, concern_card_description, design_options).design_options()
+        inputs = dict(
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events,
+            concern_card_description=concern_card_description,
+            design_options=options,
+            examples=self.select_examples(stakeholders, concern_card_description, design_options)
+        )
+        return options, inputs
+
+    def select_examples(self, stakeholders, concern_card_description, design_options):
+        """
+        Selects the few-shot examples most relevant to a suggestion request from the example store, within its
+        token budget, and renders them as the examples section of the suggestion templates.
+
+        Args:
+            stakeholders (list): The stakeholders of the game.
+            concern_card_description (str): The description of the concern card.
+            design_options (dict): The design options of the concern card.
+
+        Returns:
+            str: The examples section, empty without an example store or relevant examples.
+        """
+        if self.example_store is None:
+            return ""
+        with self.instrumentation.span("assistant.examples") as span:
+            examples = self.example_store.select(concern_card_description, design_options, stakeholders)
+            span.attributes["selected"] = len(examples)
+        return self.example_store.render(examples)
+
+    def _cached(self, name, inputs):
+        if self.suggestion_cache is None:
+            return None, None
+        key = self._cache_key(name, inputs)
+        suggestion = self.suggestion_cache.get(key)
+        self.instrumentation.count("assistant.cache_hits" if suggestion is not None else "assistant.cache_misses",
+                                   template=name)
+        return key, suggestion
+
+    def _completed(self, name, key):
+        def on_complete(stream):
+            self.instrumentation.record("assistant.time_to_first_token", stream.time_to_first_token or 0.0,
+                                        template=name)
+            self.instrumentation.record("assistant.call", stream.total_time, template=name,
+                                        model=self.configuration.model_name, mode="stream")
+            self.instrumentation.record_generation(stream.metadata, template=name,
+                                                   model=self.configuration.model_name)
+            if key is not None:
+                self.suggestion_cache.set(key, stream.text)
+        return on_complete
+
+    def _record_generation(self, name, start, llm_start, first_token, end, metadata):
+        # stages of a chain call, from the callback timestamps: prompt formatting, time to first token, generation
+        end = end or time.perf_counter()
+        llm_start = llm_start or start
+        first_token = first_token or end
+        self.instrumentation.record("assistant.prompt", llm_start - start, template=name)
+        self.instrumentation.record("assistant.time_to_first_token", first_token - llm_start, template=name)
+        self.instrumentation.record("assistant.generation", end - first_token, template=name)
+        self.instrumentation.record_generation(metadata, template=name, model=self.configuration.model_name)
+
+    def _cache_key(self, name, inputs):
+        return make_cache_key(self.configuration.model_name, self.templates[name], self.template, **inputs)
+
+    def extract_suggestion(self):
+        """
+        Metodo per gestire la scelta della migliore opzione di design in base alla concern card pescata.
+        """
+        return self.get_chain("suggestion")
+
+    def extract_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
         """
         Generates a design suggestion based on project description, stakeholder information, design decisions, QA scores, ongoing events, and concern card.
 
@@ -109,47 +790,42 @@ class DecidArchAssistant:
             ongoing_events (str): A list of ongoing events in the project.
             concern_card_description (str): The description of the concern card.
             design_options (str): A list of possible design options to choose from.
+            deadline (float, optional): time.monotonic() by which the suggestion is needed. If the LLM has not
+                answered by then, or fails, the rule-based fallback_suggestion is returned instead.
 
         Returns:
             str: The assistant's suggestion for the best design option, including a rationale.
         """
-        stakeholders_info = "\n".join([f"- {stakeholder.role}: {stakeholder.quality_attributes}" for stakeholder in stakeholders])
-        suggestion = self.extract_suggestion().run(
-            project_description=project_description,
-            stakeholders_info=stakeholders_info,
-            current_design_decisions=current_design_decisions,
-            current_qa_scores=current_qa_scores,
-            ongoing_events=ongoing_events,
-            concern_card_description=concern_card_description,
+        stakeholders_info = format_stakeholders(stakeholders)
+        semantic_inputs = dict(
+            project_description=project_description, stakeholders=stakeholders,
+            current_design_decisions=current_design_decisions, current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events, concern_card_description=concern_card_description,
             design_options=design_options
         )
-        return suggestion
+
+        def suggest():
+            return self.run_chain(
+                "suggestion",
+                project_description=project_description,
+                stakeholders_info=stakeholders_info,
+                current_design_decisions=current_design_decisions,
+                current_qa_scores=current_qa_scores,
+                ongoing_events=ongoing_events,
+                concern_card_description=concern_card_description,
+                design_options=design_options,
+                examples=self.select_examples(stakeholders, concern_card_description, design_options)
+            )
+
+        suggestion = functools.partial(self._semantic, "suggestion", semantic_inputs, suggest)
+        return self._before_deadline(suggestion, deadline, lambda: self.fallback_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
 
     def extract_review_suggestion(self):
         """
         Metodo per gestire la revisione delle decisioni passate a seguito di un evento imprevisto.
         """
-        template = """
-        You are an AI assistant helping a team of software architects playing the game DecidArch. An unexpected event has occurred,
-        and it might require changes to the previous design decisions. Your task is to suggest which past design decision(s) should
-        be revised based on the new event. Here's the information you'll need:
-
-        Project Description:
-        - {project_description}
-
-        Stakeholders and their Quality Attribute Priorities:
-        {stakeholders_info}
-
-        Current Game State:
-        - Current Design Decisions: {current_design_decisions}
-        - Current QA-Scores: {current_qa_scores}
-
-        Ongoing Events:
-        {ongoing_events}
-
-        Based on this event, review the previous decisions and suggest necessary revisions. Provide a rationale for your suggestion.
-        """
-        return self.create_chain(template)
+        return self.get_chain("review_suggestion")
 
     def extract_review_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events):
         """
@@ -166,9 +842,9 @@ class DecidArchAssistant:
         Returns:
             str: The assistant's suggestion for revising past design decisions, including a rationale.
         """
-        stakeholders_info = "\n".join(
-            [f"- {stakeholder.role}: {stakeholder.quality_attributes}" for stakeholder in stakeholders])
-        suggestion = self.extract_review_suggestion().run(
+        stakeholders_info = format_stakeholders(stakeholders)
+        suggestion = self.run_chain(
+            "review_suggestion",
             project_description=project_description,
             stakeholders_info=stakeholders_info,
             current_design_decisions=current_design_decisions,
@@ -176,3 +852,571 @@ class DecidArchAssistant:
             ongoing_events=ongoing_events
         )
         return suggestion
+
+    async def aextract_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Async variant of extract_suggestion_chain, so that a single process can wait on many games at once.
+
+        Args:
+            Same as extract_suggestion_chain.
+
+        Returns:
+            str: The assistant's suggestion for the best design option, including a rationale.
+        """
+        suggest = functools.partial(
+            self.arun_chain,
+            "suggestion",
+            project_description=project_description,
+            stakeholders_info=format_stakeholders(stakeholders),
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events,
+            concern_card_description=concern_card_description,
+            design_options=design_options,
+            examples=self.select_examples(stakeholders, concern_card_description, design_options)
+        )
+        semantic_inputs = dict(
+            project_description=project_description, stakeholders=stakeholders,
+            current_design_decisions=current_design_decisions, current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events, concern_card_description=concern_card_description,
+            design_options=design_options
+        )
+        suggestion = self._asemantic("suggestion", semantic_inputs, suggest)
+        return await self._abefore_deadline(suggestion, deadline, lambda: self.fallback_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    async def aextract_review_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events):
+        """
+        Async variant of extract_review_suggestion_chain.
+
+        Args:
+            Same as extract_review_suggestion_chain.
+
+        Returns:
+            str: The assistant's suggestion for revising past design decisions, including a rationale.
+        """
+        return await self.arun_chain(
+            "review_suggestion",
+            project_description=project_description,
+            stakeholders_info=format_stakeholders(stakeholders),
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events
+        )
+
+    def stream_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Streaming variant of extract_suggestion_chain: the suggestion can be shown while it is being generated.
+
+        Args:
+            Same as extract_suggestion_chain.
+
+        Returns:
+            SuggestionStream: An iterable over the pieces of the suggestion, exposing the time to first token. With a
+                deadline, the fallback suggestion is shown if no text has arrived by then.
+        """
+        stream = self.stream_chain(
+            "suggestion",
+            project_description=project_description,
+            stakeholders_info=format_stakeholders(stakeholders),
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events,
+            concern_card_description=concern_card_description,
+            design_options=design_options,
+            examples=self.select_examples(stakeholders, concern_card_description, design_options)
+        )
+        return stream.set_deadline(deadline, lambda: self.fallback_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    def astream_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Async variant of stream_suggestion_chain.
+
+        Args:
+            Same as extract_suggestion_chain.
+
+        Returns:
+            AsyncSuggestionStream: An async iterable over the pieces of the suggestion, exposing the time to first token.
+        """
+        stream = self.astream_chain(
+            "suggestion",
+            project_description=project_description,
+            stakeholders_info=format_stakeholders(stakeholders),
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events,
+            concern_card_description=concern_card_description,
+            design_options=design_options,
+            examples=self.select_examples(stakeholders, concern_card_description, design_options)
+        )
+        return stream.set_deadline(deadline, lambda: self.fallback_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    def _structured_request(self, project_description, stakeholders, inputs):
+        name = "structured_suggestion"
+        inputs = dict(inputs, project_description=project_description,
+                      stakeholders_info=format_stakeholders(stakeholders))
+        key, cached = self._cached(name, inputs)
+        with self.instrumentation.span("assistant.prompt", template=name):
+            prompt = self.render_prompt(name, **inputs)
+        return name, key, cached, prompt
+
+    def extract_structured_suggestion(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Structured variant of extract_suggestion_chain. Ollama is asked for a JSON object constrained by a schema
+        whose option field can only take the names of the design options; an answer that still cannot be used is
+        requested again up to configuration.structured_output_retries times.
+
+        Args:
+            Same as extract_suggestion_chain.
+
+        Returns:
+            StructuredSuggestion: The chosen option, named as in the design options, and its rationale.
+
+        Raises:
+            SuggestionFormatError: If no attempt gives a usable answer and there is no deadline. With a deadline, the
+                rule-based fallback_structured_suggestion is returned instead.
+        """
+        options, inputs = self._structured_inputs(
+            project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events,
+            concern_card_description, design_options)
+        name, key, cached, prompt = self._structured_request(project_description, stakeholders, inputs)
+
+        def send(prompt, schema):
+            self._acquire(name)
+            try:
+                response = self.client.generate(prompt, format=schema)
+            finally:
+                self._release()
+            self.instrumentation.record_generation(response, template=name, model=self.configuration.model_name)
+            return response
+
+        def suggest():
+            return self._structured(name, key, cached, prompt, options, send)
+
+        return self._before_deadline(suggest, deadline, lambda: self.fallback_structured_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    async def aextract_structured_suggestion(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Async variant of extract_structured_suggestion, scheduled like arun_chain.
+
+        Args:
+            Same as extract_suggestion_chain.
+
+        Returns:
+            StructuredSuggestion: The chosen option and its rationale.
+        """
+        options, inputs = self._structured_inputs(
+            project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events,
+            concern_card_description, design_options)
+        name, key, cached, prompt = self._structured_request(project_description, stakeholders, inputs)
+
+        async def send(prompt, schema):
+            await self._aacquire(name)
+            try:
+                response = await self.client.agenerate(prompt, format=schema)
+            finally:
+                self._release()
+            self.instrumentation.record_generation(response, template=name, model=self.configuration.model_name)
+            return response
+
+        suggestion = self._astructured(name, key, cached, prompt, options, send)
+        return await self._abefore_deadline(suggestion, deadline, lambda: self.fallback_structured_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    def start_session(self):
+        """
+        Opens a session for one game. Its methods take the same arguments as the suggestion methods of the assistant,
+        but the project description and the stakeholders are evaluated by Ollama once and reused by every turn.
+
+        Returns:
+            AssistantSession: The session.
+        """
+        return AssistantSession(self)
+
+
+class AssistantSession:
+    """
+    Per-game conversation with Ollama in which the static part of the prompts is prefilled only once.
+
+    The system prompt, project description and stakeholders are rendered as a fixed prefix and sent in a first,
+    one-token request. Every turn then sends only its delta (game state and concern card) along with the "context"
+    returned for the prefix, so Ollama reuses the prefix tokens instead of evaluating them again, and keep_alive keeps
+    the model and its cache loaded between turns. Turns continue from the prefix, never from each other: they stay
+    independent, so a prefetched suggestion that is discarded does not leak into the next turn, and the context does
+    not grow over the game. A call with a different project or stakeholders starts a new prefix.
+
+    Attributes:
+        assistant (DecidArchAssistant): The assistant whose client, cache and instrumentation are used.
+        prefix (str, optional): The rendered static prefix, once the session has been primed.
+        context (list, optional): The context returned by Ollama for the prefix.
+        turns (int): Number of turns sent to Ollama.
+        prompt_tokens (int): Prompt tokens evaluated by Ollama for the session, priming included.
+        prefill_time (float): Seconds Ollama spent evaluating them.
+
+    Methods:
+        run(name, project_description, stakeholders, **inputs): Runs a turn template of the assistant.
+        arun(name, project_description, stakeholders, **inputs): Async variant of run.
+        stream(name, project_description, stakeholders, **inputs): Streaming variant of run.
+        extract_suggestion_chain(...), extract_review_suggestion_chain(...): Same as the assistant methods.
+        aextract_suggestion_chain(...), aextract_review_suggestion_chain(...): Same as the assistant methods.
+        stream_suggestion_chain(...): Same as the assistant method.
+        extract_structured_suggestion(...), aextract_structured_suggestion(...): Same as the assistant methods.
+        reset(): Forgets the prefix, so that the next turn primes the session again.
+    """
+
+    def __init__(self, assistant):
+        """
+        Initializes a session. Nothing is sent to Ollama until the first turn.
+
+        Args:
+            assistant (DecidArchAssistant): The assistant the session belongs to.
+        """
+        self.assistant = assistant
+        self.prefix = None
+        self.context = None
+        self.turns = 0
+        self.prompt_tokens = 0
+        self.prefill_time = 0.0
+        self._lock = threading.Lock()
+        self._prime_lock = threading.Lock()
+
+    def _render_prefix(self, project_description, stakeholders):
+        return self.assistant.render_prompt(
+            "session_prefix",
+            project_description=project_description,
+            stakeholders_info=format_stakeholders(stakeholders),
+        )
+
+    def _account(self, metadata, turns=1):
+        with self._lock:
+            self.turns += turns
+            self.prompt_tokens += metadata.get("prompt_eval_count") or 0
+            self.prefill_time += (metadata.get("prompt_eval_duration") or 0) / 1e9
+
+    def _primed(self, prefix, response):
+        self.assistant.instrumentation.count("session.primes")
+        self.assistant.instrumentation.record_generation(response, template="session_prefix",
+                                                         model=self.assistant.configuration.model_name)
+        self._account(response, turns=0)
+        self.prefix, self.context = prefix, response.get("context")
+
+    def _prime(self, prefix):
+        # the prefetcher may run a turn on another thread, so only one of them sends the prefix
+        with self._prime_lock:
+            if prefix != self.prefix:
+                self._primed(prefix, self.assistant.client.generate(prefix, num_predict=1))
+
+    async def _aprime(self, prefix):
+        # concurrent tasks may both send a new prefix before it is primed; only the first response is kept
+        if prefix != self.prefix:
+            response = await self.assistant.client.agenerate(prefix, num_predict=1)
+            if prefix != self.prefix:
+                self._primed(prefix, response)
+
+    def _turn(self, name, project_description, stakeholders, inputs):
+        cache_inputs = dict(inputs, project_description=project_description,
+                            stakeholders_info=format_stakeholders(stakeholders))
+        key, suggestion = self.assistant._cached(name, cache_inputs)
+        prefix = self._render_prefix(project_description, stakeholders)
+        return key, suggestion, prefix
+
+    def _sent(self, metadata, name):
+        self._account(metadata)
+        self.assistant.instrumentation.record_generation(metadata, template=name,
+                                                         model=self.assistant.configuration.model_name)
+
+    def run(self, name, project_description, stakeholders, **inputs):
+        """
+        Runs a turn template of the assistant in the session, going through the assistant's suggestion cache.
+
+        Args:
+            name (str): The name of a registered turn template, e.g. "suggestion_turn".
+            project_description (str): A description of the project, part of the prefix.
+            stakeholders (list): The stakeholders of the game, part of the prefix.
+            **inputs: The values the turn template is rendered with.
+
+        Returns:
+            str: The output of the language model.
+        """
+        with self.assistant.instrumentation.span("assistant.call", template=name, session=True,
+                                                 model=self.assistant.configuration.model_name) as span:
+            key, suggestion, prefix = self._turn(name, project_description, stakeholders, inputs)
+            if suggestion is not None:
+                span.attributes["cache"] = "hit"
+                return suggestion
+
+            with self.assistant.instrumentation.span("assistant.prompt", template=name):
+                prompt = self.assistant.render_prompt(name, **inputs)
+            self.assistant._acquire(name, session=self)
+            try:
+                self._prime(prefix)
+                with self.assistant.instrumentation.span("assistant.request", template=name):
+                    response = self.assistant.client.generate(prompt, context=self.context, system="")
+            finally:
+                self.assistant._release()
+            self._sent(response, name)
+            suggestion = response["response"]
+
+            if key is not None:
+                self.assistant.suggestion_cache.set(key, suggestion)
+            return suggestion
+
+    async def arun(self, name, project_description, stakeholders, **inputs):
+        """
+        Async variant of run, scheduled by the assistant's scheduler with the session as fairness key.
+
+        Args:
+            Same as run.
+
+        Returns:
+            str: The output of the language model.
+        """
+        with self.assistant.instrumentation.span("assistant.call", template=name, session=True,
+                                                 model=self.assistant.configuration.model_name) as span:
+            key, suggestion, prefix = self._turn(name, project_description, stakeholders, inputs)
+            if suggestion is not None:
+                span.attributes["cache"] = "hit"
+                return suggestion
+
+            with self.assistant.instrumentation.span("assistant.prompt", template=name):
+                prompt = self.assistant.render_prompt(name, **inputs)
+            await self.assistant._aacquire(name, session=self)
+            try:
+                await self._aprime(prefix)
+                with self.assistant.instrumentation.span("assistant.request", template=name):
+                    response = await self.assistant.client.agenerate(prompt, context=self.context, system="")
+            finally:
+                self.assistant._release()
+            self._sent(response, name)
+            suggestion = response["response"]
+
+            if key is not None:
+                self.assistant.suggestion_cache.set(key, suggestion)
+            return suggestion
+
+    def stream(self, name, project_description, stakeholders, **inputs):
+        """
+        Streaming variant of run. The session is primed when the stream is first iterated.
+
+        Args:
+            Same as run.
+
+        Returns:
+            SuggestionStream: An iterable over the pieces of text, which also exposes the time to first token.
+        """
+        key, suggestion, prefix = self._turn(name, project_description, stakeholders, inputs)
+        if suggestion is not None:
+            return SuggestionStream(iter([{"response": suggestion, "done": True}]))
+
+        start = time.perf_counter()
+        prompt = self.assistant.render_prompt(name, **inputs)
+        self.assistant.instrumentation.record("assistant.prompt", time.perf_counter() - start, template=name)
+        completed = self.assistant._completed(name, key)
+
+        def chunks():
+            # queuing and priming happen when the stream is iterated, so that they count against a deadline of the
+            # stream
+            self.assistant._acquire(name, session=self)
+            try:
+                self._prime(prefix)
+                yield from self.assistant.client.stream(prompt, context=self.context, system="")
+            finally:
+                self.assistant._release()
+
+        def on_complete(stream):
+            self._account(stream.metadata)
+            completed(stream)
+
+        return SuggestionStream(chunks(), on_complete=on_complete)
+
+    def reset(self):
+        """
+        Forgets the prefix and its context, e.g. when Ollama has been restarted or the model unloaded.
+        """
+        with self._prime_lock:
+            self.prefix = None
+            self.context = None
+
+    def extract_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Session variant of DecidArchAssistant.extract_suggestion_chain.
+
+        Args:
+            Same as DecidArchAssistant.extract_suggestion_chain.
+
+        Returns:
+            str: The assistant's suggestion for the best design option, including a rationale.
+        """
+        suggest = functools.partial(
+            self.run, "suggestion_turn", project_description, stakeholders,
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events,
+            concern_card_description=concern_card_description,
+            design_options=design_options,
+            examples=self.assistant.select_examples(stakeholders, concern_card_description, design_options)
+        )
+        semantic_inputs = dict(
+            project_description=project_description, stakeholders=stakeholders,
+            current_design_decisions=current_design_decisions, current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events, concern_card_description=concern_card_description,
+            design_options=design_options
+        )
+        suggestion = functools.partial(self.assistant._semantic, "suggestion_turn", semantic_inputs, suggest)
+        return self.assistant._before_deadline(suggestion, deadline, lambda: self.assistant.fallback_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    def extract_review_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events):
+        """
+        Session variant of DecidArchAssistant.extract_review_suggestion_chain.
+
+        Args:
+            Same as DecidArchAssistant.extract_review_suggestion_chain.
+
+        Returns:
+            str: The assistant's suggestion for revising past design decisions, including a rationale.
+        """
+        return self.run(
+            "review_suggestion_turn", project_description, stakeholders,
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events
+        )
+
+    async def aextract_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Session variant of DecidArchAssistant.aextract_suggestion_chain.
+
+        Args:
+            Same as DecidArchAssistant.extract_suggestion_chain.
+
+        Returns:
+            str: The assistant's suggestion for the best design option, including a rationale.
+        """
+        suggest = functools.partial(
+            self.arun, "suggestion_turn", project_description, stakeholders,
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events,
+            concern_card_description=concern_card_description,
+            design_options=design_options,
+            examples=self.assistant.select_examples(stakeholders, concern_card_description, design_options)
+        )
+        semantic_inputs = dict(
+            project_description=project_description, stakeholders=stakeholders,
+            current_design_decisions=current_design_decisions, current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events, concern_card_description=concern_card_description,
+            design_options=design_options
+        )
+        suggestion = self.assistant._asemantic("suggestion_turn", semantic_inputs, suggest)
+        return await self.assistant._abefore_deadline(suggestion, deadline, lambda: self.assistant.fallback_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    async def aextract_review_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events):
+        """
+        Session variant of DecidArchAssistant.aextract_review_suggestion_chain.
+
+        Args:
+            Same as DecidArchAssistant.extract_review_suggestion_chain.
+
+        Returns:
+            str: The assistant's suggestion for revising past design decisions, including a rationale.
+        """
+        return await self.arun(
+            "review_suggestion_turn", project_description, stakeholders,
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events
+        )
+
+    def stream_suggestion_chain(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Session variant of DecidArchAssistant.stream_suggestion_chain.
+
+        Args:
+            Same as DecidArchAssistant.extract_suggestion_chain.
+
+        Returns:
+            SuggestionStream: An iterable over the pieces of the suggestion, exposing the time to first token.
+        """
+        stream = self.stream(
+            "suggestion_turn", project_description, stakeholders,
+            current_design_decisions=current_design_decisions,
+            current_qa_scores=current_qa_scores,
+            ongoing_events=ongoing_events,
+            concern_card_description=concern_card_description,
+            design_options=design_options,
+            examples=self.assistant.select_examples(stakeholders, concern_card_description, design_options)
+        )
+        return stream.set_deadline(deadline, lambda: self.assistant.fallback_suggestion(
+            stakeholders, current_qa_scores, concern_card_description, design_options))
+
+    def _structured_request(self, project_description, stakeholders, inputs):
+        name = "structured_suggestion_turn"
+        key, cached, prefix = self._turn(name, project_description, stakeholders, inputs)
+        with self.assistant.instrumentation.span("assistant.prompt", template=name):
+            prompt = self.assistant.render_prompt(name, **inputs)
+        return name, key, cached, prefix, prompt
+
+    def extract_structured_suggestion(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Session variant of DecidArchAssistant.extract_structured_suggestion.
+
+        Args:
+            Same as DecidArchAssistant.extract_suggestion_chain.
+
+        Returns:
+            StructuredSuggestion: The chosen option and its rationale.
+        """
+        options, inputs = self.assistant._structured_inputs(
+            project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events,
+            concern_card_description, design_options)
+        name, key, cached, prefix, prompt = self._structured_request(project_description, stakeholders, inputs)
+
+        def send(prompt, schema):
+            self.assistant._acquire(name, session=self)
+            try:
+                self._prime(prefix)
+                response = self.assistant.client.generate(prompt, context=self.context, system="", format=schema)
+            finally:
+                self.assistant._release()
+            self._sent(response, name)
+            return response
+
+        suggestion = functools.partial(self.assistant._structured, name, key, cached, prompt, options, send)
+        fallback = functools.partial(self.assistant.fallback_structured_suggestion,
+                                     stakeholders, current_qa_scores, concern_card_description, design_options)
+        return self.assistant._before_deadline(suggestion, deadline, fallback)
+
+    async def aextract_structured_suggestion(self, project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events, concern_card_description, design_options, deadline=None):
+        """
+        Session variant of DecidArchAssistant.aextract_structured_suggestion.
+
+        Args:
+            Same as DecidArchAssistant.extract_suggestion_chain.
+
+        Returns:
+            StructuredSuggestion: The chosen option and its rationale.
+        """
+        options, inputs = self.assistant._structured_inputs(
+            project_description, stakeholders, current_design_decisions, current_qa_scores, ongoing_events,
+            concern_card_description, design_options)
+        name, key, cached, prefix, prompt = self._structured_request(project_description, stakeholders, inputs)
+
+        async def send(prompt, schema):
+            await self.assistant._aacquire(name, session=self)
+            try:
+                await self._aprime(prefix)
+                response = await self.assistant.client.agenerate(prompt, context=self.context, system="", format=schema)
+            finally:
+                self.assistant._release()
+            self._sent(response, name)
+            return response
+
+        suggestion = self.assistant._astructured(name, key, cached, prompt, options, send)
+        fallback = functools.partial(self.assistant.fallback_structured_suggestion,
+                                     stakeholders, current_qa_scores, concern_card_description, design_options)
+        return await self.assistant._abefore_deadline(suggestion, deadline, fallback)
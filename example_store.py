@@ -0,0 +1,436 @@
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from card_library import read_library
+from context_builder import estimate_tokens
+from models import ConcernCard
+from semantic_cache import canonical_text, mentioned_option
+
+
+# words too common in concern and option texts to tell them apart
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or should the to use we what when which "
+    "with".split())
+
+# weight of each kind of feature in the similarity: the concern matters most, then what the options trade off
+_CONCERN_WEIGHT = 1.0
+_OPTION_WEIGHT = 0.5
+_IMPACT_WEIGHT = 0.5
+_PRIORITY_WEIGHT = 0.25
+
+
+def example_features(concern, options, priorities=None):
+    """
+    Returns the features a few-shot example or a suggestion request is compared on.
+
+    Args:
+        concern (str): The concern card description.
+        options (dict): The impacts of each design option, by option name.
+        priorities (dict, optional): The highest stakeholder priority of each quality attribute.
+
+    Returns:
+        dict: The weight of each feature: concern words, option words, signed impacts and stakeholder priorities.
+    """
+    features = {}
+    for word in canonical_text(concern).split():
+        if word not in _STOP_WORDS:
+            features["c:" + word] = _CONCERN_WEIGHT
+    for option, impacts in options.items():
+        for word in canonical_text(option).split():
+            if word not in _STOP_WORDS:
+                features.setdefault("o:" + word, _OPTION_WEIGHT)
+        for attr, impact in impacts.items():
+            if impact:
+                features[f"i:{canonical_text(attr)}{'+' if impact > 0 else '-'}"] = _IMPACT_WEIGHT
+    for attr, priority in (priorities or {}).items():
+        features["p:" + canonical_text(attr)] = _PRIORITY_WEIGHT * priority
+    return features
+
+
+def stakeholder_priorities(stakeholders):
+    """
+    Returns the highest priority any stakeholder gives to each quality attribute.
+
+    Args:
+        stakeholders (list): StakeholderCard objects, or dicts of {quality attribute: priority}.
+
+    Returns:
+        dict: The priority of each quality attribute.
+    """
+    priorities = {}
+    for stakeholder in stakeholders:
+        attributes = stakeholder if isinstance(stakeholder, dict) else stakeholder.quality_attributes
+        for attr, priority in attributes.items():
+            priorities[attr] = max(priority, priorities.get(attr, priority))
+    return priorities
+
+
+class FewShotExample:
+    """
+    A past design decision shown to the model as an example of a good answer.
+
+    Attributes:
+        concern (str): The concern card description.
+        options (dict): The impacts of each design option, by option name.
+        option (str): The option taken.
+        answer (str): The answer shown after the concern, naming the option and why it was taken.
+        priorities (dict): The highest stakeholder priority of each quality attribute, when known.
+        source (str): Where the example comes from, e.g. "expert" or the journal file.
+        text (str): The example as rendered in the prompt.
+        tokens (int): The estimated number of tokens of text.
+    """
+    __slots__ = ("concern", "options", "option", "answer", "priorities", "source", "text", "tokens")
+
+    def __init__(self, concern, options, option, answer=None, priorities=None, source="expert"):
+        """
+        Initializes an example.
+
+        Args:
+            concern (str): The concern card description.
+            options (dict): The impacts of each design option, by option name, or a list of option names.
+            option (str): The option taken.
+            answer (str, optional): Why the option was taken. Defaults to naming the option.
+            priorities (dict, optional): The highest stakeholder priority of each quality attribute.
+            source (str): Where the example comes from.
+        """
+        self.concern = concern
+        self.options = options if isinstance(options, dict) else {name: {} for name in options}
+        self.option = option
+        self.answer = answer or f"Take {option}."
+        self.priorities = priorities or {}
+        self.source = source
+        self.text = (f"- Concern: {concern} | Options: {', '.join(self.options)} | "
+                     f"Answer: {' '.join(self.answer.split())}")
+        self.tokens = estimate_tokens(self.text)
+
+
+class _Index:
+    __slots__ = ("rows", "weights", "offsets", "dense", "dense_position", "idf", "frequencies", "count",
+                 "representatives")
+
+    def __init__(self, rows, weights, offsets, dense, dense_position, idf, frequencies, count, representatives):
+        self.rows = rows
+        self.weights = weights
+        self.offsets = offsets
+        self.dense = dense
+        self.dense_position = dense_position
+        self.idf = idf
+        self.frequencies = frequencies
+        self.count = count
+        self.representatives = representatives
+
+
+class ExampleStore:
+    """
+    In-memory store of few-shot examples, selecting the most relevant ones for a suggestion request.
+
+    Examples and requests are compared on sparse features: the words of the concern and of the option names, the
+    signed impacts of the options and the stakeholders' priorities, weighted by how rare they are in the store
+    (IDF). Examples with the same features are indexed once. The index is compiled into numpy arrays on the first
+    selection after a change: the most frequent features as a dense matrix, of which a selection multiplies only
+    the rows of the request's features, and the others as an inverted index from feature to examples, of which it
+    only sums the examples sharing a feature with the request. Features present in more than max_df of the
+    distinct examples are left out of the request, as they match almost everything and tell nothing apart.
+
+    Attributes:
+        examples (list): The examples, in insertion order.
+        k (int): Default number of examples selected.
+        token_budget (int): Default maximum number of tokens of the selected examples.
+        max_df (float): Share of the distinct examples above which a feature is ignored in requests.
+        dense_features (int): Number of the most frequent features scored as dense columns.
+
+    Methods:
+        add(example): Adds an example.
+        add_examples(path): Adds the expert examples of a JSON or YAML file.
+        add_journal(path, min_score=0): Adds the decisions of a journaled game.
+        select(concern, options, stakeholders=(), k=None, token_budget=None): Returns the most relevant examples.
+        render(examples): Returns the examples as the prompt section.
+        stats(): Returns the number of examples, of features and the mean selection time.
+    """
+
+    def __init__(self, k=3, token_budget=256, max_df=0.5, dense_features=128):
+        """
+        Initializes an empty store.
+
+        Args:
+            k (int): Default number of examples selected.
+            token_budget (int): Default maximum number of tokens of the selected examples.
+            max_df (float): Share of the distinct examples above which a feature is ignored in requests.
+            dense_features (int): Number of the most frequent features scored as dense columns.
+        """
+        self.examples = []
+        self.k = k
+        self.token_budget = token_budget
+        self.max_df = max_df
+        self.dense_features = dense_features
+        self._lock = threading.Lock()
+        self._features = {}
+        # examples with the same features (e.g. the same card with the same stakeholders) share a profile, which is
+        # indexed once: the examples of each profile, and its (profile, feature column, weight) until compiled
+        self._profiles = {}
+        self._members = []
+        self._rows, self._columns, self._weights = [], [], []
+        self._index = None
+        self._selections = 0
+        self._selection_time = 0.0
+
+    def __len__(self):
+        return len(self.examples)
+
+    def add(self, example):
+        """
+        Adds an example.
+
+        Args:
+            example (FewShotExample): The example.
+        """
+        features = example_features(example.concern, example.options, example.priorities)
+        key = tuple(sorted(features.items()))
+        with self._lock:
+            self.examples.append(example)
+            row = self._profiles.get(key)
+            if row is not None:
+                self._members[row].append(example)
+                # the profile's features are already indexed, only the answer shown for it may change
+                if self._index is not None:
+                    self._index.representatives[row] = self._representative(self._members[row])
+                return
+            row = self._profiles[key] = len(self._members)
+            self._members.append([example])
+            for feature, weight in features.items():
+                self._rows.append(row)
+                self._columns.append(self._features.setdefault(feature, len(self._features)))
+                self._weights.append(weight)
+            self._index = None
+
+    def add_examples(self, path):
+        """
+        Adds the expert examples of a JSON or YAML file: a list, or an object with an "examples" list, of objects
+        with "concern", "options" (impacts by option name, or option names), "option", and optionally "answer" and
+        "priorities".
+
+        Args:
+            path (str): The file.
+
+        Returns:
+            int: The number of examples added.
+
+        Raises:
+            CardLibraryError: If the file cannot be parsed.
+            KeyError: If an example misses a required field.
+        """
+        data = read_library(path)
+        items = data.get("examples", []) if isinstance(data, dict) else data
+        for item in items:
+            self.add(FewShotExample(item["concern"], item["options"], item["option"], item.get("answer"),
+                                    item.get("priorities"), source=item.get("source", "expert")))
+        return len(items)
+
+    def add_journal(self, path, min_score=0):
+        """
+        Adds the decisions of a journaled game as examples, if the game ended with at least min_score. When the
+        players took the option the assistant suggested, the suggestion is the answer.
+
+        Args:
+            path (str): The journal file.
+            min_score (int): The lowest final score of the games learnt from; -1 keeps lost games too.
+
+        Returns:
+            int: The number of examples added.
+
+        Raises:
+            JournalError: If the file is not a journal or holds no game.
+        """
+        from game_journal import DECISION, END, SUGGESTION, JournalReader
+
+        reader = JournalReader(path)
+        table = reader.last_snapshot().table
+        priorities = stakeholder_priorities(table["stakeholders"])
+        suggestions, decisions, score = {}, [], None
+        for kind, _, record in reader.all():
+            if kind == SUGGESTION:
+                suggestions[record["concern_index"]] = record["suggestion"]
+            elif kind == DECISION:
+                decisions.append(record)
+            elif kind == END:
+                score = record["score"]
+        if score is None or score < min_score:
+            return 0
+        for record in decisions:
+            concern = table["concerns"][record["concern_index"]]
+            options = concern.design_options()
+            option = record.get("option") or next(iter(options))
+            suggestion = suggestions.get(record["concern_index"])
+            answer = suggestion if suggestion and mentioned_option(suggestion, options) == option else None
+            self.add(FewShotExample(concern.concern, options, option, answer, priorities, source=path))
+        return len(decisions)
+
+    @staticmethod
+    def _representative(members):
+        # the answer shown for a profile: an expert's, else the option most often taken, in its latest example
+        experts = [example for example in members if example.source == "expert"]
+        if experts:
+            return experts[-1]
+        option = Counter(example.option for example in members).most_common(1)[0][0]
+        return next(example for example in reversed(members) if example.option == option)
+
+    def _compile(self):
+        with self._lock:
+            if self._index is not None:
+                return self._index
+            rows = np.asarray(self._rows, dtype=np.int32)
+            columns = np.asarray(self._columns, dtype=np.int32)
+            weights = np.asarray(self._weights, dtype=np.float32)
+            count = len(self._members)
+            frequencies = np.bincount(columns, minlength=len(self._features))
+            idf = np.log1p(count / np.maximum(frequencies, 1)).astype(np.float32)
+            weights = weights * idf[columns]
+            norms = np.sqrt(np.bincount(rows, weights * weights, minlength=count)).astype(np.float32)
+            weights /= np.maximum(norms, 1e-12)[rows]
+
+            # the most frequent features as dense columns, as summing their long postings would take longer
+            hot = np.argsort(-frequencies, kind="stable")[:self.dense_features]
+            hot = hot[frequencies[hot] * self.dense_features > count]
+            dense_position = np.full(len(self._features), -1, dtype=np.int32)
+            dense_position[hot] = np.arange(len(hot), dtype=np.int32)
+            dense = np.zeros((len(hot), count), dtype=np.float32)
+            in_dense = dense_position[columns] >= 0
+            dense[dense_position[columns[in_dense]], rows[in_dense]] = weights[in_dense]
+
+            # the others as postings, sorted by feature
+            rows, columns, weights = rows[~in_dense], columns[~in_dense], weights[~in_dense]
+            order = np.argsort(columns, kind="stable")
+            offsets = np.zeros(len(self._features) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(columns, minlength=len(self._features)), out=offsets[1:])
+            representatives = [self._representative(members) for members in self._members]
+            self._index = _Index(rows[order], weights[order], offsets, dense, dense_position, idf, frequencies,
+                                 count, representatives)
+            return self._index
+
+    def select(self, concern, options, stakeholders=(), k=None, token_budget=None):
+        """
+        Returns the examples most similar to a suggestion request, at most k and within the token budget, most
+        similar first. Examples with the same features are shown once, with an expert's answer if there is one and
+        otherwise the option most often taken. Examples sharing no feature with the request are never selected.
+
+        Args:
+            concern (str): The concern card description.
+            options (dict): The design options of the card, as ConcernCard.design_decisions.
+            stakeholders (list): The stakeholders, whose priorities are compared too.
+            k (int, optional): Number of examples. Defaults to the store's k.
+            token_budget (int, optional): Maximum number of tokens. Defaults to the store's token_budget.
+
+        Returns:
+            list: The selected FewShotExample objects.
+        """
+        k = self.k if k is None else k
+        token_budget = self.token_budget if token_budget is None else token_budget
+        if not self.examples or k <= 0:
+            return []
+        start = time.perf_counter()
+        index = self._compile()
+        options = ConcernCard(None, concern, options).design_options()
+        features = example_features(concern, options, stakeholder_priorities(stakeholders))
+        limit = max(1, self.max_df * index.count)
+        dense_rows, dense_weights, postings = [], [], []
+        for feature, weight in features.items():
+            column = self._features.get(feature)
+            if column is None or column >= len(index.frequencies) or index.frequencies[column] > limit:
+                continue
+            weight *= index.idf[column]
+            if index.dense_position[column] >= 0:
+                dense_rows.append(index.dense_position[column])
+                dense_weights.append(weight)
+            else:
+                begin, end = index.offsets[column], index.offsets[column + 1]
+                postings.append((index.rows[begin:end], index.weights[begin:end] * weight))
+
+        selected = []
+        if dense_rows or postings:
+            if dense_rows:
+                scores = np.asarray(dense_weights, dtype=np.float32) @ index.dense[dense_rows]
+            else:
+                scores = np.zeros(index.count, dtype=np.float32)
+            if postings:
+                scores += np.bincount(np.concatenate([posting[0] for posting in postings]),
+                                      np.concatenate([posting[1] for posting in postings]), minlength=index.count)
+            candidates = min(index.count, 4 * k)
+            if candidates < index.count:
+                best = np.argpartition(scores, index.count - candidates)[index.count - candidates:]
+            else:
+                best = np.arange(index.count)
+            best = best[np.argsort(-scores[best], kind="stable")]
+            seen = set()
+            for row in best.tolist():
+                if scores[row] <= 0 or len(selected) == k:
+                    break
+                example = index.representatives[row]
+                if example.text in seen or example.tokens > token_budget:
+                    continue
+                seen.add(example.text)
+                token_budget -= example.tokens
+                selected.append(example)
+        self._selections += 1
+        self._selection_time += time.perf_counter() - start
+        return selected
+
+    @staticmethod
+    def render(examples):
+        """
+        Returns examples as the section of the suggestion prompts listing them.
+
+        Args:
+            examples (list): The FewShotExample objects.
+
+        Returns:
+            str: The section, or an empty string without examples.
+        """
+        if not examples:
+            return ""
+        lines = "\n".join([f"        {example.text}" for example in examples])
+        return f"\n        Examples of Past Decisions on Similar Concerns:\n{lines}\n"
+
+    def stats(self):
+        """
+        Returns the size of the store and how long selections take.
+
+        Returns:
+            dict: The number of examples, of distinct feature profiles and of distinct features, the number of
+                selections and their mean duration in milliseconds.
+        """
+        return {
+            "examples": len(self.examples),
+            "profiles": len(self._members),
+            "features": len(self._features),
+            "selections": self._selections,
+            "select_ms_mean": 1000 * self._selection_time / self._selections if self._selections else None,
+        }
+
+
+def load_example_store(paths, k=3, token_budget=256, min_score=0):
+    """
+    Builds an example store from files of expert examples and from game journals, told apart by their content.
+
+    Args:
+        paths (list): JSON or YAML example files, and journal files written by DecidArchGame.
+        k (int): Default number of examples selected.
+        token_budget (int): Default maximum number of tokens of the selected examples.
+        min_score (int): The lowest final score of the journaled games learnt from.
+
+    Returns:
+        ExampleStore: The store.
+    """
+    from game_journal import MAGIC
+
+    store = ExampleStore(k, token_budget)
+    for path in paths:
+        with open(path, "rb") as example_file:
+            journal = example_file.read(len(MAGIC)) == MAGIC
+        if journal:
+            store.add_journal(path, min_score)
+        else:
+            store.add_examples(path)
+    return store
@@ -0,0 +1,498 @@
+import argparse
+import base64
+import json
+import os
+import statistics
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from compact import GameSnapshot
+from models import QA_VOCABULARY
+from score_state import ScoreState
+from simulator import summarize
+
+
+MAGIC = b"DAJ1"
+
+# record types
+START = 1
+TURN = 2
+SUGGESTION = 3
+DECISION = 4
+REVISION = 5
+REVIEW = 6
+SNAPSHOT = 7
+END = 8
+
+# record type, payload length, CRC-32 of the payload
+_HEADER = struct.Struct("<BII")
+
+
+class JournalError(ValueError):
+    """
+    Raised when a file is not a game journal or holds no game.
+    """
+
+
+class GameJournal:
+    """
+    Append-only record of a game: its setup, turns, suggestions and decisions, with a compact snapshot of the game
+    every few decisions.
+
+    Each record is framed with its type, length and checksum, and written with a single write: a process killed
+    mid-write leaves at most one torn record at the end, which is ignored when the journal is read and cut off when
+    it is reopened. Records are JSON, except snapshots which are compact.GameSnapshot encodings; the cards are only
+    in the snapshots and in the START record, which holds the initial snapshot so that a game is never started
+    without its cards. Writes are flushed to the operating system, which survives the process; sync additionally
+    makes every record durable against a power loss, at the cost of a disk flush per record.
+
+    Attributes:
+        path (str): The journal file.
+        snapshot_interval (int): Number of decisions between two snapshots.
+        sync (bool): Whether to fsync every record.
+        table (dict): The cards of the game, once started.
+
+    Methods:
+        start(table, start_time, end_time): Records the setup of the game, with its cards.
+        turn(player, concern_index, time): Records the start of a turn.
+        suggestion(concern_index, suggestion, **details): Records the assistant's suggestion.
+        decision(concern_index, decision, decisions, option=None): Records a decision, then a snapshot if due.
+        revision(index, decision): Records the revision of a past decision.
+        review(event_index, review): Records the assistant's review after an event.
+        snapshot(decisions, current_concern_index): Records a snapshot of the game.
+        end(score): Records the end of the game.
+        close(): Closes the file.
+    """
+
+    def __init__(self, path, snapshot_interval=4, sync=False):
+        """
+        Opens a journal for appending, creating it if needed. A torn record left by a crash is cut off.
+
+        Args:
+            path (str): The journal file.
+            snapshot_interval (int): Number of decisions between two snapshots.
+            sync (bool): Whether to fsync every record.
+
+        Raises:
+            JournalError: If the file exists and is not a journal.
+        """
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.sync = sync
+        self.table = None
+        self._since_snapshot = 0
+        if os.path.exists(path) and os.path.getsize(path):
+            reader = JournalReader(path)
+            self.table = reader.last_snapshot().table if reader.started else None
+            self._since_snapshot = sum(1 for kind, _, _ in reader.tail() if kind == DECISION)
+            self._file = open(path, "r+b")
+            self._file.truncate(reader.end)
+            self._file.seek(reader.end)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+            self._file.flush()
+
+    def _write(self, kind, payload):
+        self._file.write(_HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def _record(self, kind, **fields):
+        self._write(kind, json.dumps(fields, separators=(",", ":")).encode("utf-8"))
+
+    def start(self, table, start_time, end_time):
+        """
+        Records the setup of the game, with the snapshot of the game before the first decision.
+
+        Args:
+            table (dict): The cards of the game, as returned by simulator.load_table.
+            start_time (float): When the game started, on the game clock.
+            end_time (float): When the game ends, on the game clock.
+        """
+        self.table = table
+        cards = base64.b64encode(GameSnapshot(table, [], 0).dumps()).decode("ascii")
+        self._record(START, start_time=start_time, end_time=end_time, cards=cards)
+        self._since_snapshot = 0
+
+    def turn(self, player, concern_index, time):
+        """
+        Records the start of a turn.
+
+        Args:
+            player (int): Position of the player in the table's players.
+            concern_index (int): Index of the concern card in play.
+            time (float): The game clock.
+        """
+        self._record(TURN, player=player, concern_index=concern_index, time=time)
+
+    def suggestion(self, concern_index, suggestion, **details):
+        """
+        Records the assistant's suggestion for a concern card.
+
+        Args:
+            concern_index (int): Index of the concern card.
+            suggestion (str): The suggestion shown to the players.
+            **details: JSON-serializable facts about it, e.g. latency, prefetched or fallback.
+        """
+        self._record(SUGGESTION, concern_index=concern_index, suggestion=suggestion, **details)
+
+    def decision(self, concern_index, decision, decisions, option=None):
+        """
+        Records a decision, then a snapshot every snapshot_interval decisions.
+
+        Args:
+            concern_index (int): Index of the concern card decided.
+            decision (dict): The impacts of the decision.
+            decisions (list): Every decision taken so far, this one included, for the snapshot.
+            option (str, optional): The name of the chosen design option.
+        """
+        self._record(DECISION, concern_index=concern_index, decision=decision, option=option)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_interval:
+            self.snapshot(decisions, concern_index + 1)
+
+    def revision(self, index, decision):
+        """
+        Records the revision of a past decision.
+
+        Args:
+            index (int): Position of the decision.
+            decision (dict): The impacts of the revised decision.
+        """
+        self._record(REVISION, index=index, decision=decision)
+
+    def review(self, event_index, review):
+        """
+        Records the assistant's review of the decisions after an event.
+
+        Args:
+            event_index (int): Position of the event in the table's events.
+            review (str): The review, None if it was skipped.
+        """
+        self._record(REVIEW, event_index=event_index, review=review)
+
+    def snapshot(self, decisions, current_concern_index):
+        """
+        Records a snapshot of the game, from which it can be restored without reading the records before it.
+
+        Args:
+            decisions (list): Every decision taken so far.
+            current_concern_index (int): Index of the concern card in play.
+        """
+        self._write(SNAPSHOT, GameSnapshot(self.table, decisions, current_concern_index).dumps())
+        self._since_snapshot = 0
+
+    def end(self, score):
+        """
+        Records the end of the game.
+
+        Args:
+            score (int): The final score.
+        """
+        self._record(END, score=score)
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class JournalReader:
+    """
+    Reads a game journal. Only the frames are scanned when it is opened; records are decoded on demand.
+
+    Attributes:
+        path (str): The journal file.
+        records (list): The (type, offset, length) of every complete record, in order.
+        snapshots (list): The positions in records of the snapshots.
+        starts (list): The positions in records of the START records.
+        end (int): Offset of the end of the last complete record.
+        started (bool): Whether the journal holds a game, i.e. a snapshot or a START record.
+        ended (bool): Whether the game has an END record.
+
+    Methods:
+        decode(position): Returns the payload of a record.
+        last_snapshot(): Returns the latest snapshot, or the initial one of the START record.
+        tail(): Yields the records after the latest snapshot.
+        all(): Yields every record.
+    """
+
+    def __init__(self, path):
+        """
+        Scans a journal.
+
+        Args:
+            path (str): The journal file.
+
+        Raises:
+            JournalError: If the file is not a journal.
+        """
+        self.path = path
+        with open(path, "rb") as journal_file:
+            self._data = journal_file.read()
+        if self._data[:len(MAGIC)] != MAGIC:
+            raise JournalError(f"{path} is not a game journal.")
+        self.records = []
+        self.snapshots = []
+        self.starts = []
+        self.ended = False
+        offset = len(MAGIC)
+        while offset + _HEADER.size <= len(self._data):
+            kind, length, checksum = _HEADER.unpack_from(self._data, offset)
+            start = offset + _HEADER.size
+            if start + length > len(self._data) or zlib.crc32(self._data[start:start + length]) != checksum:
+                # a record torn by a crash: everything from here on is lost
+                break
+            if kind == SNAPSHOT:
+                self.snapshots.append(len(self.records))
+            elif kind == START:
+                self.starts.append(len(self.records))
+            self.ended = kind == END
+            self.records.append((kind, start, length))
+            offset = start + length
+        self.end = offset
+
+    def decode(self, position):
+        """
+        Returns the payload of a record.
+
+        Args:
+            position (int): The position of the record in records.
+
+        Returns:
+            dict or GameSnapshot: The fields of the record, or the snapshot.
+        """
+        kind, start, length = self.records[position]
+        payload = self._data[start:start + length]
+        if kind == SNAPSHOT:
+            return GameSnapshot.loads(payload)
+        return json.loads(payload)
+
+    @property
+    def started(self):
+        return bool(self.snapshots or self.starts)
+
+    def _base(self):
+        # the position of the record the game is restored from: the latest snapshot, or START before the first one
+        if self.snapshots and (not self.starts or self.snapshots[-1] > self.starts[-1]):
+            return self.snapshots[-1]
+        return self.starts[-1] if self.starts else None
+
+    def last_snapshot(self):
+        """
+        Returns the latest snapshot, or the snapshot held by the START record when no snapshot follows it.
+
+        Returns:
+            GameSnapshot: The snapshot.
+
+        Raises:
+            JournalError: If the journal has no snapshot nor START record, or its START record has no cards.
+        """
+        base = self._base()
+        if base is None:
+            raise JournalError(f"{self.path} holds no game.")
+        if self.records[base][0] == SNAPSHOT:
+            return self.decode(base)
+        cards = self.decode(base).get("cards")
+        if cards is None:
+            raise JournalError(f"{self.path} holds no game.")
+        return GameSnapshot.loads(base64.b64decode(cards))
+
+    def tail(self):
+        """
+        Yields the records after the latest snapshot, or after the START record when no snapshot follows it, or
+        every record if there is neither.
+
+        Yields:
+            tuple: The type, position and payload of each record.
+        """
+        base = self._base()
+        first = base + 1 if base is not None else 0
+        for position in range(first, len(self.records)):
+            yield self.records[position][0], position, self.decode(position)
+
+    def all(self):
+        """
+        Yields every record.
+
+        Yields:
+            tuple: The type, position and payload of each record.
+        """
+        for position in range(len(self.records)):
+            yield self.records[position][0], position, self.decode(position)
+
+
+class JournalState:
+    """
+    State of a game restored from its journal.
+
+    Attributes:
+        table (dict): The cards of the game.
+        decisions (list): The decisions taken.
+        current_concern_index (int): Index of the concern card in play.
+        start_time (float): When the game started, on the game clock.
+        end_time (float): When the game ends, on the game clock.
+        score (int, optional): The final score, if the game ended.
+    """
+    __slots__ = ("table", "decisions", "current_concern_index", "start_time", "end_time", "score")
+
+    def __init__(self, table, decisions, current_concern_index, start_time, end_time, score=None):
+        self.table = table
+        self.decisions = decisions
+        self.current_concern_index = current_concern_index
+        self.start_time = start_time
+        self.end_time = end_time
+        self.score = score
+
+    @property
+    def finished(self):
+        return self.score is not None
+
+
+def restore(path):
+    """
+    Restores a game from its journal: from the latest snapshot, replaying only the records after it.
+
+    Args:
+        path (str): The journal file.
+
+    Returns:
+        JournalState: The state of the game at its last complete record.
+
+    Raises:
+        JournalError: If the file is not a journal or holds no game.
+    """
+    return _restore(JournalReader(path))
+
+
+def _restore(reader):
+    snapshot = reader.last_snapshot()
+    times = reader.decode(reader.starts[-1]) if reader.starts else {}
+    state = JournalState(snapshot.table, snapshot.decisions, snapshot.current_concern_index,
+                         times.get("start_time"), times.get("end_time"))
+    for kind, _, record in reader.tail():
+        if kind == DECISION:
+            state.decisions.append(QA_VOCABULARY.intern_keys(record["decision"]))
+            state.current_concern_index = record["concern_index"] + 1
+        elif kind == REVISION:
+            state.decisions[record["index"]] = QA_VOCABULARY.intern_keys(record["decision"])
+        elif kind == END:
+            state.score = record["score"]
+    return state
+
+
+def analyse(path):
+    """
+    Replays a journal without the assistant, recomputing the score from the decisions.
+
+    Args:
+        path (str): The journal file.
+
+    Returns:
+        dict: The recomputed score, the number of concern cards played and of revisions, whether the game ended,
+            the number of suggestions, how many were prefetched or from the rule-based fallback, and their mean
+            latency in seconds (None without latencies).
+    """
+    reader = JournalReader(path)
+    state = _restore(reader)
+    score_state = ScoreState(state.table["stakeholders"])
+    for decision in state.decisions:
+        score_state.append(decision)
+    suggestions = prefetched = fallbacks = revisions = 0
+    latencies = []
+    for kind, _, record in reader.all():
+        if kind == SUGGESTION:
+            suggestions += 1
+            prefetched += bool(record.get("prefetched"))
+            fallbacks += bool(record.get("fallback"))
+            if record.get("latency") is not None:
+                latencies.append(record["latency"])
+        elif kind == REVISION:
+            revisions += 1
+    return {
+        "path": path,
+        "score": score_state.score(),
+        "played": state.current_concern_index,
+        "revisions": revisions,
+        "finished": state.finished,
+        "suggestions": suggestions,
+        "prefetched": prefetched,
+        "fallbacks": fallbacks,
+        "mean_latency": statistics.fmean(latencies) if latencies else None,
+    }
+
+
+def _analyse_chunk(paths):
+    results = []
+    for path in paths:
+        try:
+            results.append(analyse(path))
+        except (JournalError, OSError) as error:
+            results.append({"path": path, "error": str(error)})
+    return results
+
+
+def replay(paths, workers=None, chunk_size=200):
+    """
+    Replays many journals without the assistant, in parallel processes, for analytics.
+
+    Args:
+        paths (list): The journal files.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs; 1 runs in-process.
+        chunk_size (int): Number of journals per task sent to a worker.
+
+    Returns:
+        dict: The score statistics of the games, as returned by simulator.summarize, plus the share of finished
+            games, the suggestion counts and the journals that could not be read.
+    """
+    chunks = [paths[start:start + chunk_size] for start in range(0, len(paths), chunk_size)]
+    results = []
+    if workers == 1:
+        for chunk in chunks:
+            results.extend(_analyse_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            for chunk_results in executor.map(_analyse_chunk, chunks):
+                results.extend(chunk_results)
+    errors = {result["path"]: result["error"] for result in results if "error" in result}
+    results = [result for result in results if "error" not in result]
+    if not results:
+        return {"games": 0, "errors": errors}
+    summary = summarize(results)
+    summary.update(
+        finished_rate=sum(result["finished"] for result in results) / len(results),
+        suggestions=sum(result["suggestions"] for result in results),
+        prefetched=sum(result["prefetched"] for result in results),
+        fallbacks=sum(result["fallbacks"] for result in results),
+        revisions=sum(result["revisions"] for result in results),
+        errors=errors,
+    )
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay DecidArch game journals without the assistant.")
+    parser.add_argument("journals", nargs="+", help="journal files written by DecidArchGame")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--each", action="store_true", help="print the analysis of every journal instead")
+    args = parser.parse_args()
+
+    if args.each:
+        for path in args.journals:
+            print(json.dumps(analyse(path)))
+    else:
+        print(json.dumps(replay(args.journals, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from http import HTTPStatus
+
+import configuration
+from context_builder import ContextBuilder
+from decidarch_assistant import DecidArchAssistant
+from ollama_client import OllamaError
+from ollama_pool import OllamaPool
+from scheduler import INTERACTIVE, PRIORITIES, DeadlineExceeded, SchedulerOverloaded, scheduling
+from score_state import ScoreState
+from card_library import validate_library
+from simulator import load_table
+
+
+class ServerError(Exception):
+    """
+    Raised while handling a request; reported to the client with the given HTTP status.
+
+    Attributes:
+        status (int): The HTTP status of the response.
+    """
+    def __init__(self, status, message):
+        """
+        Initializes the error.
+
+        Args:
+            status (int): The HTTP status of the response.
+            message (str): The error message sent to the client.
+        """
+        super().__init__(message)
+        self.status = status
+
+
+def check_limits(data, limits):
+    """
+    Checks a table description against the game limits of the configuration.
+
+    Args:
+        data (dict): The table description, as accepted by load_table.
+        limits (Configuration): The configuration holding the limits.
+
+    Raises:
+        ServerError: If a limit is exceeded or a required part is missing.
+    """
+    errors = validate_library(data, limits)
+    if errors:
+        raise ServerError(HTTPStatus.BAD_REQUEST, f"Invalid table: {'; '.join(errors)}.")
+
+
+class GameTable:
+    """
+    One game hosted by the GameServer, isolated from the others: its own cards, score state, prompt context builder
+    and assistant session. Its methods only touch the table on the event loop, so they need no lock: a suggestion
+    is built from the state at the time of the request.
+
+    Attributes:
+        table_id (str): Identifier of the table.
+        players (list): The players of the table.
+        project_card (ProjectCard): The project of the game.
+        stakeholder_cards (list): The stakeholders of the game.
+        concern_cards (list): The concern cards, in play order.
+        event_cards (list): The ongoing events.
+        score_state (ScoreState): The decisions taken and the running scores.
+        current_concern_index (int): Index of the concern card in play.
+        session (AssistantSession): The assistant session of the game.
+        context_builder (ContextBuilder): Compacts the game state sent in the suggestion prompts.
+        pending (int): Number of suggestion requests of the table in flight.
+        last_activity (float): time.monotonic() of the last request.
+
+    Methods:
+        state(): Returns the public state of the game.
+        suggest(priority=INTERACTIVE, deadline=None, structured=False): Returns the assistant's suggestion for the
+            concern card in play.
+        decide(option): Commits the chosen design option and moves to the next concern card.
+        review(event_index): Returns the assistant's review of the decisions an event affects, None if it affects none,
+            and which decisions it affects.
+    """
+
+    def __init__(self, table_id, table, assistant, token_budget):
+        """
+        Initializes a table.
+
+        Args:
+            table_id (str): Identifier of the table.
+            table (dict): The cards of the table, as returned by load_table.
+            assistant (DecidArchAssistant): The assistant shared by every table.
+            token_budget (int): Maximum number of tokens of the game state sent in a prompt.
+        """
+        self.table_id = table_id
+        self.players = table["players"]
+        self.project_card = table["project"]
+        self.stakeholder_cards = table["stakeholders"]
+        self.concern_cards = table["concerns"]
+        self.event_cards = table["events"]
+        self.score_state = ScoreState(self.stakeholder_cards)
+        self.current_concern_index = 0
+        self.session = assistant.start_session()
+        self.context_builder = ContextBuilder(token_budget)
+        self.pending = 0
+        self.last_activity = time.monotonic()
+
+    @property
+    def finished(self):
+        return self.current_concern_index >= len(self.concern_cards)
+
+    def _concern_card(self):
+        if self.finished:
+            raise ServerError(HTTPStatus.CONFLICT, "Every concern card has been played.")
+        return self.concern_cards[self.current_concern_index]
+
+    def state(self):
+        """
+        Returns the public state of the game.
+
+        Returns:
+            dict: The concern card in play and its options (None once finished), the QA scores, the score and the
+                number of concern cards played.
+        """
+        concern_card = None if self.finished else self.concern_cards[self.current_concern_index]
+        return {
+            "table_id": self.table_id,
+            "concern": concern_card.concern if concern_card else None,
+            "options": list(concern_card.design_options()) if concern_card else None,
+            "qa_scores": dict(self.score_state.qa_scores),
+            "score": self.score_state.score(),
+            "played": self.current_concern_index,
+            "finished": self.finished,
+        }
+
+    async def suggest(self, priority=INTERACTIVE, deadline=None, structured=False):
+        """
+        Requests the assistant's suggestion for the concern card in play. The request runs on the assistant's
+        worker threads, so the event loop keeps serving the other tables.
+
+        Args:
+            priority (int): Scheduling priority of the request: INTERACTIVE for the turn in play, PREFETCH for a
+                suggestion requested ahead of time.
+            deadline (float, optional): time.monotonic() by which the suggestion is needed; the rule-based advisor
+                answers if the LLM has not by then.
+            structured (bool): Whether to return the chosen option and its rationale instead of free text.
+
+        Returns:
+            str or StructuredSuggestion: The suggestion.
+
+        Raises:
+            SchedulerOverloaded: If the scheduler refuses the request.
+        """
+        inputs = self.context_builder.build(
+            self.project_card, self.stakeholder_cards, self.score_state, self.event_cards, self._concern_card())
+        self.pending += 1
+        try:
+            with scheduling(session=self.table_id, priority=priority, deadline=deadline):
+                if structured:
+                    return await self.session.aextract_structured_suggestion(**inputs, deadline=deadline)
+                return await self.session.aextract_suggestion_chain(**inputs, deadline=deadline)
+        finally:
+            self.pending -= 1
+
+    async def review(self, event_index):
+        """
+        Requests the assistant's review of the past decisions after an event, about the decisions it affects only.
+        No request is made when the event affects no decision.
+
+        Args:
+            event_index (int): Position of the event in event_cards.
+
+        Returns:
+            tuple: The suggested revisions, or None when there is nothing to review, and the report of the context
+                builder on the event (affected attributes and decisions, whether the request was skipped). The report
+                is taken before the request, as a suggestion of the same table may build another one meanwhile.
+
+        Raises:
+            ServerError: If there is no such event.
+        """
+        if not isinstance(event_index, int) or not 0 <= event_index < len(self.event_cards):
+            raise ServerError(HTTPStatus.BAD_REQUEST, f"Unknown event: {event_index}.")
+        inputs = self.context_builder.build_review(
+            self.project_card, self.stakeholder_cards, self.score_state, self.event_cards[event_index])
+        report = self.context_builder.last_report
+        if inputs is None:
+            return None, report
+        self.pending += 1
+        try:
+            with scheduling(session=self.table_id):
+                return await self.session.aextract_review_suggestion_chain(**inputs), report
+        finally:
+            self.pending -= 1
+
+    def decide(self, option):
+        """
+        Commits the chosen design option of the concern card in play.
+
+        Args:
+            option (str): The name of the option.
+
+        Raises:
+            ServerError: If the game is finished or the option does not exist.
+        """
+        options = self._concern_card().design_options()
+        if not isinstance(option, str) or option not in options:
+            raise ServerError(HTTPStatus.BAD_REQUEST, f"Unknown option: {option}.")
+        self.score_state.append(options[option])
+        self.current_concern_index += 1
+
+
+class GameServer:
+    """
+    Long-lived server hosting many games in one process, with a small JSON-over-HTTP API on asyncio.
+
+    Every table shares the same DecidArchAssistant, hence the same langchain import, Ollama connection pool and
+    concurrency bound. Tables idle for longer than configuration.table_idle_timeout are closed.
+
+    Endpoints:
+        POST /tables: Opens a table from a description accepted by load_table; returns its state.
+        GET /tables/<id>: Returns the state of a table.
+        POST /tables/<id>/suggestion: Returns the assistant's suggestion for the concern card in play. The body may
+            set "priority" ("interactive", the default, or "prefetch") and "timeout" in seconds, after which the
+            rule-based advisor answers (configuration.suggestion_deadline by default). With "structured": true, the
+            suggestion is an object with the chosen "option", which can be sent as is to the decision endpoint, its
+            "rationale" and its "source" ("llm" or "advisor").
+        POST /tables/<id>/decision: Commits {"option": name} and returns the new state.
+        POST /tables/<id>/review: Returns the assistant's review of the decisions affected by {"event": index} of
+            the table's events, and the number of decisions reviewed. The review is null, and no LLM request is
+            made, when the event affects no decision.
+        DELETE /tables/<id>: Closes a table.
+        GET /metrics: Returns the active tables, the queued and running LLM requests, the instrumentation metrics,
+            the semantic cache counters, the size of the few-shot example store and the state and counters of each
+            Ollama backend.
+
+    Attributes:
+        configuration (Configuration): Game limits, token budget and server settings.
+        assistant (DecidArchAssistant): The assistant shared by every table.
+        instrumentation (Instrumentation): Timers and counters, shared with the assistant.
+        tables (dict): The open tables, by identifier.
+        host (str): Address the server listens on.
+        port (int): Port the server listens on. 0 picks a free port when the server starts.
+
+    Methods:
+        start(): Starts listening.
+        serve_forever(): Starts listening and serves until cancelled.
+        close(): Stops listening and closes every table.
+        create_table(data): Opens a table.
+        metrics(): Returns the server metrics.
+    """
+
+    def __init__(self, assistant=None, config=None, host="127.0.0.1", port=8080):
+        """
+        Initializes the server. It does not listen until start is called.
+
+        Args:
+            assistant (DecidArchAssistant, optional): The shared assistant. Defaults to one built from config.
+            config (Configuration, optional): The configuration. Defaults to Configuration().
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 for a free port.
+        """
+        self.configuration = config or configuration.Configuration()
+        self.assistant = assistant or DecidArchAssistant(self.configuration)
+        self.instrumentation = self.assistant.instrumentation
+        self.tables = {}
+        self.host = host
+        self.port = port
+        self._server = None
+        self._reaper = None
+
+    async def start(self):
+        """
+        Starts listening and closing idle tables in the background.
+        """
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._reaper = asyncio.create_task(self._close_idle_tables())
+
+    async def serve_forever(self):
+        """
+        Starts listening and serves until the task is cancelled.
+        """
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        """
+        Stops listening and closes every table.
+        """
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for table_id in list(self.tables):
+            self.close_table(table_id)
+
+    def create_table(self, data):
+        """
+        Opens a table.
+
+        Args:
+            data (dict): The table description, as accepted by load_table.
+
+        Returns:
+            GameTable: The new table.
+
+        Raises:
+            ServerError: If the server is full or the description is invalid.
+        """
+        if len(self.tables) >= self.configuration.max_tables:
+            raise ServerError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many open tables.")
+        check_limits(data, self.configuration)
+        try:
+            table = load_table(data)
+        except (KeyError, TypeError, ValueError) as error:
+            raise ServerError(HTTPStatus.BAD_REQUEST, f"Invalid table: {error}.")
+        table_id = uuid.uuid4().hex
+        self.tables[table_id] = GameTable(table_id, table, self.assistant, self.configuration.prompt_token_budget)
+        self.instrumentation.count("server.tables_opened")
+        self.instrumentation.observe("server.active_tables", len(self.tables))
+        return self.tables[table_id]
+
+    def get_table(self, table_id):
+        table = self.tables.get(table_id)
+        if table is None:
+            raise ServerError(HTTPStatus.NOT_FOUND, f"Unknown table: {table_id}.")
+        table.last_activity = time.monotonic()
+        return table
+
+    def close_table(self, table_id):
+        if self.tables.pop(table_id, None) is None:
+            raise ServerError(HTTPStatus.NOT_FOUND, f"Unknown table: {table_id}.")
+        self.instrumentation.count("server.tables_closed")
+        self.instrumentation.observe("server.active_tables", len(self.tables))
+
+    def metrics(self):
+        """
+        Returns the server metrics.
+
+        Returns:
+            dict: The number of active tables, of LLM requests queued for and holding the concurrency bound, the
+                snapshot of the instrumentation registry (None without a registry), the semantic cache counters
+                (None without a semantic cache), the example store statistics (None without a store) and the
+                OllamaPool statistics of every backend (None with a single Ollama server).
+        """
+        registry = self.instrumentation.registry
+        semantic_cache = self.assistant.semantic_cache
+        example_store = self.assistant.example_store
+        return {
+            "active_tables": len(self.tables),
+            "queued_llm_requests": self.assistant.queued_requests,
+            "running_llm_requests": self.assistant.running_requests,
+            "instrumentation": registry.snapshot() if registry is not None else None,
+            "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+            "example_store": example_store.stats() if example_store is not None else None,
+            "backends": self.assistant.client.stats() if isinstance(self.assistant.client, OllamaPool) else None,
+        }
+
+    async def _close_idle_tables(self):
+        timeout = self.configuration.table_idle_timeout
+        while True:
+            await asyncio.sleep(min(60, timeout))
+            now = time.monotonic()
+            for table_id, table in list(self.tables.items()):
+                if now - table.last_activity > timeout and not table.pending:
+                    self.close_table(table_id)
+                    self.instrumentation.count("server.tables_expired")
+
+    async def dispatch(self, method, path, body):
+        """
+        Handles one API request.
+
+        Args:
+            method (str): The HTTP method.
+            path (str): The request path.
+            body (dict): The decoded JSON body, empty when there is none.
+
+        Returns:
+            tuple: The HTTP status and the JSON-serializable response.
+
+        Raises:
+            ServerError: If the request cannot be served.
+        """
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+        if parts == ["metrics"] and method == "GET":
+            return HTTPStatus.OK, self.metrics()
+        if parts == ["tables"] and method == "POST":
+            return HTTPStatus.CREATED, self.create_table(body).state()
+        if len(parts) >= 2 and parts[0] == "tables":
+            table = self.get_table(parts[1])
+            action = parts[2:]
+            if not action and method == "GET":
+                return HTTPStatus.OK, table.state()
+            if not action and method == "DELETE":
+                self.close_table(table.table_id)
+                return HTTPStatus.OK, {"table_id": table.table_id, "closed": True}
+            if action == ["suggestion"] and method == "POST":
+                priority = body.get("priority", "interactive")
+                priority = PRIORITIES.get(priority) if isinstance(priority, str) else None
+                if priority is None:
+                    raise ServerError(HTTPStatus.BAD_REQUEST, f"Unknown priority: {body['priority']}.")
+                try:
+                    deadline = time.monotonic() + float(body.get("timeout", self.configuration.suggestion_deadline))
+                except (TypeError, ValueError):
+                    raise ServerError(HTTPStatus.BAD_REQUEST, f"Invalid timeout: {body['timeout']}.")
+                structured = body.get("structured", False)
+                if not isinstance(structured, bool):
+                    raise ServerError(HTTPStatus.BAD_REQUEST, f"Invalid structured flag: {structured}.")
+                with self.instrumentation.span("server.suggestion", table=table.table_id, priority=priority,
+                                                structured=structured):
+                    suggestion = await table.suggest(priority, deadline, structured)
+                return HTTPStatus.OK, {"suggestion": suggestion.to_dict() if structured else suggestion}
+            if action == ["review"] and method == "POST":
+                with self.instrumentation.span("server.review", table=table.table_id) as span:
+                    review, report = await table.review(body.get("event"))
+                    span.attributes["skipped"] = report["skipped"]
+                if report["skipped"]:
+                    self.instrumentation.count("server.reviews_skipped", table=table.table_id)
+                return HTTPStatus.OK, {"review": review, "affected_decisions": report["affected_decisions"]}
+            if action == ["decision"] and method == "POST":
+                table.decide(body.get("option"))
+                return HTTPStatus.OK, table.state()
+        raise ServerError(HTTPStatus.NOT_FOUND, f"No route for {method} {path}.")
+
+    async def _handle_connection(self, reader, writer):
+        # minimal HTTP/1.1 with keep-alive and Content-Length bodies, enough for JSON API clients
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                data = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    body = json.loads(data) if data else {}
+                    if not isinstance(body, dict):
+                        raise ServerError(HTTPStatus.BAD_REQUEST, "The body must be a JSON object.")
+                    status, response = await self.dispatch(method, path, body)
+                except ServerError as error:
+                    status, response = HTTPStatus(error.status), {"error": str(error)}
+                except json.JSONDecodeError:
+                    status, response = HTTPStatus.BAD_REQUEST, {"error": "Invalid JSON body."}
+                except SchedulerOverloaded as error:
+                    status, response = HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(error)}
+                except DeadlineExceeded as error:
+                    status, response = HTTPStatus.GATEWAY_TIMEOUT, {"error": str(error)}
+                except (OllamaError, OSError) as error:
+                    status, response = HTTPStatus.BAD_GATEWAY, {"error": f"Assistant request failed: {error}"}
+                except Exception as error:
+                    # a bug must not drop the connection without an answer
+                    self.instrumentation.count("server.internal_errors")
+                    status, response = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"Internal error: {error!r}"}
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                payload = json.dumps(response, default=str).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many DecidArch games in one process behind a JSON HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--semantic-cache", metavar="PATH",
+                        help="SQLite file of a cache answering suggestion requests similar to earlier ones")
+    parser.add_argument("--examples", metavar="PATH", nargs="+", default=[],
+                        help="JSON or YAML expert examples and game journals to select few-shot examples from")
+    args = parser.parse_args()
+
+    config = configuration.Configuration()
+    assistant = DecidArchAssistant(config)
+    if args.semantic_cache:
+        from semantic_cache import OllamaEmbedder, SemanticSuggestionCache
+
+        # the embedding model served by Ollama if one is configured, else feature hashing on the CPU
+        embed = OllamaEmbedder(assistant.client, config.embedding_model) if config.embedding_model else None
+        assistant.semantic_cache = SemanticSuggestionCache(
+            args.semantic_cache, embed, threshold=config.semantic_cache_threshold,
+            audit_rate=config.semantic_cache_audit_rate)
+    if args.examples:
+        from example_store import load_example_store
+
+        assistant.example_store = load_example_store(args.examples, config.few_shot_examples,
+                                                     config.few_shot_token_budget)
+    server = GameServer(assistant, config, host=args.host, port=args.port)
+    print(f"DecidArch game server listening on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+import contextvars
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextlib import contextmanager
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# the attributes a MetricsRegistry breaks its metrics down by, in the order they appear in a series name
+KEY_ATTRIBUTES = ("model", "template", "table", "priority", "backend")
+
+
+class Span:
+    """
+    A timed stage of an assistant call or of a game turn.
+
+    Attributes:
+        name (str): The name of the stage, e.g. "assistant.suggestion".
+        attributes (dict): Tags of the stage (template, model, table, ...).
+        trace_id (str): Identifier shared by the spans of one top-level operation.
+        span_id (str): Identifier of the span.
+        parent_id (str, optional): Identifier of the enclosing span.
+        start_time (int): Wall-clock start in nanoseconds since the epoch.
+        duration (float): Duration in seconds, set when the span ends.
+    """
+    def __init__(self, name, attributes, parent=None):
+        """
+        Initializes a Span object.
+
+        Args:
+            name (str): The name of the stage.
+            attributes (dict): Tags of the stage.
+            parent (Span, optional): The enclosing span.
+        """
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start_time = time.time_ns()
+        self.duration = None
+
+    def to_record(self):
+        return {
+            "type": "span",
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration": self.duration,
+            "attributes": self.attributes,
+        }
+
+
+class StageStats:
+    """
+    Aggregated durations of one stage, or values of one measurement, in a MetricsRegistry.
+
+    Attributes:
+        count (int): Number of recorded values.
+        total (float): Sum of the values.
+        min (float): Smallest value.
+        max (float): Largest value.
+        samples (deque): The most recent values, used for the percentiles.
+    """
+    def __init__(self, max_samples=1024):
+        """
+        Initializes empty statistics.
+
+        Args:
+            max_samples (int): Number of recent values kept for the percentiles.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": ordered[int(0.50 * (len(ordered) - 1))],
+            "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        }
+
+
+class MetricsRegistry:
+    """
+    In-process sink aggregating span durations per stage and measurements per name, and summing counters.
+
+    Every record is aggregated under its name and, when it carries some of the key attributes, also under the series
+    of its name and the values of those attributes, e.g. "assistant.call{model=llama3,template=suggestion}". Other
+    attributes (cache, attempt, ...) are not part of the series, so their number stays bounded.
+
+    Attributes:
+        keys (tuple): The attributes the metrics are broken down by.
+        stages (dict): StageStats of the durations per (span name, key attributes).
+        values (dict): StageStats of the measurements per (name, key attributes).
+        counters (dict): Running total per (counter name, key attributes).
+
+    Methods:
+        emit(record): Adds a span, value or counter record.
+        snapshot(): Returns the aggregated stages, values and counters.
+    """
+    def __init__(self, max_samples=1024, keys=KEY_ATTRIBUTES):
+        """
+        Initializes an empty registry.
+
+        Args:
+            max_samples (int): Number of recent durations kept per series for the percentiles.
+            keys (tuple): The attributes the metrics are broken down by.
+        """
+        self.max_samples = max_samples
+        self.keys = tuple(keys)
+        self.stages = {}
+        self.values = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def _series(self, record):
+        # the total of the name, then the breakdown by the key attributes present on the record
+        attributes = record["attributes"]
+        labels = tuple((key, str(attributes[key])) for key in self.keys if key in attributes)
+        return ((record["name"], ()), (record["name"], labels)) if labels else ((record["name"], ()),)
+
+    def _add(self, table, series, value):
+        stats = table.get(series)
+        if stats is None:
+            stats = table[series] = StageStats(self.max_samples)
+        stats.add(value)
+
+    def emit(self, record):
+        with self._lock:
+            for series in self._series(record):
+                if record["type"] == "span":
+                    self._add(self.stages, series, record["duration"])
+                elif record["type"] == "value":
+                    self._add(self.values, series, record["value"])
+                else:
+                    self.counters[series] = self.counters.get(series, 0) + record["value"]
+
+    @staticmethod
+    def _name(series):
+        name, labels = series
+        return f"{name}{{{','.join(f'{key}={value}' for key, value in labels)}}}" if labels else name
+
+    def snapshot(self):
+        """
+        Returns the aggregated metrics.
+
+        Returns:
+            dict: The summary of every stage (count, mean, min, max, p50, p95 in seconds), of every measurement and
+                the counters, keyed by name for the totals and by "name{key=value,...}" for the breakdowns.
+        """
+        with self._lock:
+            return {
+                "stages": {self._name(series): stats.summary() for series, stats in self.stages.items()},
+                "values": {self._name(series): stats.summary() for series, stats in self.values.items()},
+                "counters": {self._name(series): total for series, total in self.counters.items()},
+            }
+
+    def close(self):
+        pass
+
+
+class JSONLinesSink:
+    """
+    Sink appending every record to a JSON-lines file.
+
+    Attributes:
+        path (str): Path of the output file.
+    """
+    def __init__(self, path):
+        """
+        Opens the output file in append mode.
+
+        Args:
+            path (str): Path of the output file.
+        """
+        self.path = path
+        self._file = open(path, "a", buffering=1)
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        self._file.close()
+
+
+class OTLPSpanSink:
+    """
+    Sink exporting spans to an OpenTelemetry collector with the OTLP/HTTP JSON protocol. Counters are not exported.
+
+    Spans are sent in batches by a background thread, so emitting a span never waits on the collector (under the
+    GameServer, spans are emitted on the event loop). Export errors are counted and the batch is dropped, as are the
+    batches that find max_pending batches already waiting, so a missing or slow collector does not break a game.
+
+    Attributes:
+        endpoint (str): URL of the collector's trace endpoint.
+        service_name (str): Service name reported to the collector.
+        batch_size (int): Number of spans sent per request.
+        max_pending (int): Number of batches waiting for the export thread beyond which batches are dropped.
+        dropped (int): Number of spans that could not be exported.
+    """
+    def __init__(self, endpoint="http://127.0.0.1:4318/v1/traces", service_name="decidarch", batch_size=64,
+                 max_pending=16):
+        """
+        Initializes the sink.
+
+        Args:
+            endpoint (str): URL of the collector's trace endpoint.
+            service_name (str): Service name reported to the collector.
+            batch_size (int): Number of spans sent per request.
+            max_pending (int): Number of batches waiting for the export thread beyond which batches are dropped.
+        """
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._batch = []
+        self._lock = threading.Lock()
+        self._pending = queue.Queue(max_pending)
+        self._worker = None
+
+    @staticmethod
+    def _attribute(key, value):
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def _span(self, record):
+        span = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(record["start_time"]),
+            "endTimeUnixNano": str(record["start_time"] + int(record["duration"] * 1e9)),
+            "attributes": [self._attribute(key, value) for key, value in record["attributes"].items()],
+        }
+        if record["parent_id"]:
+            span["parentSpanId"] = record["parent_id"]
+        return span
+
+    def emit(self, record):
+        if record["type"] != "span":
+            return
+        with self._lock:
+            self._batch.append(self._span(record))
+            if len(self._batch) < self.batch_size:
+                return
+            batch, self._batch = self._batch, []
+        self._submit(batch, block=False)
+
+    def flush(self):
+        """
+        Sends the spans still buffered and waits until every batch has been exported or dropped.
+        """
+        with self._lock:
+            batch, self._batch = self._batch, []
+        if batch:
+            self._submit(batch, block=True)
+        if self._worker is not None:
+            self._pending.join()
+
+    def _submit(self, batch, block):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="otlp-export", daemon=True)
+                self._worker.start()
+        try:
+            self._pending.put(batch, block=block)
+        except queue.Full:
+            with self._lock:
+                self.dropped += len(batch)
+
+    def _run(self):
+        while True:
+            batch = self._pending.get()
+            try:
+                if batch is None:
+                    return
+                self._export(batch)
+            finally:
+                self._pending.task_done()
+
+    def _export(self, spans):
+        body = {
+            "resourceSpans": [{
+                "resource": {"attributes": [self._attribute("service.name", self.service_name)]},
+                "scopeSpans": [{"scope": {"name": "decidarch"}, "spans": spans}],
+            }]
+        }
+        request = urllib.request.Request(
+            self.endpoint, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=2).close()
+        except OSError:
+            with self._lock:
+                self.dropped += len(spans)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._pending.put(None)
+            worker.join()
+
+
+class Instrumentation:
+    """
+    Timers and counters around the stages of assistant calls and game turns, exported to pluggable sinks.
+
+    A sink is any object with emit(record) and close(); records are dicts with "type" set to "span", "value" or
+    "counter".
+    Spans opened inside another span (in the same thread or asyncio task) are linked to it as children.
+
+    Attributes:
+        sinks (list): The sinks receiving every record.
+        registry (MetricsRegistry, optional): The first in-process registry among the sinks, for quick access.
+
+    Methods:
+        span(name, **attributes): Context manager timing a stage.
+        record(name, duration, **attributes): Records a stage measured elsewhere.
+        observe(name, value, **attributes): Records a measurement that is not a duration.
+        count(name, value=1, **attributes): Adds to a counter.
+        record_generation(metadata, **attributes): Records the token counts and speeds reported by Ollama.
+        close(): Flushes and closes the sinks.
+    """
+
+    def __init__(self, *sinks):
+        """
+        Initializes the instrumentation.
+
+        Args:
+            *sinks: The sinks receiving the records. Defaults to a single MetricsRegistry.
+        """
+        self.sinks = list(sinks) or [MetricsRegistry()]
+        self.registry = next((sink for sink in self.sinks if isinstance(sink, MetricsRegistry)), None)
+
+    def _emit(self, record):
+        for sink in self.sinks:
+            sink.emit(record)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Times the enclosed block as a stage.
+
+        Args:
+            name (str): The name of the stage.
+            **attributes: Tags of the stage. More can be added to span.attributes inside the block.
+
+        Yields:
+            Span: The running span.
+        """
+        span = Span(name, attributes, _current_span.get())
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.duration = time.perf_counter() - start
+            _current_span.reset(token)
+            self._emit(span.to_record())
+
+    def record(self, name, duration, **attributes):
+        """
+        Records a stage whose duration was measured elsewhere, as a child of the current span.
+
+        Args:
+            name (str): The name of the stage.
+            duration (float): The duration in seconds.
+            **attributes: Tags of the stage.
+        """
+        span = Span(name, attributes, _current_span.get())
+        span.start_time -= int(duration * 1e9)
+        span.duration = duration
+        self._emit(span.to_record())
+
+    def observe(self, name, value, **attributes):
+        """
+        Records a measurement that is not a duration, e.g. a generation speed or a queue length.
+
+        Args:
+            name (str): The name of the measurement.
+            value (int or float): The measured value.
+            **attributes: Tags of the measurement.
+        """
+        self._emit({"type": "value", "name": name, "value": value, "attributes": attributes})
+
+    def count(self, name, value=1, **attributes):
+        """
+        Adds to a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (int or float): The amount to add.
+            **attributes: Tags of the counter.
+        """
+        self._emit({"type": "counter", "name": name, "value": value, "attributes": attributes})
+
+    def record_generation(self, metadata, **attributes):
+        """
+        Records the token counts and durations that Ollama reports in the last chunk of a generation.
+
+        Args:
+            metadata (dict): The Ollama response fields (prompt_eval_count, eval_count, *_duration in nanoseconds).
+            **attributes: Tags of the records.
+        """
+        prompt_tokens = metadata.get("prompt_eval_count") or 0
+        completion_tokens = metadata.get("eval_count") or 0
+        self.count("ollama.prompt_tokens", prompt_tokens, **attributes)
+        self.count("ollama.completion_tokens", completion_tokens, **attributes)
+        for field in ("load_duration", "prompt_eval_duration", "eval_duration"):
+            if metadata.get(field):
+                self.record(f"ollama.{field[:-len('_duration')]}", metadata[field] / 1e9, **attributes)
+        if metadata.get("eval_duration"):
+            self.observe("ollama.tokens_per_second", completion_tokens / (metadata["eval_duration"] / 1e9),
+                         **attributes)
+
+    def close(self):
+        """
+        Flushes and closes every sink.
+        """
+        for sink in self.sinks:
+            sink.close()
@@ -1,6 +1,10 @@
+import argparse
+import os
 import time
 import configuration
-from decidarch_assistant import DecidArchAssistant
+from context_builder import ContextBuilder
+from prefetch import SuggestionPrefetcher
+from score_state import ScoreState
 from models import Player, ProjectCard, StakeholderCard, ConcernCard, EventCard
 
 
@@ -10,22 +14,43 @@ class DecidArchGame:
 
     Attributes:
         configuration (object): Configuration settings for the game, including limits for players, concerns, etc.
-        assistant (DecidArchAssistant): The AI assistant helping suggest design decisions.
+        assistant (DecidArchAssistant): The AI assistant helping suggest design decisions. It is imported and created
+            on first use, so that a game can be set up and scored without loading the assistant.
+        session (AssistantSession): The assistant session of the game, which sends the project and stakeholders once.
         players (list): List of players participating in the game.
         project_card (ProjectCard): The project card containing the project name and purpose.
         stakeholder_cards (list): List of StakeholderCard objects representing stakeholders and their priorities.
         concern_cards (list): List of ConcernCard objects representing design concerns.
         event_cards (list): List of EventCard objects representing project events.
         decision_template (list): List tracking the design decisions made during the game.
+        score_state (ScoreState): Running QA scores and score of the decisions in decision_template.
         current_concern_index (int): Index tracking the current concern card in play.
         start_time (float): The time when the game starts.
         end_time (float): The time when the game ends.
+        clock (callable): Returns the current time in seconds. Defaults to time.time; a simulated clock can replace it.
+        suggestion_latencies (list): Seconds the players waited for each suggestion: the wait for a prefetch still
+            running, plus the time to first token when the suggestion was streamed instead.
+        prefetcher (SuggestionPrefetcher): Requests the next concern's suggestion while the current turn is discussed.
+        instrumentation (Instrumentation): Timers of the turns, shared with the assistant.
+        context_builder (ContextBuilder): Compacts the game state sent in the suggestion prompts.
+        journal (GameJournal, optional): Append-only record of the game, from which it can be resumed.
+        example_store (ExampleStore, optional): Past decisions the assistant selects few-shot examples from. Set it
+            before the first suggestion.
 
     Methods:
-        setup_game(): Sets up the game by gathering input for players, project, stakeholders, concerns, and events.
+        setup_game(library): Sets up the game from a card library, or by gathering input for players, project,
+            stakeholders, concerns, and events.
+        setup_players(): Gathers input for the players.
         calculate_score(): Calculates the final score of the game based on stakeholder satisfaction with design decisions.
-        play_game(): Runs the game loop where players take turns making decisions based on concern cards.
+        play_game(library, journal): Runs the game loop where players take turns making decisions based on concern cards.
+        play_turn(player): Plays the turn of a player on the current concern card.
         calculate_qa_scores(): Calculates the current quality attribute scores based on the decisions made so far.
+        suggestion_inputs(concern_card): Builds the inputs of the assistant's suggestion request.
+        review_event(event_card): Returns the assistant's review of the decisions an event affects.
+        reset_score_state(): Rebuilds the running score state from the stakeholders and the decisions.
+        table(): Returns the cards of the game.
+        choose_option(concern_card): Asks the players for the design option to take.
+        resume_game(journal): Restores the game recorded in a journal.
     """
 
     def __init__(self):
@@ -33,36 +58,76 @@ class DecidArchGame:
         Initializes a DecidArchGame instance with default configuration and empty game data structures.
         """
         self.configuration = configuration.Configuration()
-        self.assistant = DecidArchAssistant(self.configuration)
+        self._assistant = None
         self.players = []
         self.project_card = None
         self.stakeholder_cards = []
         self.concern_cards = []
         self.event_cards = []
-        self.decision_template = []
+        self.score_state = ScoreState(self.stakeholder_cards)
+        self.decision_template = self.score_state.decisions
         self.current_concern_index = 0
         self.start_time = None
         self.end_time = None
+        self.clock = time.time
+        self.suggestion_latencies = []
+        self.context_builder = ContextBuilder(self.configuration.prompt_token_budget)
+        self.journal = None
+        self.example_store = None
 
-    def setup_game(self):
+    def _start_assistant(self):
+        if self._assistant is None:
+            from decidarch_assistant import DecidArchAssistant
+
+            self._assistant = DecidArchAssistant(self.configuration, example_store=self.example_store)
+            self._session = self._assistant.start_session()
+            self._prefetcher = SuggestionPrefetcher(self._session.extract_suggestion_chain,
+                                                    timeout=self.configuration.prefetch_timeout)
+
+    @property
+    def assistant(self):
+        self._start_assistant()
+        return self._assistant
+
+    @property
+    def session(self):
+        self._start_assistant()
+        return self._session
+
+    @property
+    def prefetcher(self):
+        self._start_assistant()
+        return self._prefetcher
+
+    @property
+    def instrumentation(self):
+        return self.assistant.instrumentation
+
+    def setup_game(self, library=None):
         """
         Sets up the game by collecting input for players, project details, stakeholders, concerns, and events.
         Validates the number of players, stakeholders, concerns, and events to stay within configuration limits.
+
+        Args:
+            library (str, optional): A card library file, as accepted by card_library.load_library. The cards are
+                loaded from it instead, and only the players are asked for if the library has none.
         """
-        # players setup
-        num_players = int(input(f"Enter number of players (max {self.configuration.MAX_PLAYERS}): "))
-        if num_players > self.configuration.MAX_PLAYERS:
-            print(
-                f"Number of players cannot exceed {self.configuration.MAX_PLAYERS}. Setting to {self.configuration.MAX_PLAYERS}.")
-            num_players = self.configuration.MAX_PLAYERS
-        elif num_players < self.configuration.MIN_PLAYERS:
-            print(f"Number of players cannot be less than {self.configuration.MIN_PLAYERS}.")
-            num_players = self.configuration.MIN_PLAYERS
+        if library is not None:
+            from card_library import load_library
 
-        for _ in range(num_players):
-            first_name = input("Enter player's first name: ")
-            last_name = input("Enter player's last name: ")
-            self.players.append(Player(first_name, last_name))
+            table = load_library(library, self.configuration).table
+            self.players = list(table["players"])
+            self.project_card = table["project"]
+            self.stakeholder_cards = list(table["stakeholders"])
+            self.concern_cards = list(table["concerns"])
+            self.event_cards = list(table["events"])
+            if not self.players:
+                self.setup_players()
+            self.reset_score_state()
+            return
+
+        # players setup
+        self.setup_players()
 
         # project setup
         project_name = input("Enter project name: ")
@@ -114,6 +179,37 @@ class DecidArchGame:
             consequence = input("Enter event consequence: ")
             self.event_cards.append(EventCard(title, description, consequence))
 
+        self.reset_score_state()
+
+    def setup_players(self):
+        """
+        Collects the players' names, keeping their number within the configuration limits.
+        """
+        num_players = int(input(f"Enter number of players (max {self.configuration.MAX_PLAYERS}): "))
+        if num_players > self.configuration.MAX_PLAYERS:
+            print(
+                f"Number of players cannot exceed {self.configuration.MAX_PLAYERS}. Setting to {self.configuration.MAX_PLAYERS}.")
+            num_players = self.configuration.MAX_PLAYERS
+        elif num_players < self.configuration.MIN_PLAYERS:
+            print(f"Number of players cannot be less than {self.configuration.MIN_PLAYERS}.")
+            num_players = self.configuration.MIN_PLAYERS
+
+        for _ in range(num_players):
+            first_name = input("Enter player's first name: ")
+            last_name = input("Enter player's last name: ")
+            self.players.append(Player(first_name, last_name))
+
+    def reset_score_state(self):
+        """
+        Rebuilds the running score state from the stakeholder cards and the decisions in decision_template.
+        Called after setup, and whenever decision_template is replaced or modified outside of score_state.
+        """
+        decisions = list(self.decision_template)
+        self.score_state = ScoreState(self.stakeholder_cards)
+        for decision in decisions:
+            self.score_state.append(decision)
+        self.decision_template = self.score_state.decisions
+
     def calculate_score(self):
         """
         Calculates the final score of the game based on the satisfaction of the stakeholders with the decisions made.
@@ -121,70 +217,213 @@ class DecidArchGame:
         Returns:
             int: The final score or -1 if the score for any quality attribute is negative.
         """
-        qa_scores = {attr: 0 for stakeholder in self.stakeholder_cards for attr in
-                     stakeholder.quality_attributes.keys()}
-        for decision in self.decision_template:
-            for attr, impact in decision.items():
-                qa_scores[attr] += impact
+        return self.score_state.score()
 
-        if any(score < 0 for score in qa_scores.values()):
-            return -1  # Immediate loss due to negative score
+    def table(self):
+        """
+        Returns the cards of the game.
+
+        Returns:
+            dict: The players, project, stakeholders, concerns and events, as returned by simulator.load_table.
+        """
+        return {"players": self.players, "project": self.project_card, "stakeholders": self.stakeholder_cards,
+                "concerns": self.concern_cards, "events": self.event_cards}
 
-        stakeholder_satisfaction = []
-        for stakeholder in self.stakeholder_cards:
-            satisfaction = sum(
-                max(0, qa_scores[attr] - priority) for attr, priority in stakeholder.quality_attributes.items())
-            stakeholder_satisfaction.append(satisfaction)
+    def resume_game(self, journal):
+        """
+        Restores the game recorded in a journal, from its latest snapshot and the records after it, and keeps
+        recording in the same journal. The game clock is not reset: a game resumed after its end time is over. A
+        game that already ended is restored as it ended, and its journal is left untouched.
 
-        final_score = sum(stakeholder_satisfaction)
-        return final_score
+        Args:
+            journal (str): The journal file.
 
-    def play_game(self):
+        Returns:
+            JournalState: The restored state, finished if the journal holds the end of the game.
+        """
+        from game_journal import GameJournal, restore
+
+        state = restore(journal)
+        self.players = list(state.table["players"])
+        self.project_card = state.table["project"]
+        self.stakeholder_cards = list(state.table["stakeholders"])
+        self.concern_cards = list(state.table["concerns"])
+        self.event_cards = list(state.table["events"])
+        self.decision_template = state.decisions
+        self.reset_score_state()
+        self.current_concern_index = state.current_concern_index
+        self.start_time = state.start_time
+        self.end_time = state.end_time
+        self.journal = None if state.finished else GameJournal(journal, self.configuration.journal_snapshot_interval)
+        return state
+
+    def play_game(self, library=None, journal=None):
         """
         Runs the game loop, where players take turns making design decisions based on the concern cards.
 
         The game runs for 30 minutes or until all concerns have been addressed.
         After each turn, the AI assistant suggests the best design decision based on the game state.
+
+        Args:
+            library (str, optional): A card library file to set up the game from, as in setup_game.
+            journal (str, optional): A journal file recording the game. If it already holds a game, that game is
+                resumed instead of setting up a new one; if that game ended, its final score is shown again.
         """
-        self.setup_game()
-        self.start_time = time.time()
-        self.end_time = self.start_time + 30 * 60  # 30 minutes
+        if journal is not None and os.path.exists(journal) and os.path.getsize(journal):
+            state = self.resume_game(journal)
+            if state.finished:
+                print(f"The game in {journal} is over.")
+                print(f"Final Score: {state.score}")
+                return
+        else:
+            self.setup_game(library)
+            self.start_time = self.clock()
+            self.end_time = self.start_time + 30 * 60  # 30 minutes
+            if journal is not None:
+                from game_journal import GameJournal
+
+                self.journal = GameJournal(journal, self.configuration.journal_snapshot_interval)
+                self.journal.start(self.table(), self.start_time, self.end_time)
 
-        while time.time() < self.end_time and self.current_concern_index < len(self.concern_cards):
+        while self.clock() < self.end_time and self.current_concern_index < len(self.concern_cards):
             for player in self.players:
-                if time.time() >= self.end_time:
+                if self.clock() >= self.end_time:
                     break
 
-                concern_card = self.concern_cards[self.current_concern_index]
-                print(f"{player.first_name} {player.last_name}'s turn:")
-                print(f"Concern: {concern_card.concern}")
-
-                current_design_decisions = ", ".join(
-                    [f"{k}: {v}" for decision in self.decision_template for k, v in decision.items()])
-                current_qa_scores = ", ".join([f"{k}: {v}" for k, v in self.calculate_qa_scores().items()])
-                ongoing_events = ", ".join([f"{event.title}: {event.description}" for event in self.event_cards])
-
-                suggestion = self.assistant.extract_suggestion_chain(
-                    project_description=f"{self.project_card.name} - {self.project_card.purpose}",
-                    stakeholders=self.stakeholder_cards,
-                    current_design_decisions=current_design_decisions,
-                    current_qa_scores=current_qa_scores,
-                    ongoing_events=ongoing_events,
-                    concern_card_description=concern_card.concern,
-                    design_options=concern_card.design_decisions
-                )
-                print(f"Suggestion: {suggestion}")
-
-                # simulating decision-making by adding the concern's design decisions to the template
-                self.decision_template.append(concern_card.design_decisions)
-                self.current_concern_index += 1
+                with self.instrumentation.span("game.turn", concern=self.current_concern_index + 1):
+                    self.play_turn(player)
 
                 if self.current_concern_index >= len(self.concern_cards):
                     break
 
+        self.prefetcher.close()
+
         # final score calculation
         final_score = self.calculate_score()
         print(f"Final Score: {final_score}")
+        if self.journal is not None:
+            self.journal.end(final_score)
+            self.journal.close()
+
+    def play_turn(self, player):
+        """
+        Plays one turn: shows the concern card in play and the assistant's suggestion, then commits the decision.
+
+        Args:
+            player (Player): The player whose turn it is.
+        """
+        concern_card = self.concern_cards[self.current_concern_index]
+        print(f"{player.first_name} {player.last_name}'s turn:")
+        print(f"Concern: {concern_card.concern}")
+        if self.journal is not None:
+            self.journal.turn(self.players.index(player), self.current_concern_index, self.clock())
+
+        with self.instrumentation.span("game.suggestion") as span:
+            inputs = self.suggestion_inputs(concern_card)
+            # counted for the prompt of the turn only, not again for the speculative one built by the prefetch
+            self.instrumentation.count("prompt.tokens_saved", self.context_builder.last_report["tokens_saved"])
+            # a single deadline for the turn: the wait for a prefetch still running counts against it, and past it
+            # the rule-based advisor answers, so a slow or unreachable Ollama does not eat the turn
+            deadline = time.monotonic() + self.configuration.suggestion_deadline
+            prefetched = self.prefetcher.take(timeout=self.configuration.suggestion_deadline, **inputs)
+            span.attributes["prefetched"] = prefetched is not None
+            if prefetched is not None:
+                # the players only waited for the part of the prefetch still running when the turn started
+                latency = self.prefetcher.last_wait
+                print(f"Suggestion: {prefetched}")
+                self.suggestion_latencies.append(latency)
+                if self.journal is not None:
+                    self.journal.suggestion(self.current_concern_index, prefetched, prefetched=True, latency=latency)
+            elif time.monotonic() >= deadline:
+                # the wait for a prefetch that then failed used up the turn
+                suggestion = self.assistant.fallback_suggestion(
+                    inputs["stakeholders"], inputs["current_qa_scores"], inputs["concern_card_description"],
+                    inputs["design_options"])
+                latency = self.prefetcher.last_wait
+                print(f"Suggestion: {suggestion}")
+                span.attributes["fallback"] = True
+                self.suggestion_latencies.append(latency)
+                if self.journal is not None:
+                    self.journal.suggestion(self.current_concern_index, suggestion, prefetched=False, fallback=True,
+                                            latency=latency)
+            else:
+                suggestion = self.session.stream_suggestion_chain(**inputs, deadline=deadline)
+                # printing the suggestion while it is generated instead of waiting for the whole completion
+                print("Suggestion: ", end="", flush=True)
+                for piece in suggestion:
+                    print(piece, end="", flush=True)
+                print()
+                span.attributes["fallback"] = suggestion.used_fallback
+                latency = self.prefetcher.last_wait + suggestion.time_to_first_token
+                self.suggestion_latencies.append(latency)
+                if self.journal is not None:
+                    self.journal.suggestion(self.current_concern_index, suggestion.text, prefetched=False,
+                                            fallback=suggestion.used_fallback, latency=latency)
+
+        option, decision = self.choose_option(concern_card)
+        with self.instrumentation.span("game.scoring"):
+            self.score_state.append(decision)
+            if self.journal is not None:
+                # written before moving on, so that a crash after this point never loses the decision
+                self.journal.decision(self.current_concern_index, decision, self.score_state.decisions, option)
+            self.current_concern_index += 1
+
+        # requesting the next concern's suggestion while the team discusses the committed decision
+        if self.current_concern_index < len(self.concern_cards):
+            self.prefetcher.prefetch(**self.suggestion_inputs(self.concern_cards[self.current_concern_index]))
+
+    def choose_option(self, concern_card):
+        """
+        Asks the players which design option of a concern card they take. A card with a single option is taken as
+        is.
+
+        Args:
+            concern_card (ConcernCard): The concern card in play.
+
+        Returns:
+            tuple: The name of the option and its impacts on the quality attributes.
+        """
+        options = concern_card.design_options()
+        names = list(options)
+        if len(names) == 1:
+            return names[0], options[names[0]]
+        for number, name in enumerate(names, 1):
+            print(f"  {number}. {name}")
+        while True:
+            choice = input(f"Choose a design option (1-{len(names)}): ").strip()
+            if choice.isdigit() and 1 <= int(choice) <= len(names):
+                return names[int(choice) - 1], options[names[int(choice) - 1]]
+
+    def suggestion_inputs(self, concern_card):
+        """
+        Builds the inputs of the assistant's suggestion request for a concern card in the current game state,
+        compacted to the configured prompt token budget.
+
+        Args:
+            concern_card (ConcernCard): The concern card in play.
+
+        Returns:
+            dict: The keyword arguments of DecidArchAssistant.extract_suggestion_chain.
+        """
+        return self.context_builder.build(
+            self.project_card, self.stakeholder_cards, self.score_state, self.event_cards, concern_card)
+
+    def review_event(self, event_card):
+        """
+        Asks the assistant which past decisions to revise after an event, sending only the decisions it affects.
+
+        Args:
+            event_card (EventCard): The event that occurred.
+
+        Returns:
+            str: The suggested revisions, or None without asking the assistant when the event affects no decision.
+        """
+        inputs = self.context_builder.build_review(
+            self.project_card, self.stakeholder_cards, self.score_state, event_card)
+        review = None if inputs is None else self.session.extract_review_suggestion_chain(**inputs)
+        if self.journal is not None and event_card in self.event_cards:
+            self.journal.review(self.event_cards.index(event_card), review)
+        return review
 
     def calculate_qa_scores(self):
         """
@@ -193,14 +432,21 @@ class DecidArchGame:
         Returns:
             dict: A dictionary of quality attribute scores.
         """
-        qa_scores = {attr: 0 for stakeholder in self.stakeholder_cards for attr in
-                     stakeholder.quality_attributes.keys()}
-        for decision in self.decision_template:
-            for attr, impact in decision.items():
-                qa_scores[attr] += impact
-        return qa_scores
+        return dict(self.score_state.qa_scores)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play DecidArch with the assistant.")
+    parser.add_argument("library", nargs="?", help="JSON or YAML card library to set up the game from")
+    parser.add_argument("--journal", help="file recording the game; an interrupted game recorded in it is resumed")
+    parser.add_argument("--examples", nargs="+", default=[],
+                        help="JSON or YAML expert examples and game journals to select few-shot examples from")
+    args = parser.parse_args()
+
     game = DecidArchGame()
-    game.play_game()
\ No newline at end of file
+    if args.examples:
+        from example_store import load_example_store
+
+        game.example_store = load_example_store(args.examples, game.configuration.few_shot_examples,
+                                                game.configuration.few_shot_token_budget)
+    game.play_game(args.library, args.journal)
\ No newline at end of file
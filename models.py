@@ -1,3 +1,92 @@
+import re
+import sys
+import threading
+
+
+class Vocabulary:
+    """
+    Interned names of the quality attributes, each numbered with a small integer code in order of first use.
+
+    Cards loaded from different files or requests would otherwise each hold their own copy of the same names; the
+    cards keep the interned strings instead, and the codes let compact encodings store impacts as small integers.
+    The cards themselves still hold their impacts and priorities as dicts keyed by the names: the small-integer
+    arrays only exist in compact.GameSnapshot encodings.
+
+    Attributes:
+        names (list): The names, indexed by code.
+
+    Methods:
+        code(name): Returns the code of a name, adding it to the vocabulary if needed.
+        intern(name): Returns the interned copy of a name.
+        intern_keys(mapping): Returns a copy of a dict keyed by quality attributes, with interned keys.
+    """
+    __slots__ = ("names", "_codes", "_lock")
+
+    def __init__(self, names=()):
+        """
+        Initializes a vocabulary.
+
+        Args:
+            names (iterable): Names to number first.
+        """
+        self.names = []
+        self._codes = {}
+        self._lock = threading.Lock()
+        for name in names:
+            self.code(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name):
+        """
+        Returns the code of a name, numbering it if it is new.
+
+        Args:
+            name (str): The name of a quality attribute.
+
+        Returns:
+            int: Its code.
+        """
+        code = self._codes.get(name)
+        if code is None:
+            with self._lock:
+                code = self._codes.get(name)
+                if code is None:
+                    name = sys.intern(name)
+                    code = self._codes[name] = len(self.names)
+                    self.names.append(name)
+        return code
+
+    def intern(self, name):
+        """
+        Returns the copy of a name shared by every card.
+
+        Args:
+            name (str): The name of a quality attribute.
+
+        Returns:
+            str: The interned name.
+        """
+        return self.names[self.code(name)]
+
+    def intern_keys(self, mapping):
+        """
+        Returns a copy of a dict keyed by quality attributes, with the interned names as keys.
+
+        Args:
+            mapping (dict): E.g. the priorities of a stakeholder or the impacts of a design option.
+
+        Returns:
+            dict: The copy.
+        """
+        return {self.intern(attr): value for attr, value in mapping.items()}
+
+
+# shared by every card of the process
+QA_VOCABULARY = Vocabulary()
+
+
 class Player:
     """
     Represents a player in the system.
@@ -6,6 +95,8 @@ class Player:
         first_name (str): The first name of the player.
         last_name (str): The last name of the player.
     """
+    __slots__ = ("first_name", "last_name")
+
     def __init__(self, first_name, last_name):
         """
         Initializes a Player object.
@@ -25,6 +116,8 @@ class ProjectCard:
         name (str): The name of the project.
         purpose (str): The purpose of the project.
     """
+    __slots__ = ("name", "purpose")
+
     def __init__(self, name, purpose):
         """
         Initializes a ProjectCard object.
@@ -43,8 +136,10 @@ class StakeholderCard:
     Attributes:
         role (str): The role of the stakeholder.
         goal (str): The goal of the stakeholder.
-        quality_attributes (str): Quality attributes important to the stakeholder.
+        quality_attributes (dict): Quality attributes important to the stakeholder, with their priority.
     """
+    __slots__ = ("role", "goal", "quality_attributes")
+
     def __init__(self, role, goal, quality_attributes):
         """
         Initializes a StakeholderCard object.
@@ -52,11 +147,11 @@ class StakeholderCard:
         Args:
             role (str): The role of the stakeholder.
             goal (str): The goal of the stakeholder.
-            quality_attributes (str): Quality attributes important to the stakeholder.
+            quality_attributes (dict): Quality attributes important to the stakeholder, with their priority.
         """
         self.role = role
         self.goal = goal
-        self.quality_attributes = quality_attributes
+        self.quality_attributes = QA_VOCABULARY.intern_keys(quality_attributes)
 
 class ConcernCard:
     """
@@ -66,7 +161,12 @@ class ConcernCard:
         card_id (int): Unique identifier for the concern card.
         concern (str): The specific concern to address.
         design_decisions (list): A list of design decisions related to the concern.
+
+    Methods:
+        design_options(): Returns the design options offered by the card, keyed by option name.
     """
+    __slots__ = ("card_id", "concern", "design_decisions")
+
     def __init__(self, card_id, concern, design_decisions):
         """
         Initializes a ConcernCard object.
@@ -79,6 +179,30 @@ class ConcernCard:
         self.card_id = card_id
         self.concern = concern
         self.design_decisions = design_decisions
+        if self._has_options():
+            self.design_decisions = {option: QA_VOCABULARY.intern_keys(impacts)
+                                     for option, impacts in design_decisions.items()}
+        elif design_decisions:
+            self.design_decisions = QA_VOCABULARY.intern_keys(design_decisions)
+
+    def _has_options(self):
+        return bool(self.design_decisions) and all(
+            isinstance(impacts, dict) for impacts in self.design_decisions.values())
+
+    def design_options(self):
+        """
+        Returns the design options offered by the card.
+
+        design_decisions holds either several named options, as {option: {quality attribute: impact}}, or the
+        impacts of a single decision, as {quality attribute: impact}. In the latter case the card offers one
+        option, named after the concern.
+
+        Returns:
+            dict: The impacts of each option, keyed by option name.
+        """
+        if self._has_options():
+            return self.design_decisions
+        return {self.concern: self.design_decisions}
 
 class EventCard:
     """
@@ -88,8 +212,14 @@ class EventCard:
         title (str): The title of the event.
         description (str): A detailed description of the event.
         consequence (str): The consequence or impact of the event.
+        quality_attributes (tuple): The quality attributes the event affects, empty if the card is not tagged.
+
+    Methods:
+        affected_attributes(known): Returns the quality attributes the event affects, read from its text if untagged.
     """
-    def __init__(self, title, description, consequence):
+    __slots__ = ("title", "description", "consequence", "quality_attributes")
+
+    def __init__(self, title, description, consequence, quality_attributes=()):
         """
         Initializes an EventCard object.
 
@@ -97,7 +227,32 @@ class EventCard:
             title (str): The title of the event.
             description (str): A detailed description of the event.
             consequence (str): The consequence or impact of the event.
+            quality_attributes (iterable, optional): The quality attributes the event affects.
         """
         self.title = title
         self.description = description
-        self.consequence = consequence
\ No newline at end of file
+        self.consequence = consequence
+        self.quality_attributes = tuple(QA_VOCABULARY.intern(attr) for attr in quality_attributes)
+
+    def affected_attributes(self, known):
+        """
+        Returns the quality attributes the event affects: its tags, or else the known attributes its title,
+        description or consequence mention (e.g. "reduce costs" mentions Cost).
+
+        Args:
+            known (iterable): The quality attributes of the game.
+
+        Returns:
+            set: The affected attributes, empty if the event mentions none.
+        """
+        if self.quality_attributes:
+            return set(self.quality_attributes)
+        # words separated by single spaces, so that multi-word attributes match too
+        words = re.findall(r"\w+", f"{self.title} {self.description} {self.consequence}".lower())
+        text = " {} ".format(" ".join(words))
+        affected = set()
+        for attr in known:
+            name = " ".join(re.findall(r"\w+", attr.lower()))
+            if name and (f" {name} " in text or f" {name}s " in text):
+                affected.add(attr)
+        return affected
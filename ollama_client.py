@@ -0,0 +1,281 @@
+import asyncio
+import http.client
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+
+class OllamaError(Exception):
+    """
+    Raised when the Ollama server answers a request with an error status.
+
+    Attributes:
+        status (int, optional): The HTTP status of the answer.
+    """
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class OllamaClient:
+    """
+    Minimal client for the Ollama generate API that keeps a pool of keep-alive HTTP connections.
+
+    The same client is shared by every caller of an assistant, so concurrent games reuse the same connections
+    instead of opening one per request. Blocking calls borrow a connection from the pool; async calls run the
+    blocking call on a thread pool of the same size as the connection pool.
+
+    Attributes:
+        base_url (str): Base URL of the Ollama server.
+        model (str): Name of the model used for generation.
+        system (str, optional): System prompt sent with every request.
+        pool_size (int): Maximum number of pooled connections and of worker threads for async calls.
+        timeout (float, optional): Socket timeout in seconds.
+        keep_alive (str or int, optional): How long Ollama keeps the model loaded after a request, e.g. "30m".
+
+    Methods:
+        generate(prompt, **options): Sends a prompt and returns the full Ollama response.
+        agenerate(prompt, **options): Async variant of generate.
+        stream(prompt, **options): Sends a prompt and yields the Ollama response chunks as they arrive.
+        astream(prompt, **options): Async variant of stream.
+        embed(text, model=None): Returns the embedding of a text.
+        tags(): Returns the names of the models available on the server.
+        close(): Closes the pooled connections and the worker threads.
+    """
+
+    def __init__(self, base_url, model, system=None, pool_size=8, timeout=None, keep_alive=None):
+        """
+        Initializes the client. Connections are opened lazily and then kept in the pool.
+
+        Args:
+            base_url (str): Base URL of the Ollama server, e.g. "http://127.0.0.1:11434".
+            model (str): Name of the model used for generation.
+            system (str, optional): System prompt sent with every request.
+            pool_size (int): Maximum number of pooled connections and of worker threads for async calls.
+            timeout (float, optional): Socket timeout in seconds.
+            keep_alive (str or int, optional): How long Ollama keeps the model loaded after a request, e.g. "30m".
+        """
+        url = urlsplit(base_url)
+        self.base_url = base_url
+        self.model = model
+        self.system = system
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._host = url.hostname
+        self._port = url.port
+        self._connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ollama")
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connection_class(self._host, self._port, timeout=self.timeout)
+
+    def _release(self, connection):
+        try:
+            self._pool.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def _send(self, path, body, method="POST"):
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        # a pooled connection may have been closed by the server while idle, so retry once on a fresh one
+        for attempt in range(2):
+            connection = self._acquire()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                connection.close()
+                raise
+            if response.status != 200:
+                data = response.read()
+                self._release(connection)
+                raise OllamaError(f"Ollama returned {response.status}: {data.decode('utf-8', 'replace')}",
+                                  response.status)
+            return connection, response
+
+    def _post(self, path, body, method="POST"):
+        connection, response = self._send(path, body, method)
+        try:
+            data = response.read()
+        except Exception:
+            connection.close()
+            raise
+        self._release(connection)
+        return json.loads(data)
+
+    def _request_body(self, prompt, options, context=None, system=None, format=None):
+        body = {"model": self.model, "prompt": prompt, "stream": False}
+        if format is not None:
+            body["format"] = format
+        system = self.system if system is None else system
+        if system:
+            body["system"] = system
+        if context:
+            body["context"] = context
+        if self.keep_alive is not None:
+            body["keep_alive"] = self.keep_alive
+        if options:
+            body["options"] = options
+        return body
+
+    def generate(self, prompt, context=None, system=None, format=None, **options):
+        """
+        Sends a prompt to the generate API and waits for the whole completion.
+
+        Args:
+            prompt (str): The prompt to complete.
+            context (list, optional): The "context" returned by an earlier response. Its tokens are not evaluated
+                again: the prompt is appended to them.
+            system (str, optional): System prompt of this request. Defaults to the client's; "" sends none.
+            format (dict or str, optional): JSON schema the completion must follow, or "json" for any JSON value.
+                Ollama constrains the generation to it.
+            **options: Model options forwarded to Ollama (temperature, num_ctx, ...).
+
+        Returns:
+            dict: The Ollama response, with the completion under "response", the timing and token counters, and
+                the "context" to continue from.
+        """
+        return self._post("/api/generate", self._request_body(prompt, options, context, system, format))
+
+    async def agenerate(self, prompt, context=None, system=None, format=None, **options):
+        """
+        Async variant of generate. The request runs on the client's worker threads, so the event loop stays free.
+
+        Args:
+            prompt (str): The prompt to complete.
+            context (list, optional): The "context" returned by an earlier response.
+            system (str, optional): System prompt of this request. Defaults to the client's; "" sends none.
+            format (dict or str, optional): JSON schema the completion must follow, or "json".
+            **options: Model options forwarded to Ollama.
+
+        Returns:
+            dict: The Ollama response.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: self.generate(prompt, context, system, format, **options))
+
+    def stream(self, prompt, context=None, system=None, format=None, **options):
+        """
+        Sends a prompt to the generate API in streaming mode and yields each chunk as soon as Ollama sends it.
+
+        Args:
+            prompt (str): The prompt to complete.
+            context (list, optional): The "context" returned by an earlier response.
+            system (str, optional): System prompt of this request. Defaults to the client's; "" sends none.
+            format (dict or str, optional): JSON schema the completion must follow, or "json".
+            **options: Model options forwarded to Ollama.
+
+        Yields:
+            dict: The Ollama chunks. Each carries the next piece of text under "response"; the last one has
+                "done" set and carries the timing and token counters.
+        """
+        body = self._request_body(prompt, options, context, system, format)
+        body["stream"] = True
+        connection, response = self._send("/api/generate", body)
+        try:
+            for line in response:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                yield chunk
+                if chunk.get("done"):
+                    break
+            response.read()
+        except BaseException:
+            # the response was not read to the end (error or consumer stopped early): the connection is unusable
+            connection.close()
+            raise
+        self._release(connection)
+
+    async def astream(self, prompt, context=None, system=None, format=None, **options):
+        """
+        Async variant of stream. The chunks are read on a worker thread and handed over to the event loop.
+
+        Args:
+            prompt (str): The prompt to complete.
+            context (list, optional): The "context" returned by an earlier response.
+            system (str, optional): System prompt of this request. Defaults to the client's; "" sends none.
+            format (dict or str, optional): JSON schema the completion must follow, or "json".
+            **options: Model options forwarded to Ollama.
+
+        Yields:
+            dict: The Ollama chunks, as in stream.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stopped = threading.Event()
+        finished = object()
+
+        def produce():
+            try:
+                for chunk in self.stream(prompt, context, system, format, **options):
+                    if stopped.is_set():
+                        break
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as error:
+                loop.call_soon_threadsafe(chunks.put_nowait, error)
+            finally:
+                loop.call_soon_threadsafe(chunks.put_nowait, finished)
+
+        loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                item = await chunks.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stopped.set()
+
+    def embed(self, text, model=None):
+        """
+        Sends a text to the embeddings API.
+
+        Args:
+            text (str): The text to embed.
+            model (str, optional): The embedding model, e.g. "nomic-embed-text". Defaults to the client's model.
+
+        Returns:
+            list: The embedding.
+        """
+        body = {"model": model or self.model, "prompt": text}
+        if self.keep_alive is not None:
+            body["keep_alive"] = self.keep_alive
+        return self._post("/api/embeddings", body)["embedding"]
+
+    def tags(self):
+        """
+        Lists the models available on the server. Cheap enough to be used as a health check.
+
+        Returns:
+            list: The model names, e.g. "llama2:latest".
+        """
+        return [model["name"] for model in self._post("/api/tags", None, method="GET").get("models", [])]
+
+    def close(self):
+        """
+        Closes every pooled connection and shuts down the worker threads.
+        """
+        self._executor.shutdown(wait=False)
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
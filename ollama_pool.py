@@ -0,0 +1,492 @@
+import http.client
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from ollama_client import OllamaClient, OllamaError
+
+
+# states of the circuit breaker of a backend
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# weight of the newest probe in the latency moving average
+_LATENCY_SMOOTHING = 0.3
+
+# contexts whose backend is remembered, least recently used first out
+_MAX_PINNED_CONTEXTS = 4096
+
+
+class NoBackendAvailable(OllamaError):
+    """
+    Raised when no backend of an OllamaPool serves the requested model with its circuit closed.
+    """
+
+
+def model_name(name):
+    """
+    Normalizes a model name as listed by Ollama, where "llama2" and "llama2:latest" are the same model.
+
+    Args:
+        name (str): The model name.
+
+    Returns:
+        str: The name, without the ":latest" tag.
+    """
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+
+def is_backend_failure(error):
+    """
+    Tells the errors that show a backend is unwell (unreachable, timed out, server error) from the errors of the
+    request itself, which another backend would answer the same way.
+
+    Args:
+        error (Exception): The error raised by a request.
+
+    Returns:
+        bool: Whether the request should be retried on another backend and counted against this one.
+    """
+    if isinstance(error, OllamaError):
+        return error.status is None or error.status >= 500
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+class Backend:
+    """
+    One Ollama server of an OllamaPool, with its circuit breaker, its load and its counters.
+
+    Attributes:
+        url (str): Base URL of the server.
+        models (set, optional): The models it serves, without the ":latest" tag. None serves any model until a
+            probe lists them.
+        configured (bool): Whether models was configured, rather than learnt from the probes.
+        client (OllamaClient): The pooled client of the server.
+        state (str): CLOSED when it takes requests, OPEN after too many consecutive failures, HALF_OPEN when one
+            trial request may test it again.
+        outstanding (int): Requests sent to it and not answered yet.
+        latency (float, optional): Moving average of the probe round trip in seconds, None until probed.
+        requests (int): Requests answered or failed.
+        completed (int): Requests answered without a backend failure.
+        failures (int): Requests and probes that failed as a backend failure.
+        retried (int): Requests that failed on it and were retried on another backend.
+        consecutive_failures (int): Failures since the last success.
+        opened_at (float, optional): time.monotonic() when the circuit last opened.
+        request_time (float): Seconds spent in successful requests.
+
+    Methods:
+        serves(model): Whether the backend serves a model.
+        stats(): Returns the state and counters of the backend.
+    """
+    __slots__ = ("url", "models", "configured", "client", "state", "outstanding", "latency", "requests", "completed",
+                 "failures", "retried", "consecutive_failures", "opened_at", "request_time", "_trial")
+
+    def __init__(self, url, models, client):
+        """
+        Initializes a backend with a closed circuit.
+
+        Args:
+            url (str): Base URL of the server.
+            models (iterable, optional): The models it serves. None learns them from the probes.
+            client (OllamaClient): The pooled client of the server.
+        """
+        self.url = url
+        self.models = set(map(model_name, models)) if models is not None else None
+        self.configured = models is not None
+        self.client = client
+        self.state = CLOSED
+        self.outstanding = 0
+        self.latency = None
+        self.requests = 0
+        self.completed = 0
+        self.failures = 0
+        self.retried = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.request_time = 0.0
+        # whether the trial request of a half-open circuit is in flight
+        self._trial = False
+
+    def serves(self, model):
+        return self.models is None or model_name(model) in self.models
+
+    def stats(self):
+        """
+        Returns the state and counters of the backend.
+
+        Returns:
+            dict: The URL, models, circuit state, outstanding requests, probe latency and mean request time in
+                milliseconds, and the request, completion, failure and retry counts.
+        """
+        return {
+            "url": self.url,
+            "models": sorted(self.models) if self.models is not None else None,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "latency_ms": 1000 * self.latency if self.latency is not None else None,
+            "request_ms_mean": 1000 * self.request_time / self.completed if self.completed else None,
+            "requests": self.requests,
+            "completed": self.completed,
+            "failures": self.failures,
+            "retried": self.retried,
+        }
+
+
+class OllamaPool(OllamaClient):
+    """
+    Client spreading the requests of an assistant over several Ollama servers, used in place of an OllamaClient.
+
+    Each request goes to the backend serving its model with the fewest outstanding requests, the lowest probe
+    latency breaking ties. A request failing because of its backend (unreachable, timed out, server error) is
+    retried on another one; a streamed request only until its first chunk, as the caller has already seen the
+    text. After failure_threshold consecutive failures, of requests or probes, the circuit of a backend opens and it
+    gets no requests for reset_timeout seconds; then a single trial request closes the circuit again, or opens it
+    for another reset_timeout. A background thread probes every backend with /api/tags every probe_interval
+    seconds, to measure its latency, learn the models it serves when they are not configured, and notice a backend
+    going down, or coming back, which lets the trial request through before reset_timeout. A successful probe does
+    not close a circuit by itself: a server can list its models and still fail to generate.
+
+    A request continuing a context, e.g. a turn of an AssistantSession, goes to the backend that returned that
+    context, whatever its load, because only that backend has the context's prompt evaluated in its KV cache. It
+    goes to another backend only when the circuit of that one is open, or its request fails.
+
+    The async variants agenerate and astream are the OllamaClient ones, running the routed blocking calls on the
+    pool's worker threads.
+
+    Attributes:
+        backends (list): The Backend objects, in configuration order.
+        model (str): Name of the model used for generation.
+        system (str, optional): System prompt sent with every request.
+        pool_size (int): Connections kept per backend, and worker threads for async calls.
+        timeout (float, optional): Socket timeout in seconds.
+        keep_alive (str or int, optional): How long Ollama keeps the model loaded after a request.
+        probe_interval (float, optional): Seconds between two probes of the backends. None disables probing.
+        failure_threshold (int): Consecutive failures after which the circuit of a backend opens.
+        reset_timeout (float): Seconds an open circuit waits before a trial request.
+        retries (int): Maximum number of other backends a failed request is retried on.
+        instrumentation (Instrumentation, optional): Where the retries and circuit changes are counted.
+
+    Methods:
+        generate(prompt, **options), agenerate(prompt, **options): As in OllamaClient, on the chosen backend.
+        stream(prompt, **options), astream(prompt, **options): As in OllamaClient, on the chosen backend.
+        embed(text, model=None): As in OllamaClient, on a backend serving the embedding model.
+        tags(): Returns the models served by the backends with a closed circuit.
+        probe(): Probes every backend once.
+        stats(): Returns the state and counters of every backend.
+        close(): Stops probing and closes every backend client.
+    """
+
+    def __init__(self, backends, model, system=None, pool_size=8, timeout=None, keep_alive=None, probe_interval=10.0,
+                 failure_threshold=3, reset_timeout=30.0, retries=None, instrumentation=None):
+        """
+        Initializes the pool and starts probing the backends.
+
+        Args:
+            backends (list): The servers, each a base URL or a dict with "url" and optionally "models".
+            model (str): Name of the model used for generation.
+            system (str, optional): System prompt sent with every request.
+            pool_size (int): Connections kept per backend, and worker threads for async calls.
+            timeout (float, optional): Socket timeout in seconds.
+            keep_alive (str or int, optional): How long Ollama keeps the model loaded after a request.
+            probe_interval (float, optional): Seconds between two probes of the backends. None disables probing.
+            failure_threshold (int): Consecutive failures after which the circuit of a backend opens.
+            reset_timeout (float): Seconds an open circuit waits before a trial request.
+            retries (int, optional): Maximum number of other backends a failed request is retried on. Defaults to
+                every other backend.
+            instrumentation (Instrumentation, optional): Where the retries and circuit changes are counted.
+
+        Raises:
+            ValueError: If there is no backend.
+        """
+        if not backends:
+            raise ValueError("An Ollama pool needs at least one backend.")
+        self.model = model
+        self.system = system
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.probe_interval = probe_interval
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.retries = len(backends) - 1 if retries is None else retries
+        self.instrumentation = instrumentation
+        self.backends = []
+        for backend in backends:
+            url, models = (backend, None) if isinstance(backend, str) else (backend["url"], backend.get("models"))
+            client = OllamaClient(url, model, system=system, pool_size=pool_size, timeout=timeout,
+                                  keep_alive=keep_alive)
+            self.backends.append(Backend(url, models, client))
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ollama")
+        self._lock = threading.Lock()
+        # backend that returned each context, by context key
+        self._pinned = OrderedDict()
+        self._stopped = threading.Event()
+        self._prober = None
+        if probe_interval:
+            self._prober = threading.Thread(target=self._probe_loop, name="ollama-probe", daemon=True)
+            self._prober.start()
+
+    def _count(self, name, backend):
+        if self.instrumentation is not None:
+            self.instrumentation.count(name, backend=backend.url)
+
+    def _succeeded(self, backend):
+        # called with the lock held
+        backend.consecutive_failures = 0
+        if backend.state != CLOSED:
+            backend.state = CLOSED
+            self._count("ollama.circuit_closed", backend)
+
+    def _failed(self, backend):
+        # called with the lock held
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.state == HALF_OPEN or (backend.state == CLOSED
+                                          and backend.consecutive_failures >= self.failure_threshold):
+            backend.state = OPEN
+            backend.opened_at = time.monotonic()
+            self._count("ollama.circuit_opened", backend)
+
+    @staticmethod
+    def _context_key(context):
+        return len(context), hash(tuple(context))
+
+    def _pinned_backend(self, context):
+        if not context:
+            return None
+        key = self._context_key(context)
+        with self._lock:
+            backend = self._pinned.get(key)
+            if backend is not None:
+                self._pinned.move_to_end(key)
+            return backend
+
+    def _pin(self, backend, response):
+        # remembers the backend that returned a context, so that the requests continuing it go there
+        context = response.get("context") if isinstance(response, dict) else None
+        if not context:
+            return
+        key = self._context_key(context)
+        with self._lock:
+            self._pinned[key] = backend
+            self._pinned.move_to_end(key)
+            if len(self._pinned) > _MAX_PINNED_CONTEXTS:
+                self._pinned.popitem(last=False)
+
+    def _choose(self, model, tried, pinned=None):
+        with self._lock:
+            now = time.monotonic()
+            candidates = []
+            for backend in self.backends:
+                if backend in tried or not backend.serves(model):
+                    continue
+                if backend.state == OPEN and now - backend.opened_at >= self.reset_timeout:
+                    backend.state = HALF_OPEN
+                    backend._trial = False
+                if backend.state == CLOSED or (backend.state == HALF_OPEN and not backend._trial):
+                    candidates.append(backend)
+            if not candidates:
+                raise NoBackendAvailable(f"No Ollama backend available for the model {model}.")
+            if pinned in candidates:
+                backend = pinned
+            else:
+                if pinned is not None and pinned not in tried:
+                    self._count("ollama.affinity_misses", pinned)
+                backend = min(candidates, key=lambda candidate: (candidate.outstanding, candidate.latency or 0.0))
+            backend.outstanding += 1
+            if backend.state == HALF_OPEN:
+                backend._trial = True
+            return backend
+
+    def _finish(self, backend, start, error=None):
+        failure = error is not None and is_backend_failure(error)
+        with self._lock:
+            backend.outstanding -= 1
+            backend.requests += 1
+            backend._trial = False
+            if failure:
+                self._failed(backend)
+            else:
+                self._succeeded(backend)
+                backend.completed += 1
+                backend.request_time += time.perf_counter() - start
+        return failure
+
+    def _retry(self, backend, tried):
+        # whether a request that failed on a backend goes to another one
+        tried.append(backend)
+        if len(tried) > self.retries:
+            return False
+        with self._lock:
+            backend.retried += 1
+        self._count("ollama.retries", backend)
+        return True
+
+    def _call(self, model, call, context=None):
+        tried = []
+        pinned = self._pinned_backend(context)
+        while True:
+            try:
+                backend = self._choose(model, tried, pinned)
+            except NoBackendAvailable:
+                if not tried:
+                    raise
+                raise error
+            start = time.perf_counter()
+            try:
+                result = call(backend.client)
+            except Exception as failed:
+                error = failed
+                if not self._finish(backend, start, error) or not self._retry(backend, tried):
+                    raise
+                continue
+            self._finish(backend, start)
+            self._pin(backend, result)
+            return result
+
+    def generate(self, prompt, context=None, system=None, format=None, **options):
+        """
+        Sends a prompt to the generate API of the backend that returned the context, if any, otherwise of the least
+        loaded backend, retrying on another one if it fails.
+
+        Args:
+            Same as OllamaClient.generate.
+
+        Returns:
+            dict: The Ollama response.
+
+        Raises:
+            NoBackendAvailable: If no backend serving the model has its circuit closed.
+        """
+        return self._call(self.model, lambda client: client.generate(prompt, context, system, format, **options),
+                          context)
+
+    def stream(self, prompt, context=None, system=None, format=None, **options):
+        """
+        Streams a completion from the backend that returned the context, if any, otherwise from the least loaded
+        backend. A backend failing before the first chunk is replaced by another one; after it, the error is raised
+        to the caller.
+
+        Args:
+            Same as OllamaClient.stream.
+
+        Yields:
+            dict: The Ollama chunks.
+
+        Raises:
+            NoBackendAvailable: If no backend serving the model has its circuit closed.
+        """
+        tried = []
+        pinned = self._pinned_backend(context)
+        while True:
+            try:
+                backend = self._choose(self.model, tried, pinned)
+            except NoBackendAvailable:
+                if not tried:
+                    raise
+                raise error
+            start = time.perf_counter()
+            chunks = backend.client.stream(prompt, context, system, format, **options)
+            try:
+                first = next(chunks)
+            except StopIteration:
+                self._finish(backend, start)
+                return
+            except Exception as failed:
+                error = failed
+                if not self._finish(backend, start, error) or not self._retry(backend, tried):
+                    raise
+                continue
+            break
+        try:
+            chunk = first
+            yield chunk
+            for chunk in chunks:
+                yield chunk
+        except Exception as failed:
+            self._finish(backend, start, failed)
+            raise
+        except BaseException:
+            # the consumer stopped early: not the backend's fault
+            chunks.close()
+            self._finish(backend, start)
+            raise
+        self._finish(backend, start)
+        # the last chunk carries the context of the completion
+        self._pin(backend, chunk)
+
+    def embed(self, text, model=None):
+        """
+        Returns the embedding of a text, from a backend serving the embedding model.
+
+        Args:
+            Same as OllamaClient.embed.
+
+        Returns:
+            list: The embedding.
+
+        Raises:
+            NoBackendAvailable: If no backend serving the model has its circuit closed.
+        """
+        return self._call(model or self.model, lambda client: client.embed(text, model))
+
+    def tags(self):
+        """
+        Lists the models served by the backends whose circuit is not open, as last probed or configured.
+
+        Returns:
+            list: The model names, without the ":latest" tag.
+        """
+        with self._lock:
+            return sorted({model for backend in self.backends if backend.state != OPEN
+                           for model in backend.models or ()})
+
+    def probe(self):
+        """
+        Probes every backend once with /api/tags: measures its latency, learns its models when they are not
+        configured, counts a failure against its circuit, or lets an open circuit try its trial request.
+        """
+        for backend in self.backends:
+            start = time.perf_counter()
+            try:
+                models = backend.client.tags()
+            except Exception as error:
+                if is_backend_failure(error):
+                    with self._lock:
+                        self._failed(backend)
+                continue
+            latency = time.perf_counter() - start
+            with self._lock:
+                backend.latency = latency if backend.latency is None else (
+                    _LATENCY_SMOOTHING * latency + (1 - _LATENCY_SMOOTHING) * backend.latency)
+                if not backend.configured:
+                    backend.models = set(map(model_name, models))
+                if backend.state == OPEN:
+                    backend.state = HALF_OPEN
+                    backend._trial = False
+
+    def _probe_loop(self):
+        while not self._stopped.is_set():
+            self.probe()
+            self._stopped.wait(self.probe_interval)
+
+    def stats(self):
+        """
+        Returns the state and counters of every backend.
+
+        Returns:
+            list: Backend.stats() of every backend, in configuration order.
+        """
+        with self._lock:
+            return [backend.stats() for backend in self.backends]
+
+    def close(self):
+        """
+        Stops probing and closes every backend client and the worker threads.
+        """
+        self._stopped.set()
+        self._executor.shutdown(wait=False)
+        for backend in self.backends:
+            backend.client.close()
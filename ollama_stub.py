@@ -0,0 +1,262 @@
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_RESPONSE = (
+    "The best design option is the first one, because it raises the quality attributes with the highest "
+    "stakeholder priorities without letting any score become negative."
+)
+
+
+class StubOllamaServer:
+    """
+    Local fake of the Ollama HTTP API, to measure and test the assistant without a model or a network.
+
+    It answers /api/generate (streamed or not) with a canned completion, one word per token, after a configurable
+    time to first token and per-token delay, and fills in the same counters as Ollama (prompt_eval_count,
+    eval_count, durations in nanoseconds). A share of the requests can be made to fail.
+
+    Prefill is modelled as a delay per prompt word. As with Ollama, the tokens of a "context" sent back with a
+    request are already evaluated: only the new prompt counts in prompt_eval_count and prompt_eval_duration, and
+    the "num_predict" option limits the completion. A request with a "format" is answered with a JSON suggestion
+    naming the first option allowed by the schema. /api/embeddings answers with a bag-of-words vector of the prompt,
+    so that texts sharing words are similar.
+
+    Attributes:
+        host (str): Address the server listens on.
+        port (int): Port the server listens on. 0 picks a free port when the server starts.
+        first_token_delay (float): Seconds before the first token is sent.
+        token_delay (float): Seconds between two tokens.
+        prompt_token_delay (float): Seconds of prefill per prompt word not already in the request context.
+        error_rate (float): Probability that a request is answered with a 500 error.
+        response (str): The completion returned for every prompt, or the rationale of structured answers.
+        models (list): The model names listed by /api/tags. Requests for any model are answered.
+        requests (int): Number of generate requests received.
+        url (str): Base URL of the running server, to be used as Configuration.uri_ollama.
+
+    Methods:
+        start(): Starts serving on a background thread.
+        stop(): Stops the server.
+        generate(handler, request): Answers a generate request.
+        embedding(text): Returns the embedding of a text.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, first_token_delay=0.05, token_delay=0.005, error_rate=0.0,
+                 response=DEFAULT_RESPONSE, seed=None, prompt_token_delay=0.0, models=("llama2:latest",)):
+        """
+        Initializes the server. It does not listen until start is called.
+
+        Args:
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 for a free port.
+            first_token_delay (float): Seconds before the first token is sent.
+            token_delay (float): Seconds between two tokens.
+            error_rate (float): Probability that a request is answered with a 500 error.
+            response (str): The completion returned for every prompt.
+            seed (int, optional): Seed of the error injection.
+            prompt_token_delay (float): Seconds of prefill per prompt word not already in the request context.
+            models (iterable): The model names listed by /api/tags.
+        """
+        self.host = host
+        self.port = port
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.prompt_token_delay = prompt_token_delay
+        self.error_rate = error_rate
+        self.response = response
+        self.models = list(models)
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """
+        Starts serving on a background thread.
+
+        Returns:
+            StubOllamaServer: The server itself.
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server and waits for its thread to finish.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _fail(self):
+        with self._lock:
+            self.requests += 1
+            return self._random.random() < self.error_rate
+
+    def _completion(self, request):
+        schema = request.get("format")
+        if not schema:
+            return self.response
+        # a structured request is answered with the first allowed option and the canned completion as rationale
+        allowed = schema.get("properties", {}).get("option", {}).get("enum") if isinstance(schema, dict) else None
+        return json.dumps({"option": allowed[0] if allowed else "", "rationale": self.response})
+
+    def _tokens(self, request):
+        words = self._completion(request).split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, body):
+                data = (json.dumps(body) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": name} for name in stub.models]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/api/embeddings":
+                    self._send_json(200, {"embedding": stub.embedding(request.get("prompt", ""))})
+                    return
+                if self.path != "/api/generate":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                if stub._fail():
+                    self._send_json(500, {"error": "injected failure"})
+                    return
+                try:
+                    stub.generate(self, request)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client gave up on the request, e.g. after its deadline
+                    self.close_connection = True
+
+        return Handler
+
+    def embedding(self, text, dimensions=64):
+        """
+        Returns the embedding of a text: the counts of its words, hashed into a fixed number of dimensions.
+
+        Args:
+            text (str): The text.
+            dimensions (int): Length of the embedding.
+
+        Returns:
+            list: The embedding.
+        """
+        vector = [0.0] * dimensions
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode("utf-8")) % dimensions] += 1.0
+        return vector
+
+    def generate(self, handler, request):
+        """
+        Answers a generate request on the given handler. Subclasses can override it to change the completion.
+
+        Args:
+            handler (BaseHTTPRequestHandler): The handler of the request.
+            request (dict): The decoded request body.
+        """
+        start = time.perf_counter_ns()
+        prompt = ((request.get("system") or "") + " " + request.get("prompt", "")).split()
+        context = request.get("context") or []
+        tokens = self._tokens(request)
+        num_predict = (request.get("options") or {}).get("num_predict")
+        if num_predict is not None and num_predict >= 0:
+            tokens = tokens[:num_predict]
+        final = {
+            "model": request.get("model"),
+            "done": True,
+            "prompt_eval_count": len(prompt),
+            "eval_count": len(tokens),
+            "context": context + list(range(len(context), len(context) + len(prompt) + len(tokens))),
+        }
+
+        time.sleep(self.first_token_delay + self.prompt_token_delay * len(prompt))
+        prompt_done = time.perf_counter_ns()
+        final["prompt_eval_duration"] = prompt_done - start
+
+        if not request.get("stream", True):
+            time.sleep(self.token_delay * max(0, len(tokens) - 1))
+            final["eval_duration"] = time.perf_counter_ns() - prompt_done
+            final["total_duration"] = time.perf_counter_ns() - start
+            handler._send_json(200, dict(final, response="".join(tokens)))
+            return
+
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_delay)
+            handler._send_chunk({"model": request.get("model"), "response": token, "done": False})
+        final["eval_duration"] = time.perf_counter_ns() - prompt_done
+        final["total_duration"] = time.perf_counter_ns() - start
+        handler._send_chunk(dict(final, response=""))
+        handler.wfile.write(b"0\r\n\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server for tests and benchmarks.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-delay", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--prompt-token-delay", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--models", nargs="+", default=["llama2:latest"], help="model names listed by /api/tags")
+    args = parser.parse_args()
+
+    server = StubOllamaServer(port=args.port, first_token_delay=args.first_token_delay,
+                              token_delay=args.token_delay, error_rate=args.error_rate,
+                              prompt_token_delay=args.prompt_token_delay, models=args.models).start()
+    print(f"Stub Ollama listening on {server.url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
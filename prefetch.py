@@ -0,0 +1,116 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import PREFETCH, scheduling
+
+
+class SuggestionPrefetcher:
+    """
+    Requests a suggestion in the background for a speculated game state, so that it is ready when the turn starts.
+
+    The requests are sent with the PREFETCH scheduling priority, so they wait behind the turns in play, and are
+    dropped if they are still waiting for a slot after timeout seconds. Only one speculation is kept at a time. When
+    the turn starts, take is called with the actual inputs: if they match the speculated ones the prefetched
+    suggestion is returned, otherwise the speculation is cancelled and discarded. A discarded request that is
+    already running cannot be stopped: it completes on its worker while the next speculation takes another one.
+
+    Attributes:
+        fetch (callable): Function computing the suggestion, called with the request inputs as keyword arguments.
+        timeout (float, optional): Seconds a speculative request may wait for a scheduler slot.
+        hits (int): Number of turns answered by a prefetched suggestion.
+        misses (int): Number of turns whose state did not match the speculation.
+        last_wait (float): Seconds the last take waited for a prefetch still running, 0.0 when it was ready or did
+            not match.
+
+    Methods:
+        prefetch(**inputs): Starts computing the suggestion for the given inputs in the background.
+        take(timeout=None, **inputs): Returns the prefetched suggestion if it was computed for the given inputs,
+            otherwise None.
+        discard(): Cancels the pending speculation, if any.
+        close(): Discards the pending speculation and stops the background worker.
+    """
+
+    def __init__(self, fetch, max_workers=2, timeout=None):
+        """
+        Initializes the prefetcher.
+
+        Args:
+            fetch (callable): Function computing the suggestion, called with the request inputs as keyword arguments.
+            max_workers (int): Number of background threads used for speculative requests, so that a discarded
+                request still running does not hold up the next speculation.
+            timeout (float, optional): Seconds a speculative request may wait for a scheduler slot. None waits as
+                long as needed.
+        """
+        self.fetch = fetch
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.last_wait = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._pending_inputs = None
+        self._pending = None
+
+    def prefetch(self, **inputs):
+        """
+        Starts computing the suggestion for the given inputs, replacing any previous speculation.
+
+        Args:
+            **inputs: The request inputs of the speculated state.
+        """
+        self.discard()
+        self._pending_inputs = inputs
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self._pending = self._executor.submit(self._fetch, inputs, deadline)
+
+    def _fetch(self, inputs, deadline):
+        with scheduling(priority=PREFETCH, deadline=deadline):
+            return self.fetch(**inputs)
+
+    def take(self, timeout=None, **inputs):
+        """
+        Returns the prefetched suggestion when it was computed for the given inputs, waiting for it if needed.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait for a prefetch still running.
+            **inputs: The request inputs of the actual state.
+
+        Returns:
+            str or None: The prefetched suggestion, or None if the speculation did not match, its request failed or
+                it did not complete in time.
+        """
+        self.last_wait = 0.0
+        if self._pending is None or self._pending_inputs != inputs:
+            self.discard()
+            self.misses += 1
+            return None
+
+        future = self._pending
+        self._pending = None
+        self._pending_inputs = None
+        start = time.monotonic()
+        try:
+            suggestion = future.result(timeout)
+        except Exception:
+            self.misses += 1
+            return None
+        finally:
+            self.last_wait = time.monotonic() - start
+        self.hits += 1
+        return suggestion
+
+    def discard(self):
+        """
+        Cancels the pending speculation. A request that is already running completes in the background and its
+        result is dropped.
+        """
+        if self._pending is not None:
+            self._pending.cancel()
+        self._pending = None
+        self._pending_inputs = None
+
+    def close(self):
+        """
+        Discards the pending speculation and stops the background worker.
+        """
+        self.discard()
+        self._executor.shutdown(wait=False, cancel_futures=True)
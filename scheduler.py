@@ -0,0 +1,315 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+
+
+# priority levels, served strictly in this order
+INTERACTIVE = 0
+PREFETCH = 1
+BATCH = 2
+
+PRIORITIES = {"interactive": INTERACTIVE, "prefetch": PREFETCH, "batch": BATCH}
+
+_request_context = contextvars.ContextVar("llm_request_context", default={})
+
+
+@contextmanager
+def scheduling(**context):
+    """
+    Sets how the LLM requests made in the enclosed block (in the same thread or asyncio task) are scheduled.
+
+    Args:
+        **context: Any of session (hashable key of the requester), priority (INTERACTIVE, PREFETCH or BATCH) and
+            deadline (time.monotonic() after which the request is useless).
+    """
+    token = _request_context.set(dict(_request_context.get(), **context))
+    try:
+        yield
+    finally:
+        _request_context.reset(token)
+
+
+def current_scheduling():
+    """
+    Returns the scheduling context set by the enclosing scheduling blocks.
+
+    Returns:
+        dict: The session, priority and deadline that were set, if any.
+    """
+    return _request_context.get()
+
+
+class SchedulerError(Exception):
+    """
+    Raised when the scheduler does not let a request through.
+    """
+
+
+class SchedulerOverloaded(SchedulerError):
+    """
+    Raised when a request is refused because the queue, or the queue of its session, is full.
+    """
+
+
+class DeadlineExceeded(SchedulerError):
+    """
+    Raised when a request reaches its deadline before it could be sent.
+    """
+
+
+class _Waiter:
+    __slots__ = ("future", "session", "priority", "deadline", "enqueued")
+
+    def __init__(self, future, session, priority, deadline):
+        self.future = future
+        self.session = session
+        self.priority = priority
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+
+
+class LLMScheduler:
+    """
+    Admission control and queue discipline in front of the LLM, for the requests of many sessions.
+
+    At most max_concurrent requests run at once. Waiting requests are served by strict priority (interactive turn
+    suggestions, then prefetches, then batch reviews) and, within a priority, round-robin across sessions, so a
+    chatty table gets one slot in turn with every other waiting table instead of all the slots in arrival order.
+    Requests whose deadline passes while they wait are dropped instead of being sent late, and new requests are
+    refused when the queue or their session's share of it is full, so that callers can back off.
+
+    Blocking callers on threads and async callers on event loops share the same slots and queues: every waiter
+    holds a concurrent.futures.Future, which async callers await through asyncio.wrap_future.
+
+    Attributes:
+        max_concurrent (int): Maximum number of requests running at once.
+        max_queued (int): Maximum number of waiting requests.
+        max_queued_per_session (int): Maximum number of waiting requests of one session.
+        running (int): Number of requests holding a slot.
+        instrumentation (Instrumentation, optional): Where the wait times, drops and refusals are recorded.
+
+    Methods:
+        acquire(session=None, priority=INTERACTIVE, deadline=None): Blocks until a slot is free.
+        aacquire(session=None, priority=INTERACTIVE, deadline=None): Async variant of acquire.
+        release(): Gives a slot back.
+        slot(session=None, priority=INTERACTIVE, deadline=None): Context manager holding a slot.
+        aslot(session=None, priority=INTERACTIVE, deadline=None): Async variant of slot.
+        queued(priority=None): Returns the number of waiting requests.
+    """
+
+    def __init__(self, max_concurrent=8, max_queued=64, max_queued_per_session=4, instrumentation=None):
+        """
+        Initializes the scheduler.
+
+        Args:
+            max_concurrent (int): Maximum number of requests running at once.
+            max_queued (int): Maximum number of waiting requests.
+            max_queued_per_session (int): Maximum number of waiting requests of one session.
+            instrumentation (Instrumentation, optional): Where the wait times, drops and refusals are recorded.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        self.running = 0
+        self.instrumentation = instrumentation
+        # per priority, the waiting requests of each session; the order of the sessions is the round-robin order
+        self._queues = {priority: OrderedDict() for priority in sorted(PRIORITIES.values())}
+        self._queued = 0
+        self._queued_per_session = {}
+        self._lock = threading.Lock()
+
+    def queued(self, priority=None):
+        """
+        Returns the number of waiting requests.
+
+        Args:
+            priority (int, optional): Only count the requests of this priority.
+
+        Returns:
+            int: The number of waiting requests.
+        """
+        if priority is None:
+            return self._queued
+        with self._lock:
+            return sum(len(waiters) for waiters in self._queues[priority].values())
+
+    def _count(self, name, **attributes):
+        if self.instrumentation is not None:
+            self.instrumentation.count(name, **attributes)
+
+    def _enqueue(self, session, priority, deadline):
+        # returns None when a slot was taken at once, otherwise the queued waiter
+        if deadline is not None and time.monotonic() >= deadline:
+            self._count("scheduler.dropped", priority=priority)
+            raise DeadlineExceeded("The request deadline has passed.")
+        with self._lock:
+            if self.running < self.max_concurrent and not self._queued:
+                self.running += 1
+                return None
+
+            if self._queued >= self.max_queued:
+                refused = "Too many queued LLM requests."
+            elif session is not None and self._queued_per_session.get(session, 0) >= self.max_queued_per_session:
+                refused = "Too many queued LLM requests for this session."
+            else:
+                refused = None
+                waiter = _Waiter(Future(), session, priority, deadline)
+                self._queues[priority].setdefault(session, deque()).append(waiter)
+                self._queued += 1
+                self._queued_per_session[session] = self._queued_per_session.get(session, 0) + 1
+        if refused is not None:
+            self._count("scheduler.rejected", priority=priority)
+            raise SchedulerOverloaded(refused)
+        return waiter
+
+    def _abandon(self, waiter):
+        # the caller stopped waiting: withdraw the request, or pass on a slot granted at the same time
+        with self._lock:
+            granted = waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None
+            if not granted:
+                waiter.future.cancel()
+                self._remove(waiter)
+        if granted:
+            self.release()
+
+    def _expired(self, waiter):
+        self._abandon(waiter)
+        self._count("scheduler.dropped", priority=waiter.priority)
+        return DeadlineExceeded("The request deadline passed while it was queued.")
+
+    def _granted(self, waiter):
+        if self.instrumentation is not None:
+            self.instrumentation.record("scheduler.wait", time.monotonic() - waiter.enqueued, priority=waiter.priority)
+
+    def acquire(self, session=None, priority=INTERACTIVE, deadline=None):
+        """
+        Blocks until a slot is free to send a request.
+
+        Args:
+            session (hashable, optional): Key of the requesting session, e.g. its table. Requests without one share
+                a single round-robin turn and are only bounded by max_queued.
+            priority (int): INTERACTIVE, PREFETCH or BATCH.
+            deadline (float, optional): time.monotonic() after which the request is useless.
+
+        Raises:
+            SchedulerOverloaded: If the queue, or the queue of the session, is full.
+            DeadlineExceeded: If the deadline passes before a slot is free.
+        """
+        waiter = self._enqueue(session, priority, deadline)
+        if waiter is None:
+            return
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            waiter.future.result(timeout)
+        except FutureTimeoutError:
+            raise self._expired(waiter) from None
+        except DeadlineExceeded:
+            raise
+        except BaseException:
+            # e.g. KeyboardInterrupt while waiting
+            self._abandon(waiter)
+            raise
+        self._granted(waiter)
+
+    async def aacquire(self, session=None, priority=INTERACTIVE, deadline=None):
+        """
+        Async variant of acquire.
+
+        Args:
+            Same as acquire.
+
+        Raises:
+            Same as acquire.
+        """
+        waiter = self._enqueue(session, priority, deadline)
+        if waiter is None:
+            return
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(waiter.future)), timeout)
+        except asyncio.TimeoutError:
+            raise self._expired(waiter) from None
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self._granted(waiter)
+
+    def _remove(self, waiter):
+        waiters = self._queues[waiter.priority].get(waiter.session)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        if not waiters:
+            del self._queues[waiter.priority][waiter.session]
+        self._dequeued(waiter)
+
+    def _dequeued(self, waiter):
+        self._queued -= 1
+        self._queued_per_session[waiter.session] -= 1
+        if not self._queued_per_session[waiter.session]:
+            del self._queued_per_session[waiter.session]
+
+    def _next(self):
+        now = time.monotonic()
+        for sessions in self._queues.values():
+            while sessions:
+                session, waiters = next(iter(sessions.items()))
+                waiter = waiters.popleft()
+                # the session goes to the back of the round, or leaves it when it has nothing left to send
+                del sessions[session]
+                if waiters:
+                    sessions[session] = waiters
+                self._dequeued(waiter)
+                if waiter.future.done():
+                    continue
+                if waiter.deadline is not None and now >= waiter.deadline:
+                    waiter.future.set_exception(DeadlineExceeded("The request deadline passed while it was queued."))
+                    self._count("scheduler.dropped", priority=waiter.priority)
+                    continue
+                return waiter
+        return None
+
+    def release(self):
+        """
+        Gives a slot back and hands it to the next waiting request, if any.
+        """
+        with self._lock:
+            self.running -= 1
+            while self.running < self.max_concurrent:
+                waiter = self._next()
+                if waiter is None:
+                    break
+                self.running += 1
+                waiter.future.set_result(None)
+
+    @contextmanager
+    def slot(self, session=None, priority=INTERACTIVE, deadline=None):
+        """
+        Holds a slot for the enclosed block.
+
+        Args:
+            Same as acquire.
+        """
+        self.acquire(session, priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, session=None, priority=INTERACTIVE, deadline=None):
+        """
+        Async variant of slot.
+
+        Args:
+            Same as acquire.
+        """
+        await self.aacquire(session, priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,199 @@
+class ScoreState:
+    """
+    Running quality attribute (QA) scores of a game, updated incrementally as design decisions are taken.
+
+    Appending, revising or undoing a decision only touches the attributes that decision affects, instead of
+    re-adding the whole decision history. The final score and the prompt fragments describing the decisions and
+    the QA scores are kept up to date along the way.
+
+    Attributes:
+        stakeholder_cards (list): The stakeholders whose priorities define the satisfaction.
+        decisions (list): The design decisions taken so far, each a dict of {quality attribute: impact}.
+        qa_scores (dict): The current score of each quality attribute.
+        decisions_by_attribute (dict): The positions in decisions of the decisions with a non-zero impact on each
+            quality attribute.
+
+    Methods:
+        stakeholder_priorities(stakeholder_cards): Returns the priorities of the stakeholders by quality attribute.
+        append(decision): Takes a new design decision.
+        revise(index, decision): Replaces a past design decision, e.g. after an event.
+        undo(): Reverts the last append or revise.
+        decisions_affecting(attributes): Returns the positions of the decisions affecting some quality attributes.
+        score(): Returns the current game score, or -1 if any QA score is negative.
+        decisions_text(): Returns the decisions rendered as in the suggestion prompt.
+        qa_scores_text(): Returns the QA scores rendered as in the suggestion prompt.
+    """
+
+    __slots__ = ("stakeholder_cards", "decisions", "qa_scores", "decisions_by_attribute", "_priorities", "_satisfaction", "_negative",
+                 "_history", "_decisions_text", "_qa_scores_text")
+
+    def __init__(self, stakeholder_cards, priorities=None):
+        """
+        Initializes the state of a game with no decisions.
+
+        Args:
+            stakeholder_cards (list): The stakeholders whose priorities define the satisfaction.
+            priorities (dict, optional): Their priorities as returned by stakeholder_priorities, to share them
+                between the games of the same stakeholders. Computed when not given.
+        """
+        self.stakeholder_cards = stakeholder_cards
+        self.decisions = []
+        self.qa_scores = {attr: 0 for stakeholder in stakeholder_cards for attr in
+                          stakeholder.quality_attributes.keys()}
+        self.decisions_by_attribute = {}
+
+        # priorities of every stakeholder by attribute, to update the satisfaction of one attribute at a time
+        self._priorities = priorities if priorities is not None else self.stakeholder_priorities(stakeholder_cards)
+
+        self._satisfaction = 0
+        self._negative = 0
+        self._history = []
+        # rendered on first use, then kept up to date by append
+        self._decisions_text = None
+        self._qa_scores_text = None
+
+    @staticmethod
+    def stakeholder_priorities(stakeholder_cards):
+        """
+        Returns the priorities of the stakeholders by quality attribute. The result is never modified by a
+        ScoreState, so it can be shared.
+
+        Args:
+            stakeholder_cards (list): The stakeholders.
+
+        Returns:
+            dict: The tuple of priorities of every stakeholder, by quality attribute.
+        """
+        priorities = {}
+        for stakeholder in stakeholder_cards:
+            for attr, priority in stakeholder.quality_attributes.items():
+                priorities[attr] = priorities.get(attr, ()) + (priority,)
+        return priorities
+
+    def _apply(self, decision, sign):
+        for attr, impact in decision.items():
+            old = self.qa_scores.get(attr, 0)
+            new = old + sign * impact
+            self.qa_scores[attr] = new
+            self._negative += (new < 0) - (old < 0)
+            for priority in self._priorities.get(attr, ()):
+                self._satisfaction += max(0, new - priority) - max(0, old - priority)
+        self._qa_scores_text = None
+
+    def _index(self, index, decision, add):
+        for attr, impact in decision.items():
+            if not impact:
+                continue
+            if add:
+                self.decisions_by_attribute.setdefault(attr, set()).add(index)
+            else:
+                indexes = self.decisions_by_attribute[attr]
+                indexes.discard(index)
+                if not indexes:
+                    del self.decisions_by_attribute[attr]
+
+    @staticmethod
+    def _render(decision):
+        return ", ".join([f"{k}: {v}" for k, v in decision.items()])
+
+    def append(self, decision):
+        """
+        Takes a new design decision.
+
+        Args:
+            decision (dict): The impact of the decision on each quality attribute.
+        """
+        self.decisions.append(decision)
+        # an append is recorded as the index alone (small ints are shared), a revise with the replaced decision
+        self._history.append(len(self.decisions) - 1)
+        self._apply(decision, 1)
+        self._index(len(self.decisions) - 1, decision, True)
+        if self._decisions_text is not None:
+            fragment = self._render(decision)
+            if fragment:
+                self._decisions_text = f"{self._decisions_text}, {fragment}" if self._decisions_text else fragment
+
+    def revise(self, index, decision):
+        """
+        Replaces a past design decision.
+
+        Args:
+            index (int): The position of the decision in decisions.
+            decision (dict): The impact of the revised decision on each quality attribute.
+        """
+        previous = self.decisions[index]
+        self._history.append((index, previous))
+        self._apply(previous, -1)
+        self._apply(decision, 1)
+        self._index(index, previous, False)
+        self._index(index, decision, True)
+        self.decisions[index] = decision
+        self._decisions_text = None
+
+    def undo(self):
+        """
+        Reverts the last append or revise.
+
+        Raises:
+            IndexError: If there is nothing to undo.
+        """
+        entry = self._history.pop()
+        index, previous = (entry, None) if isinstance(entry, int) else entry
+        self._apply(self.decisions[index], -1)
+        self._index(index, self.decisions[index], False)
+        if previous is None:
+            self.decisions.pop()
+        else:
+            self._apply(previous, 1)
+            self._index(index, previous, True)
+            self.decisions[index] = previous
+        self._decisions_text = None
+
+    def decisions_affecting(self, attributes):
+        """
+        Returns the decisions with a non-zero impact on any of some quality attributes.
+
+        Args:
+            attributes (iterable): The quality attributes.
+
+        Returns:
+            list: The positions of the decisions in decisions, in order.
+        """
+        indexes = set()
+        for attr in attributes:
+            indexes.update(self.decisions_by_attribute.get(attr, ()))
+        return sorted(indexes)
+
+    def score(self):
+        """
+        Returns the current score of the game.
+
+        Returns:
+            int: The sum of the stakeholders' satisfaction, or -1 if the score for any quality attribute is negative.
+        """
+        if self._negative:
+            return -1  # Immediate loss due to negative score
+        return self._satisfaction
+
+    def decisions_text(self):
+        """
+        Returns the decisions taken so far, rendered as in the suggestion prompt.
+
+        Returns:
+            str: The impacts of every decision, separated by commas.
+        """
+        if self._decisions_text is None:
+            self._decisions_text = ", ".join(
+                [fragment for fragment in map(self._render, self.decisions) if fragment])
+        return self._decisions_text
+
+    def qa_scores_text(self):
+        """
+        Returns the current QA scores, rendered as in the suggestion prompt.
+
+        Returns:
+            str: The score of every quality attribute, separated by commas.
+        """
+        if self._qa_scores_text is None:
+            self._qa_scores_text = ", ".join([f"{k}: {v}" for k, v in self.qa_scores.items()])
+        return self._qa_scores_text
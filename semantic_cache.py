@@ -0,0 +1,464 @@
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+_WORD_PATTERN = re.compile(r"[\w.+-]+")
+_SCORE_PATTERN = re.compile(r"([^:,;]+?)\s*:\s*(-?\d+)")
+
+
+def canonical_text(text):
+    """
+    Canonicalizes a free-text field: lower case, punctuation dropped, whitespace collapsed.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The canonical text.
+    """
+    return " ".join(_WORD_PATTERN.findall(str(text).lower()))
+
+
+def parse_scores(qa_scores):
+    """
+    Reads QA scores from the prompt inputs, given as a dict or rendered as "attribute: score, ...".
+
+    Args:
+        qa_scores (dict or str): The scores.
+
+    Returns:
+        dict: The score of each quality attribute, by lower-case name.
+    """
+    if isinstance(qa_scores, dict):
+        return {canonical_text(attr): int(score) for attr, score in qa_scores.items()}
+    return {canonical_text(attr): int(score) for attr, score in _SCORE_PATTERN.findall(str(qa_scores))}
+
+
+def mentioned_option(text, options):
+    """
+    Returns the design option a free-text suggestion names first.
+
+    Args:
+        text (str): The suggestion.
+        options (iterable): The names of the design options.
+
+    Returns:
+        str: The option named earliest in the text, or None if it names none.
+    """
+    text = canonical_text(text)
+    found = [(text.find(canonical_text(option)), option) for option in options]
+    found = [(position, option) for position, option in found if position >= 0]
+    return min(found, key=lambda item: item[0])[1] if found else None
+
+
+class HashingEmbedder:
+    """
+    CPU embedding of a text by feature hashing of its words and word pairs, with no model to download or serve.
+
+    Two texts sharing most of their words get a high cosine similarity: enough to recognize the same game state
+    phrased slightly differently, not to understand paraphrases. The hashes do not depend on the process, so the
+    vectors can be stored.
+
+    Attributes:
+        dimensions (int): Length of the vectors.
+    """
+    def __init__(self, dimensions=512):
+        """
+        Initializes the embedder.
+
+        Args:
+            dimensions (int): Length of the vectors.
+        """
+        self.dimensions = dimensions
+
+    def __call__(self, text):
+        words = text.split()
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class OllamaEmbedder:
+    """
+    Embedding of a text by an embedding model served by Ollama, e.g. "nomic-embed-text".
+
+    Attributes:
+        client (OllamaClient): The client of the Ollama server.
+        model (str): The embedding model.
+    """
+    def __init__(self, client, model):
+        """
+        Initializes the embedder.
+
+        Args:
+            client (OllamaClient): The client of the Ollama server.
+            model (str): The embedding model.
+        """
+        self.client = client
+        self.model = model
+
+    def __call__(self, text):
+        vector = np.asarray(self.client.embed(text, model=self.model), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticState:
+    """
+    Canonical form of a suggestion request, as compared by the SemanticSuggestionCache.
+
+    Attributes:
+        signature (str): Digest of what must be identical for a cached suggestion to apply: the namespace (model and
+            templates), the design options with their impacts and the stakeholders' priorities.
+        text (str): The canonical project, concern, events and decisions, which are compared by similarity.
+        scores (dict): The QA scores, which may differ by the cache's score tolerance.
+        options (list): The names of the design options.
+        vector (numpy.ndarray): The embedding of text, set by the cache.
+    """
+    __slots__ = ("signature", "text", "scores", "options", "vector")
+
+    def __init__(self, signature, text, scores, options):
+        self.signature = signature
+        self.text = text
+        self.scores = scores
+        self.options = options
+        self.vector = None
+
+
+class SemanticMatch:
+    """
+    Cached suggestion found for a similar request.
+
+    Attributes:
+        entry_id (int): Identifier of the cache entry.
+        suggestion (str): The cached suggestion.
+        similarity (float): Cosine similarity between the two requests.
+    """
+    __slots__ = ("entry_id", "suggestion", "similarity")
+
+    def __init__(self, entry_id, suggestion, similarity):
+        self.entry_id = entry_id
+        self.suggestion = suggestion
+        self.similarity = similarity
+
+
+class SemanticSuggestionCache:
+    """
+    Cache answering suggestion requests that are near-duplicates of earlier ones: the same concern card, options
+    and stakeholders, phrased slightly differently or with QA scores a point apart.
+
+    A cached suggestion is returned only if the structural checks pass (identical design options and stakeholder
+    priorities, the same QA attributes, each score within score_tolerance and of the same sign) and the canonical
+    texts are at least threshold similar. The embeddings are stored in SQLite with a locality-sensitive hashing
+    index (random hyperplanes, bands of bits), so a lookup compares the request to the few entries sharing a bucket
+    instead of to every entry. A share of the hits can be audited against a fresh answer to measure false hits.
+
+    Attributes:
+        path (str): Path of the SQLite database file, ":memory:" for an in-process cache.
+        embed (callable): Returns the unit embedding of a canonical text.
+        threshold (float): Minimum cosine similarity of a hit.
+        score_tolerance (int): Maximum difference between two QA scores of a hit.
+        max_size (int): Maximum number of entries kept in the cache.
+        ttl (float, optional): Time to live of an entry in seconds.
+        audit_rate (float): Share of the hits to audit.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups that found no similar entry.
+        audits (int): Number of hits audited.
+        false_hits (int): Number of audited hits whose fresh answer chose another design option.
+
+    Methods:
+        state(namespace, **inputs): Returns the canonical form of a request.
+        lookup(state): Returns the best similar cached suggestion, or None.
+        store(state, suggestion): Caches the suggestion of a request.
+        should_audit(): Returns whether to audit a hit.
+        audit(state, match, suggestion): Records whether a hit chose the same option as a fresh answer.
+        discard(entry_id): Removes an entry.
+        clear(): Removes every entry and resets the counters.
+        stats(): Returns the hit rate, the false hit rate and the lookup latency.
+    """
+
+    def __init__(self, path=":memory:", embed=None, threshold=0.9, score_tolerance=1, max_size=10000, ttl=None,
+                 audit_rate=0.0, bands=8, bits=12, seed=0):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Path of the SQLite database file, ":memory:" for an in-process cache.
+            embed (callable, optional): Returns the unit embedding of a canonical text. Defaults to a HashingEmbedder.
+            threshold (float): Minimum cosine similarity of a hit.
+            score_tolerance (int): Maximum difference between two QA scores of a hit.
+            max_size (int): Maximum number of entries kept in the cache.
+            ttl (float, optional): Time to live of an entry in seconds.
+            audit_rate (float): Share of the hits to audit.
+            bands (int): Number of hash tables of the index. More bands find more near-duplicates.
+            bits (int): Number of hyperplanes of each band. More bits make the buckets smaller.
+            seed (int): Seed of the hyperplanes and of the audit sampling.
+        """
+        self.path = path
+        self.embed = embed or HashingEmbedder()
+        self.threshold = threshold
+        self.score_tolerance = score_tolerance
+        self.max_size = max_size
+        self.ttl = ttl
+        self.audit_rate = audit_rate
+        self.bands = bands
+        self.bits = bits
+        self.seed = seed
+        self.hits = 0
+        self.misses = 0
+        self.audits = 0
+        self.false_hits = 0
+        self._latencies = deque(maxlen=1024)
+        self._random = random.Random(seed)
+        self._hyperplanes = None
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # a lookup writes the entry's use time: without syncing every commit, it stays well below a millisecond
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY AUTOINCREMENT, signature TEXT NOT NULL, "
+            "vector BLOB NOT NULL, scores TEXT NOT NULL, suggestion TEXT NOT NULL, stored_at REAL NOT NULL, "
+            "used_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS buckets (signature TEXT NOT NULL, band INTEGER NOT NULL, "
+            "bucket INTEGER NOT NULL, entry INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS buckets_key ON buckets (signature, band, bucket);"
+            "CREATE INDEX IF NOT EXISTS buckets_entry ON buckets (entry);"
+            "CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at);"
+        )
+        self._connection.commit()
+
+    def state(self, namespace, project_description, stakeholders, current_design_decisions, current_qa_scores,
+              ongoing_events, concern_card_description, design_options):
+        """
+        Returns the canonical form of a suggestion request.
+
+        Args:
+            namespace (str): What else the suggestion depends on, e.g. the model and the prompt templates.
+            Others: The inputs of DecidArchAssistant.extract_suggestion_chain.
+
+        Returns:
+            SemanticState: The canonical request.
+        """
+        if isinstance(design_options, dict):
+            options = list(design_options) if all(isinstance(v, dict) for v in design_options.values()) else [
+                concern_card_description]
+            canonical_options = json.dumps(design_options, sort_keys=True, default=str)
+        else:
+            options = [str(design_options)]
+            canonical_options = canonical_text(design_options)
+        canonical_stakeholders = sorted(
+            (canonical_text(stakeholder.role), sorted(stakeholder.quality_attributes.items()))
+            for stakeholder in stakeholders)
+        signature = hashlib.sha256(json.dumps(
+            [namespace, canonical_options, canonical_stakeholders], separators=(",", ":")).encode("utf-8")).hexdigest()
+        text = " | ".join(canonical_text(field) for field in (
+            project_description, concern_card_description, ongoing_events, current_design_decisions))
+        return SemanticState(signature, text, parse_scores(current_qa_scores), options)
+
+    def _vector(self, state):
+        if state.vector is None:
+            state.vector = np.asarray(self.embed(state.text), dtype=np.float32)
+        return state.vector
+
+    def _buckets(self, vector):
+        if self._hyperplanes is None or self._hyperplanes.shape[1] != len(vector):
+            self._load_hyperplanes(len(vector))
+        signs = (self._hyperplanes @ vector) > 0
+        weights = 1 << np.arange(self.bits)
+        return [int(band @ weights) for band in signs.reshape(self.bands, self.bits)]
+
+    def _load_hyperplanes(self, dimensions):
+        row = self._connection.execute("SELECT value FROM meta WHERE key = 'index'").fetchone()
+        layout = [dimensions, self.bands, self.bits, self.seed]
+        if row is None or json.loads(row[0]) != layout:
+            # another embedder or index layout: the stored vectors and buckets are not comparable anymore
+            self._clear()
+            self._connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('index', ?)",
+                                     (json.dumps(layout),))
+            self._connection.commit()
+        rng = np.random.default_rng(self.seed)
+        self._hyperplanes = rng.standard_normal((self.bands * self.bits, dimensions)).astype(np.float32)
+
+    def _compatible(self, scores, cached):
+        if scores.keys() != cached.keys():
+            return False
+        return all(abs(score - cached[attr]) <= self.score_tolerance and (score < 0) == (cached[attr] < 0)
+                   for attr, score in scores.items())
+
+    def lookup(self, state):
+        """
+        Returns the most similar cached suggestion passing the structural checks, and updates the counters.
+
+        Args:
+            state (SemanticState): The canonical request, as returned by state.
+
+        Returns:
+            SemanticMatch: The match, or None.
+        """
+        start = time.perf_counter()
+        vector = self._vector(state)
+        with self._lock:
+            buckets = self._buckets(vector)
+            # one index probe per band: the candidates share the signature and at least one bucket
+            probes = " UNION ".join(["SELECT entry FROM buckets WHERE signature = ? AND band = ? AND bucket = ?"]
+                                    * self.bands)
+            parameters = [value for band, bucket in enumerate(buckets) for value in (state.signature, band, bucket)]
+            rows = self._connection.execute(
+                f"SELECT id, vector, scores, suggestion, stored_at FROM entries WHERE id IN ({probes})",
+                parameters).fetchall()
+            best = None
+            expired = []
+            if rows:
+                vectors = np.frombuffer(b"".join([row[1] for row in rows]), dtype=np.float32)
+                similarities = vectors.reshape(len(rows), -1) @ vector
+                # the structural checks are made on the similar candidates only, from the most similar down
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.threshold:
+                        break
+                    entry_id, _, scores, suggestion, stored_at = rows[i]
+                    if self.ttl is not None and time.time() - stored_at > self.ttl:
+                        expired.append(entry_id)
+                    elif self._compatible(state.scores, json.loads(scores)):
+                        best = SemanticMatch(entry_id, suggestion, float(similarities[i]))
+                        break
+            for entry_id in expired:
+                self._discard(entry_id)
+            if best is not None:
+                self._connection.execute("UPDATE entries SET used_at = ? WHERE id = ?", (time.time(), best.entry_id))
+            self._connection.commit()
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._latencies.append(time.perf_counter() - start)
+            return best
+
+    def store(self, state, suggestion):
+        """
+        Caches the suggestion of a request, evicting the least recently used entries if the cache is full.
+
+        Args:
+            state (SemanticState): The canonical request, as returned by state.
+            suggestion (str): Its suggestion.
+        """
+        vector = self._vector(state)
+        now = time.time()
+        with self._lock:
+            buckets = self._buckets(vector)
+            cursor = self._connection.execute(
+                "INSERT INTO entries (signature, vector, scores, suggestion, stored_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (state.signature, vector.tobytes(), json.dumps(state.scores), suggestion, now, now))
+            self._connection.executemany(
+                "INSERT INTO buckets (signature, band, bucket, entry) VALUES (?, ?, ?, ?)",
+                [(state.signature, band, bucket, cursor.lastrowid) for band, bucket in enumerate(buckets)])
+            evicted = self._connection.execute(
+                "SELECT id FROM entries ORDER BY used_at DESC LIMIT -1 OFFSET ?", (self.max_size,)).fetchall()
+            for entry_id, in evicted:
+                self._discard(entry_id)
+            self._connection.commit()
+
+    def should_audit(self):
+        """
+        Returns whether to audit a hit, for a share audit_rate of the hits.
+
+        Returns:
+            bool: Whether to audit.
+        """
+        with self._lock:
+            return self._random.random() < self.audit_rate
+
+    def audit(self, state, match, suggestion):
+        """
+        Compares a hit to a fresh answer to the same request. A hit whose design option differs from the fresh one
+        is counted as false, and its entry replaced by the fresh answer.
+
+        Args:
+            state (SemanticState): The canonical request that was answered from the cache.
+            match (SemanticMatch): The hit.
+            suggestion (str): The fresh suggestion.
+
+        Returns:
+            bool: Whether the hit was false.
+        """
+        false_hit = mentioned_option(match.suggestion, state.options) != mentioned_option(suggestion, state.options)
+        with self._lock:
+            self.audits += 1
+            if false_hit:
+                self.false_hits += 1
+                self._discard(match.entry_id)
+                self._connection.commit()
+        if false_hit:
+            self.store(state, suggestion)
+        return false_hit
+
+    def _discard(self, entry_id):
+        self._connection.execute("DELETE FROM entries WHERE id = ?", (entry_id,))
+        self._connection.execute("DELETE FROM buckets WHERE entry = ?", (entry_id,))
+
+    def discard(self, entry_id):
+        """
+        Removes an entry.
+
+        Args:
+            entry_id (int): The identifier of the entry, as in SemanticMatch.entry_id.
+        """
+        with self._lock:
+            self._discard(entry_id)
+            self._connection.commit()
+
+    def _clear(self):
+        self._connection.execute("DELETE FROM entries")
+        self._connection.execute("DELETE FROM buckets")
+
+    def clear(self):
+        """
+        Removes every entry from the cache and resets the counters.
+        """
+        with self._lock:
+            self._clear()
+            self._connection.commit()
+            self.hits = self.misses = self.audits = self.false_hits = 0
+            self._latencies.clear()
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The number of hits, misses and entries, the hit rate, the audited hits and the share of them that
+                were false, and the mean and 95th percentile lookup latency in milliseconds over the last lookups.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            latencies = sorted(self._latencies)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "audits": self.audits,
+                "false_hits": self.false_hits,
+                "false_hit_rate": self.false_hits / self.audits if self.audits else 0.0,
+                "lookup_ms_mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+                "lookup_ms_p95": 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            }
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self._connection.close()
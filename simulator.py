@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import configuration
+from advisor import RuleBasedAdvisor
+from context_builder import ContextBuilder
+from models import Player, ProjectCard, StakeholderCard, ConcernCard, EventCard
+from score_state import ScoreState
+from solver import DecisionSolver
+
+
+GAME_DURATION = 30 * 60  # 30 minutes, as in DecidArchGame.play_game
+
+
+def load_table(data):
+    """
+    Builds the cards of a game table from plain data, e.g. a parsed JSON file.
+
+    The data holds "players", "project", "stakeholders", "concerns" and "events", each entry with the constructor
+    arguments of the corresponding model (Player, ProjectCard, StakeholderCard, ConcernCard, EventCard).
+
+    Args:
+        data (dict): The table description.
+
+    Returns:
+        dict: The model objects, under the same keys.
+    """
+    return {
+        "players": [Player(**player) for player in data.get("players", [])],
+        "project": ProjectCard(**data["project"]),
+        "stakeholders": [StakeholderCard(**stakeholder) for stakeholder in data["stakeholders"]],
+        "concerns": [ConcernCard(**concern) for concern in data["concerns"]],
+        "events": [EventCard(**event) for event in data.get("events", [])],
+    }
+
+
+class SimulatedClock:
+    """
+    Clock advanced explicitly by the simulation instead of by wall-clock time.
+
+    Attributes:
+        current (float): The current simulated time in seconds.
+    """
+    __slots__ = ("current",)
+
+    def __init__(self, start=0.0):
+        """
+        Initializes the clock.
+
+        Args:
+            start (float): The initial simulated time in seconds.
+        """
+        self.current = start
+
+    def __call__(self):
+        return self.current
+
+    def advance(self, seconds):
+        """
+        Moves the clock forward.
+
+        Args:
+            seconds (float): The simulated time to add.
+        """
+        self.current += seconds
+
+
+class SimulatedGame:
+    """
+    Headless game played by a decision policy on a simulated clock, following the turn rules of
+    DecidArchGame.play_game: one concern card per turn, until every card has been played or the 30 minutes are over.
+
+    Attributes:
+        table (dict): The cards of the table, as returned by load_table.
+        stakeholder_cards (list): The stakeholders of the table.
+        concern_cards (list): The concern cards, in play order.
+        score_state (ScoreState): The decisions taken and the running scores.
+        current_concern_index (int): Index of the concern card in play.
+        clock (SimulatedClock): The simulated game clock.
+        rng (random.Random): Random source of the game.
+        shared (dict): Data shared by the games of one worker, e.g. policy caches.
+
+    Methods:
+        play(policy, turn_duration): Plays the game and returns its result.
+    """
+
+    # games are created by the million: no per-game __dict__
+    __slots__ = ("table", "stakeholder_cards", "concern_cards", "score_state", "current_concern_index", "clock",
+                 "rng", "shared")
+
+    def __init__(self, table, rng, shared=None):
+        """
+        Initializes a game on a table.
+
+        Args:
+            table (dict): The cards of the table, as returned by load_table.
+            rng (random.Random): Random source of the game.
+            shared (dict, optional): Data shared by the games of one worker.
+        """
+        self.table = table
+        self.stakeholder_cards = table["stakeholders"]
+        self.concern_cards = table["concerns"]
+        self.shared = shared if shared is not None else {}
+        # the stakeholders' priorities are the same for every game of the table
+        cache = self.shared.setdefault("priorities", {})
+        priorities = cache.get(id(self.stakeholder_cards))
+        if priorities is None:
+            priorities = cache[id(self.stakeholder_cards)] = ScoreState.stakeholder_priorities(self.stakeholder_cards)
+        self.score_state = ScoreState(self.stakeholder_cards, priorities)
+        self.current_concern_index = 0
+        self.clock = SimulatedClock()
+        self.rng = rng
+
+    def play(self, policy, turn_duration=(90.0, 270.0)):
+        """
+        Plays the game with the given policy.
+
+        Args:
+            policy (callable): Called with the game before each turn, returns the name of the chosen option.
+            turn_duration (tuple): Bounds, in seconds, of the uniformly drawn discussion time of a turn.
+
+        Returns:
+            dict: The final score, the number of concern cards played and the simulated duration.
+        """
+        end_time = self.clock() + GAME_DURATION
+        while self.clock() < end_time and self.current_concern_index < len(self.concern_cards):
+            concern_card = self.concern_cards[self.current_concern_index]
+            option = policy(self)
+            self.score_state.append(concern_card.design_options()[option])
+            self.current_concern_index += 1
+            self.clock.advance(self.rng.uniform(*turn_duration))
+
+        return {
+            "score": self.score_state.score(),
+            "played": self.current_concern_index,
+            "duration": self.clock(),
+        }
+
+
+def random_policy(game):
+    """
+    Chooses one of the options of the current concern card at random.
+    """
+    return game.rng.choice(list(game.concern_cards[game.current_concern_index].design_options()))
+
+
+def greedy_policy(game):
+    """
+    Chooses the option with the best score right after it is taken.
+    """
+    best_name, best_score = None, None
+    for name, impacts in game.concern_cards[game.current_concern_index].design_options().items():
+        game.score_state.append(impacts)
+        score = game.score_state.score()
+        game.score_state.undo()
+        if best_score is None or score > best_score:
+            best_name, best_score = name, score
+    return best_name
+
+
+def optimal_policy(game):
+    """
+    Chooses the first option of the best selection for the remaining concern cards, as found by the
+    DecisionSolver. Solutions are cached per worker, by position and QA scores.
+    """
+    plans = game.shared.setdefault("optimal_plans", {})
+    key = (id(game.concern_cards), game.current_concern_index, tuple(game.score_state.qa_scores.items()))
+    choice = plans.get(key)
+    if choice is None:
+        solver = DecisionSolver(game.stakeholder_cards, game.concern_cards[game.current_concern_index:])
+        choice = plans[key] = solver.solve(game.score_state.qa_scores).choices[0]
+    return choice
+
+
+def advisor_policy(game):
+    """
+    Chooses the option ranked first by the RuleBasedAdvisor, as the assistant does when the LLM misses its deadline.
+    """
+    advisor = game.shared.get("advisor")
+    if advisor is None:
+        advisor = game.shared["advisor"] = RuleBasedAdvisor(game.stakeholder_cards)
+    concern_card = game.concern_cards[game.current_concern_index]
+    return advisor.best(concern_card.design_options(), game.score_state.qa_scores)
+
+
+class LLMStubPolicy:
+    """
+    Stand-in for the LLM assistant: follows the greedy choice with a given accuracy, otherwise picks an option at
+    random, and spends a simulated response time on the game clock.
+
+    Attributes:
+        accuracy (float): Probability of following the greedy choice.
+        latency (float): Simulated seconds spent waiting for the suggestion.
+    """
+    def __init__(self, accuracy=0.7, latency=20.0):
+        """
+        Initializes the policy.
+
+        Args:
+            accuracy (float): Probability of following the greedy choice.
+            latency (float): Simulated seconds spent waiting for the suggestion.
+        """
+        self.accuracy = accuracy
+        self.latency = latency
+
+    def __call__(self, game):
+        game.clock.advance(self.latency)
+        if game.rng.random() < self.accuracy:
+            return greedy_policy(game)
+        return random_policy(game)
+
+
+class AssistantPolicy:
+    """
+    Plays the option chosen in the assistant's structured suggestion, to evaluate the LLM's choices against the
+    other policies (e.g. the optimal one) on the same tables. The assistant runs in this process, so games must be
+    simulated with workers=1, and its real response time is not added to the game clock.
+
+    Attributes:
+        assistant (DecidArchAssistant): The assistant asked for each choice.
+        context_builder (ContextBuilder): Compacts the game state sent in the suggestion prompts.
+        sources (Counter): Number of choices made by the LLM and by the rule-based fallback.
+    """
+    def __init__(self, assistant, token_budget=1024, timeout=None):
+        """
+        Initializes the policy.
+
+        Args:
+            assistant (DecidArchAssistant): The assistant asked for each choice.
+            token_budget (int): Maximum number of tokens of the game state sent in a prompt.
+            timeout (float, optional): Seconds after which the rule-based advisor chooses instead of the LLM.
+        """
+        self.assistant = assistant
+        self.context_builder = ContextBuilder(token_budget)
+        self.timeout = timeout
+        self.sources = Counter()
+
+    def __call__(self, game):
+        concern_card = game.concern_cards[game.current_concern_index]
+        inputs = self.context_builder.build(
+            game.table["project"], game.stakeholder_cards, game.score_state, game.table["events"], concern_card)
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        suggestion = self.assistant.extract_structured_suggestion(**inputs, deadline=deadline)
+        self.sources[suggestion.source] += 1
+        return suggestion.option
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+    "optimal": optimal_policy,
+    "advisor": advisor_policy,
+    "llm-stub": LLMStubPolicy(),
+}
+
+
+def _simulate_chunk(data, policy, seeds, turn_duration):
+    # the cards are built once per chunk and shared by its games, which never modify them
+    table = load_table(data)
+    shared = {}
+    return [SimulatedGame(table, random.Random(seed), shared).play(policy, turn_duration) for seed in seeds]
+
+
+def summarize(results):
+    """
+    Aggregates the results of many simulated games.
+
+    Args:
+        results (list): The results returned by SimulatedGame.play.
+
+    Returns:
+        dict: The score distribution (counts per score), mean, standard deviation, quantiles and loss rate, plus the
+            mean number of concern cards played. Without results, every statistic is None.
+    """
+    scores = [result["score"] for result in results]
+    if not scores:
+        return dict(games=0, distribution={}, mean=None, stdev=None, min=None, p50=None, p95=None, max=None,
+                    loss_rate=None, mean_played=None)
+    quantiles = statistics.quantiles(scores, n=100, method="inclusive") if len(scores) > 1 else scores * 99
+    return {
+        "games": len(scores),
+        "distribution": dict(sorted(Counter(scores).items())),
+        "mean": statistics.fmean(scores),
+        "stdev": statistics.pstdev(scores),
+        "min": min(scores),
+        "p50": quantiles[49],
+        "p95": quantiles[94],
+        "max": max(scores),
+        "loss_rate": sum(score < 0 for score in scores) / len(scores),
+        "mean_played": statistics.fmean(result["played"] for result in results),
+    }
+
+
+def simulate(data, policy, games, seed=0, workers=None, chunk_size=500, turn_duration=(90.0, 270.0)):
+    """
+    Simulates many games of a table across a process pool and aggregates their scores.
+
+    Game i is seeded with seed + i, so a run is reproducible whatever the number of workers.
+
+    Args:
+        data (dict): The table description, as accepted by load_table.
+        policy (callable or str): The decision policy, or the name of one in POLICIES. Must be picklable.
+        games (int): Number of games to simulate.
+        seed (int): Seed of the first game.
+        workers (int, optional): Number of worker processes. Defaults to the number of CPUs; 1 runs in-process.
+        chunk_size (int): Number of games sent to a worker at once.
+        turn_duration (tuple): Bounds, in seconds, of the simulated discussion time of a turn.
+
+    Returns:
+        dict: The aggregated results, as returned by summarize.
+    """
+    if isinstance(policy, str):
+        policy = POLICIES[policy]
+    chunks = [range(start, min(start + chunk_size, seed + games)) for start in range(seed, seed + games, chunk_size)]
+
+    if workers == 1:
+        results = [result for seeds in chunks for result in _simulate_chunk(data, policy, seeds, turn_duration)]
+        return summarize(results)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(_simulate_chunk, data, policy, seeds, turn_duration) for seeds in chunks]
+        for future in futures:
+            results.extend(future.result())
+    return summarize(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate DecidArch games headlessly and report score distributions.")
+    parser.add_argument("table", help="JSON or YAML file describing the players, project, stakeholders, concerns and events")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--policy", choices=sorted(POLICIES) + ["assistant"], default="greedy",
+                        help="assistant asks the LLM at configuration.uri_ollama for every choice, in-process")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    # imported here, as the card library builds its cards with load_table
+    from card_library import read_library, validate_library
+
+    data = read_library(args.table)
+    limits = configuration.Configuration()
+    errors = validate_library(data, limits)
+    if errors:
+        parser.error("Invalid table: " + "; ".join(errors))
+
+    policy, workers = args.policy, args.workers
+    if policy == "assistant":
+        from decidarch_assistant import DecidArchAssistant
+
+        policy = AssistantPolicy(DecidArchAssistant(limits), limits.prompt_token_budget, limits.suggestion_deadline)
+        workers = 1
+    results = simulate(data, policy, args.games, args.seed, workers)
+    if isinstance(policy, AssistantPolicy):
+        results["sources"] = dict(policy.sources)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+class Solution:
+    """
+    Best selection of design options found by the DecisionSolver.
+
+    Attributes:
+        choices (list): The name of the chosen option for each concern card, in play order.
+        score (int): The game score of the selection, -1 if every selection loses.
+        qa_scores (dict): The final score of each quality attribute.
+        nodes (int): Number of search nodes expanded, to compare pruning strategies.
+    """
+    def __init__(self, choices, score, qa_scores, nodes):
+        """
+        Initializes a Solution object.
+
+        Args:
+            choices (list): The name of the chosen option for each concern card, in play order.
+            score (int): The game score of the selection.
+            qa_scores (dict): The final score of each quality attribute.
+            nodes (int): Number of search nodes expanded.
+        """
+        self.choices = choices
+        self.score = score
+        self.qa_scores = qa_scores
+        self.nodes = nodes
+
+
+class DecisionSolver:
+    """
+    Exact solver returning the selection of design options that maximizes the game score.
+
+    The search walks the option tree one concern card at a time. A branch is pruned when an optimistic bound on its
+    best final score cannot beat the best selection found so far: the satisfaction only grows with the QA scores, so
+    adding to every attribute the largest gain the remaining cards can still give bounds it from above, and an
+    attribute that stays negative even with that gain means the branch can only lose. Partial QA vectors reached
+    through different paths are memoized, so each one is expanded once.
+
+    The scoring rules are the ones of DecidArchGame.calculate_score: the QA scores are the sum of the impacts, any
+    negative final score loses (-1), otherwise the score is the sum of max(0, score - priority) over every
+    stakeholder's quality attributes.
+
+    Attributes:
+        stakeholder_cards (list): The StakeholderCard objects of the game.
+        concern_cards (list): The ConcernCard objects still to be played, in play order.
+        attributes (list): Every quality attribute of the stakeholders and of the options.
+
+    Methods:
+        solve(qa_scores=None): Returns the best selection, starting from the given QA scores.
+    """
+
+    def __init__(self, stakeholder_cards, concern_cards):
+        """
+        Prepares the option vectors and the optimistic gains of the remaining cards.
+
+        Args:
+            stakeholder_cards (list): The StakeholderCard objects of the game.
+            concern_cards (list): The ConcernCard objects still to be played, in play order.
+        """
+        self.stakeholder_cards = stakeholder_cards
+        self.concern_cards = concern_cards
+
+        self.attributes = []
+        for stakeholder in stakeholder_cards:
+            self.attributes.extend(attr for attr in stakeholder.quality_attributes if attr not in self.attributes)
+        for concern_card in concern_cards:
+            for impacts in concern_card.design_options().values():
+                self.attributes.extend(attr for attr in impacts if attr not in self.attributes)
+        index = {attr: i for i, attr in enumerate(self.attributes)}
+
+        # priorities of every stakeholder by attribute index
+        self._priorities = [[] for _ in self.attributes]
+        for stakeholder in stakeholder_cards:
+            for attr, priority in stakeholder.quality_attributes.items():
+                self._priorities[index[attr]].append(priority)
+
+        # options of each card as (name, impact vector)
+        self._options = []
+        for concern_card in concern_cards:
+            options = []
+            for name, impacts in concern_card.design_options().items():
+                vector = [0] * len(self.attributes)
+                for attr, impact in impacts.items():
+                    vector[index[attr]] = impact
+                options.append((name, tuple(vector)))
+            self._options.append(options)
+
+        # largest gain the cards from position k onwards can still give to each attribute
+        self._gains = [(0,) * len(self.attributes)]
+        for options in reversed(self._options):
+            best = [max(0, max(vector[i] for _, vector in options)) for i in range(len(self.attributes))]
+            self._gains.insert(0, tuple(g + b for g, b in zip(self._gains[0], best)))
+
+    def _satisfaction(self, scores):
+        return sum(max(0, score - priority)
+                   for score, priorities in zip(scores, self._priorities) for priority in priorities)
+
+    def _final(self, scores):
+        if any(score < 0 for score in scores):
+            return -1  # Immediate loss due to negative score
+        return self._satisfaction(scores)
+
+    def _bound(self, k, scores):
+        optimistic = [score + gain for score, gain in zip(scores, self._gains[k])]
+        if any(score < 0 for score in optimistic):
+            return -1
+        return self._satisfaction(optimistic)
+
+    def solve(self, qa_scores=None):
+        """
+        Returns the selection of options for the concern cards that maximizes the final score.
+
+        Args:
+            qa_scores (dict, optional): The QA scores reached by the decisions already taken. Defaults to all zero.
+                Attributes outside the stakeholders and the remaining options are kept as they are, so a negative one
+                makes every selection lose.
+
+        Returns:
+            Solution: The best selection and its score.
+        """
+        qa_scores = qa_scores or {}
+        start = tuple(qa_scores.get(attr, 0) for attr in self.attributes)
+        # attributes carried over from earlier decisions that no stakeholder or remaining option involves never change
+        # and add no satisfaction, but a negative one still loses the game whatever is chosen
+        carried = {attr: score for attr, score in qa_scores.items() if attr not in self.attributes}
+        lost = any(score < 0 for score in carried.values())
+        memo = {}
+        incumbent = [-2]
+        nodes = [0]
+
+        # returns (value, exact): the best final score of the subtree when exact, otherwise an upper bound of it
+        def search(k, scores):
+            if k == len(self._options):
+                value = self._final(scores)
+                incumbent[0] = max(incumbent[0], value)
+                return value, True
+
+            key = (k, scores)
+            cached = memo.get(key)
+            if cached is not None and (cached[1] or cached[0] <= incumbent[0]):
+                return cached[0], cached[1]
+
+            bound = self._bound(k, scores)
+            if bound <= incumbent[0]:
+                memo[key] = (bound, False, None)
+                return bound, False
+
+            nodes[0] += 1
+            children = []
+            for name, vector in self._options[k]:
+                child = tuple(score + impact for score, impact in zip(scores, vector))
+                children.append((self._bound(k + 1, child), name, child))
+            children.sort(key=lambda item: item[0], reverse=True)
+
+            best_exact, best_name, best_bound = -2, None, -2
+            for _, name, child in children:
+                value, exact = search(k + 1, child)
+                if exact:
+                    if value > best_exact:
+                        best_exact, best_name = value, name
+                else:
+                    best_bound = max(best_bound, value)
+
+            exact = best_exact >= best_bound
+            value = best_exact if exact else best_bound
+            memo[key] = (value, exact, best_name if exact else None)
+            return value, exact
+
+        score, _ = search(0, start)
+
+        choices = []
+        scores = start
+        for k, options in enumerate(self._options):
+            name = memo[(k, scores)][2]
+            vector = dict(options)[name]
+            choices.append(name)
+            scores = tuple(score + impact for score, impact in zip(scores, vector))
+
+        final_scores = dict(carried)
+        final_scores.update(zip(self.attributes, scores))
+        return Solution(choices, -1 if lost else score, final_scores, nodes[0])
@@ -0,0 +1,122 @@
+import json
+import re
+
+
+class SuggestionFormatError(ValueError):
+    """
+    Raised when a structured suggestion cannot be parsed or names no known design option.
+    """
+
+
+class StructuredSuggestion:
+    """
+    Suggestion of a design option in a form that can be acted upon.
+
+    Attributes:
+        option (str): The chosen option, as named in the concern card's design options.
+        rationale (str): Why the option was chosen.
+        source (str): "llm" when the model answered, "advisor" when the rule-based fallback did.
+        attempts (int): Number of LLM requests made, retries for malformed output included.
+    """
+    def __init__(self, option, rationale, source="llm", attempts=1):
+        """
+        Initializes a StructuredSuggestion object.
+
+        Args:
+            option (str): The chosen option.
+            rationale (str): Why the option was chosen.
+            source (str): "llm" or "advisor".
+            attempts (int): Number of LLM requests made.
+        """
+        self.option = option
+        self.rationale = rationale
+        self.source = source
+        self.attempts = attempts
+
+    def to_dict(self):
+        return {"option": self.option, "rationale": self.rationale, "source": self.source, "attempts": self.attempts}
+
+
+def suggestion_schema(options):
+    """
+    Returns the JSON schema of a structured suggestion, sent as Ollama's "format" to constrain the generation.
+
+    Args:
+        options (iterable): The names of the design options.
+
+    Returns:
+        dict: A schema of an object with the chosen "option" (one of the names) and a "rationale".
+    """
+    return {
+        "type": "object",
+        "properties": {
+            "option": {"type": "string", "enum": list(options)},
+            "rationale": {"type": "string"},
+        },
+        "required": ["option", "rationale"],
+    }
+
+
+def _normalize(name):
+    return re.sub(r"\W+", " ", name).strip().lower()
+
+
+def match_option(name, options):
+    """
+    Finds the design option a model answer refers to: exactly, then ignoring case and punctuation, then as the
+    only option whose name contains the answer or is contained in it.
+
+    Args:
+        name (str): The option named by the model.
+        options (iterable): The names of the design options.
+
+    Returns:
+        str: The matching option name.
+
+    Raises:
+        SuggestionFormatError: If no single option matches.
+    """
+    options = list(options)
+    if name in options:
+        return name
+    wanted = _normalize(name)
+    normalized = {_normalize(option): option for option in options}
+    if wanted in normalized:
+        return normalized[wanted]
+    candidates = [option for key, option in normalized.items() if wanted and (wanted in key or key in wanted)]
+    if len(candidates) == 1:
+        return candidates[0]
+    raise SuggestionFormatError(f"{name!r} is not one of the design options: {', '.join(options)}.")
+
+
+def parse_suggestion(text, options):
+    """
+    Parses a model answer into a StructuredSuggestion.
+
+    Args:
+        text (str): The model answer, expected to be a JSON object with "option" and "rationale".
+        options (iterable): The names of the design options.
+
+    Returns:
+        StructuredSuggestion: The suggestion, with the option name as written in the design options.
+
+    Raises:
+        SuggestionFormatError: If the answer is not such an object or names no known option.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        # models sometimes wrap the object in prose or code fences
+        found = re.search(r"\{.*\}", text, re.DOTALL)
+        try:
+            data = json.loads(found.group(0)) if found else None
+        except ValueError:
+            data = None
+    if not isinstance(data, dict):
+        raise SuggestionFormatError("The answer is not a JSON object.")
+    if not isinstance(data.get("option"), str):
+        raise SuggestionFormatError('The answer has no "option" string.')
+    rationale = data.get("rationale")
+    if not isinstance(rationale, str) or not rationale.strip():
+        raise SuggestionFormatError('The answer has no "rationale" string.')
+    return StructuredSuggestion(match_option(data["option"], options), rationale.strip())
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(model_name, template, system_template, **inputs):
+    """
+    Builds a canonical cache key for a suggestion request.
+
+    The inputs are serialized with sorted keys so that equal game states produce the same key regardless of
+    dict ordering. The model name and both templates are part of the key, so changing any of them invalidates
+    every cached entry.
+
+    Args:
+        model_name (str): The name of the model answering the request.
+        template (str): The prompt template used for the request.
+        system_template (str): The system prompt of the assistant.
+        **inputs: The values the prompt template is rendered with.
+
+    Returns:
+        str: A hex SHA-256 digest identifying the request.
+    """
+    payload = json.dumps(
+        [model_name, template, system_template, inputs],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SuggestionCache:
+    """
+    Base class for suggestion caches. Subclasses store suggestions by key and evict them by age and size.
+
+    Attributes:
+        max_size (int): Maximum number of entries kept in the cache.
+        ttl (float, optional): Time to live of an entry in seconds. None keeps entries until they are evicted by size.
+        hits (int): Number of lookups that found a valid entry.
+        misses (int): Number of lookups that found no entry or an expired one.
+
+    Methods:
+        get(key): Returns the cached suggestion for the key, or None.
+        set(key, suggestion): Stores a suggestion under the key.
+        clear(): Removes every entry from the cache.
+        stats(): Returns the hit/miss counters and the current size.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        """
+        Initializes the cache limits and counters.
+
+        Args:
+            max_size (int): Maximum number of entries kept in the cache.
+            ttl (float, optional): Time to live of an entry in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the cached suggestion for the key and updates the hit/miss counters.
+
+        Args:
+            key (str): The cache key, as built by make_cache_key.
+
+        Returns:
+            str or None: The cached suggestion, or None if the key is missing or expired.
+        """
+        with self._lock:
+            suggestion = self._get(key)
+            if suggestion is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return suggestion
+
+    def set(self, key, suggestion):
+        """
+        Stores a suggestion under the key, evicting the least recently used entries if the cache is full.
+
+        Args:
+            key (str): The cache key, as built by make_cache_key.
+            suggestion (str): The suggestion to store.
+        """
+        with self._lock:
+            self._set(key, suggestion)
+
+    def clear(self):
+        """
+        Removes every entry from the cache and resets the counters.
+        """
+        with self._lock:
+            self._clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Returns the cache counters.
+
+        Returns:
+            dict: The number of hits, misses and entries, and the hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": self._size(),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, suggestion):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _size(self):
+        raise NotImplementedError
+
+
+class LRUSuggestionCache(SuggestionCache):
+    """
+    In-memory suggestion cache with least-recently-used eviction.
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        """
+        Initializes an empty in-memory cache.
+
+        Args:
+            max_size (int): Maximum number of entries kept in the cache.
+            ttl (float, optional): Time to live of an entry in seconds.
+        """
+        super().__init__(max_size, ttl)
+        self._entries = OrderedDict()
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        suggestion, stored_at = entry
+        if self._expired(stored_at):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return suggestion
+
+    def _set(self, key, suggestion):
+        self._entries[key] = (suggestion, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _clear(self):
+        self._entries.clear()
+
+    def _size(self):
+        return len(self._entries)
+
+
+class SQLiteSuggestionCache(SuggestionCache):
+    """
+    Persistent suggestion cache stored in a SQLite database, shared between runs and processes.
+
+    The database is in WAL mode with synchronous=NORMAL, so a write does not wait for an fsync. Hits do not write:
+    the last use of each entry is kept in memory and written in a single transaction before the next store, which
+    evicts by last use, or every MAX_PENDING_USES hits, or when the cache is closed. A crash only loses the
+    recency of the latest hits.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+    """
+
+    # hits whose last use is kept in memory before it is written
+    MAX_PENDING_USES = 256
+
+    def __init__(self, path, max_size=10000, ttl=None):
+        """
+        Opens (or creates) the cache database.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            max_size (int): Maximum number of entries kept in the cache.
+            ttl (float, optional): Time to live of an entry in seconds.
+        """
+        super().__init__(max_size, ttl)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        # last use of the entries hit since the last write, by key
+        self._used = {}
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS suggestions ("
+            "key TEXT PRIMARY KEY, suggestion TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS suggestions_used_at ON suggestions (used_at)")
+        self._connection.commit()
+
+    def _get(self, key):
+        row = self._connection.execute(
+            "SELECT suggestion, stored_at FROM suggestions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        suggestion, stored_at = row
+        if self._expired(stored_at):
+            self._used.pop(key, None)
+            self._connection.execute("DELETE FROM suggestions WHERE key = ?", (key,))
+            self._connection.commit()
+            return None
+        self._used[key] = time.time()
+        if len(self._used) >= self.MAX_PENDING_USES:
+            self._write_uses()
+            self._connection.commit()
+        return suggestion
+
+    def _write_uses(self):
+        if self._used:
+            self._connection.executemany("UPDATE suggestions SET used_at = ? WHERE key = ?",
+                                         [(used_at, key) for key, used_at in self._used.items()])
+            self._used.clear()
+
+    def _set(self, key, suggestion):
+        now = time.time()
+        self._write_uses()
+        self._used.pop(key, None)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO suggestions (key, suggestion, stored_at, used_at) VALUES (?, ?, ?, ?)",
+            (key, suggestion, now, now),
+        )
+        if self.ttl is not None:
+            self._connection.execute("DELETE FROM suggestions WHERE stored_at < ?", (now - self.ttl,))
+        self._connection.execute(
+            "DELETE FROM suggestions WHERE key IN ("
+            "SELECT key FROM suggestions ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        )
+        self._connection.commit()
+
+    def _clear(self):
+        self._used.clear()
+        self._connection.execute("DELETE FROM suggestions")
+        self._connection.commit()
+
+    def _size(self):
+        return self._connection.execute("SELECT COUNT(*) FROM suggestions").fetchone()[0]
+
+    def close(self):
+        """
+        Writes the pending last uses and closes the database connection.
+        """
+        with self._lock:
+            self._write_uses()
+            self._connection.commit()
+            self._connection.close()
@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+
+from scheduler import scheduling
+
+
+class SuggestionStream:
+    """
+    Iterates over the text of a streamed suggestion and measures how long the player waited for it.
+
+    Attributes:
+        time_to_first_token (float, optional): Seconds from the start of the request to the first piece of text.
+        total_time (float, optional): Seconds from the start of the request to the end of the completion.
+        text (str): The text received so far.
+        metadata (dict): The last Ollama chunk, with the token counters and durations of the generation.
+        deadline (float, optional): time.monotonic() by which the first piece of text must have arrived.
+        fallback (callable, optional): Returns the text shown instead when the deadline passes or the request fails.
+        used_fallback (bool): Whether the fallback text was shown.
+
+    Methods:
+        __iter__(): Yields the pieces of text as they arrive.
+        set_deadline(deadline, fallback): Bounds the time to first token.
+    """
+
+    def __init__(self, chunks, on_complete=None):
+        """
+        Initializes the stream. The request is started lazily, when the stream is iterated.
+
+        Args:
+            chunks (iterable): Ollama response chunks, as yielded by OllamaClient.stream.
+            on_complete (callable, optional): Called with the stream once the completion has been received.
+        """
+        self.chunks = chunks
+        self.on_complete = on_complete
+        self.time_to_first_token = None
+        self.total_time = None
+        self.metadata = {}
+        self.deadline = None
+        self.fallback = None
+        self.used_fallback = False
+        self._parts = []
+        self._start = None
+
+    def set_deadline(self, deadline, fallback):
+        """
+        Bounds the time to first token: if no text has arrived by the deadline, or the request fails before, the
+        text returned by the fallback is yielded instead and the request is abandoned.
+
+        Args:
+            deadline (float, optional): time.monotonic() by which the first piece of text must have arrived.
+                None leaves the stream unbounded.
+            fallback (callable): Returns the text to show instead.
+
+        Returns:
+            SuggestionStream: The stream itself.
+        """
+        self.deadline = deadline
+        self.fallback = fallback
+        return self
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def _started(self):
+        self._start = time.perf_counter()
+
+    def _received(self, chunk):
+        piece = chunk.get("response", "")
+        if piece:
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - self._start
+            self._parts.append(piece)
+        if chunk.get("done"):
+            self.metadata = chunk
+        return piece
+
+    def _finished(self):
+        self.total_time = time.perf_counter() - self._start
+        if self.on_complete is not None:
+            self.on_complete(self)
+
+    def __iter__(self):
+        self._started()
+        chunks = self.chunks if self.deadline is None else self._bounded_chunks()
+        for chunk in chunks:
+            piece = self._received(chunk)
+            if piece:
+                yield piece
+        if self.used_fallback:
+            self.total_time = time.perf_counter() - self._start
+            return
+        self._finished()
+
+    def _bounded_chunks(self):
+        # the chunks are read on a thread, so that waiting for the first one can time out
+        received = queue.Queue()
+        stopped = threading.Event()
+        finished = object()
+
+        def produce():
+            try:
+                # a request still queued in the scheduler at the deadline is dropped instead of sent
+                with scheduling(deadline=self.deadline):
+                    for chunk in self.chunks:
+                        if stopped.is_set():
+                            break
+                        received.put(chunk)
+            except Exception as error:
+                received.put(error)
+            finally:
+                received.put(finished)
+
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(produce,), daemon=True, name="suggestion-stream").start()
+        first = True
+        try:
+            while True:
+                try:
+                    item = received.get(timeout=max(0.0, self.deadline - time.monotonic()) if first else None)
+                except queue.Empty:
+                    item = None
+                if item is None or (first and isinstance(item, Exception)):
+                    self.used_fallback = True
+                    yield {"response": self.fallback(), "done": True}
+                    return
+                if item is finished:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                first = first and not item.get("response")
+                yield item
+        finally:
+            stopped.set()
+
+
+class AsyncSuggestionStream(SuggestionStream):
+    """
+    Async variant of SuggestionStream, iterated with "async for".
+    """
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        self._started()
+        chunks = self.chunks.__aiter__()
+        first = True
+        while True:
+            try:
+                if first and self.deadline is not None:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, self.deadline - time.monotonic()))
+                else:
+                    chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                if not first or self.deadline is None:
+                    raise
+                self.used_fallback = True
+                self.total_time = time.perf_counter() - self._start
+                yield self._received({"response": self.fallback(), "done": True})
+                return
+            piece = self._received(chunk)
+            if piece:
+                first = False
+                yield piece
+        self._finished()
@@ -0,0 +1,55 @@
+import os
+import sys
+
+# the modules live at the repository root, next to main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from configuration import Configuration
+from models import StakeholderCard
+from ollama_stub import StubOllamaServer
+
+
+@pytest.fixture
+def stub():
+    # a fast local Ollama; tests slow it down through its attributes
+    with StubOllamaServer(first_token_delay=0.0, token_delay=0.0) as server:
+        yield server
+
+
+@pytest.fixture
+def make_assistant(stub):
+    from decidarch_assistant import DecidArchAssistant
+
+    assistants = []
+
+    def make(**settings):
+        configuration = Configuration()
+        configuration.uri_ollama = stub.url
+        for name, value in settings.pop("configuration", {}).items():
+            setattr(configuration, name, value)
+        assistant = DecidArchAssistant(configuration, **settings)
+        assistants.append(assistant)
+        return assistant
+
+    yield make
+    for assistant in assistants:
+        assistant.client.close()
+
+
+STAKEHOLDERS = [
+    StakeholderCard("Owner", "Profit", {"Security": 2, "Cost": 1}),
+    StakeholderCard("User", "Ease", {"Usability": 3}),
+]
+
+# the arguments of the assistant's suggestion methods, as the game passes them
+SUGGESTION = dict(
+    project_description="Web shop: Sell online",
+    stakeholders=STAKEHOLDERS,
+    current_design_decisions="No decisions yet.",
+    current_qa_scores="Security: 0, Cost: 0, Usability: 0",
+    ongoing_events="No events.",
+    concern_card_description="Breach",
+    design_options={"Encrypt": {"Security": 3, "Cost": -1}, "Ignore": {"Cost": 1}},
+)
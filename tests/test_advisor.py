@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from advisor import RuleBasedAdvisor, parse_qa_scores
+from configuration import Configuration
+from conftest import STAKEHOLDERS, SUGGESTION
+from structured_output import StructuredSuggestion
+
+
+def test_qa_scores_are_parsed_from_their_prompt_rendering():
+    assert parse_qa_scores("Security: 1, Cost: -2") == {"Security": 1, "Cost": -2}
+    assert parse_qa_scores({"Security": 1}) == {"Security": 1}
+    assert parse_qa_scores("") == {}
+
+
+def test_advisor_avoids_negative_scores_first():
+    advisor = RuleBasedAdvisor(STAKEHOLDERS)
+    options = {"Encrypt": {"Security": 3, "Cost": -1}, "Ignore": {"Cost": 1}}
+
+    # Encrypt would leave Cost negative
+    assert advisor.best(options, {"Security": 0, "Cost": 0}) == "Ignore"
+    assert advisor.best(options, {"Security": 0, "Cost": 1}) == "Encrypt"
+    ranking = advisor.rank(options, "Security: 0, Cost: 0")
+    assert [(advice.option, advice.deficit, advice.negative_attributes) for advice in ranking] == \
+        [("Ignore", 0, []), ("Encrypt", 1, ["Cost"])]
+
+
+def test_advisor_ranks_by_score_gain_then_weighted_impact():
+    advisor = RuleBasedAdvisor(STAKEHOLDERS)
+    options = {"Small": {"Usability": 1}, "Secure": {"Security": 3}, "Usable": {"Usability": 4}}
+
+    ranking = advisor.rank(options, {})
+
+    assert [advice.option for advice in ranking] == ["Usable", "Secure", "Small"]
+    assert (ranking[0].score_gain, ranking[0].weighted_impact) == (1, 12)
+    option, rationale = advisor.explain(options, {})
+    assert option == "Usable" and "the next best option is Secure" in rationale
+    assert advisor.suggest(options, {}).startswith("Suggested design option: Usable.")
+
+
+def test_missed_deadline_falls_back_to_the_advisor(stub, make_assistant):
+    stub.first_token_delay = 1.0
+    assistant = make_assistant()
+
+    start = time.monotonic()
+    suggestion = asyncio.run(assistant.aextract_suggestion_chain(**SUGGESTION, deadline=time.monotonic() + 0.2))
+    assert time.monotonic() - start < 0.8
+    assert suggestion.startswith("Suggested design option: Ignore.")
+
+    stream = assistant.stream_suggestion_chain(**SUGGESTION, deadline=time.monotonic() + 0.2)
+    assert "".join(stream).startswith("Suggested design option: Ignore.")
+
+    suggestion = asyncio.run(assistant.aextract_structured_suggestion(**SUGGESTION,
+                                                                     deadline=time.monotonic() + 0.2))
+    assert isinstance(suggestion, StructuredSuggestion)
+    assert (suggestion.option, suggestion.source) == ("Ignore", "advisor")
+
+
+def test_calls_without_a_deadline_outlast_the_suggestion_deadline(stub, make_assistant):
+    configuration = Configuration()
+    assert configuration.request_timeout > 2 * configuration.suggestion_deadline
+
+    # a non-streamed generation sends nothing until it is complete
+    stub.first_token_delay = 1.5
+    assistant = make_assistant(configuration={"suggestion_deadline": 1.0, "request_timeout": 5.0})
+
+    review = asyncio.run(assistant.aextract_review_suggestion_chain(
+        SUGGESTION["project_description"], STAKEHOLDERS, "None", "Security: 0", "An audit"))
+
+    assert review == stub.response
+
+
+def test_answer_within_the_deadline_is_the_llm_one(stub, make_assistant):
+    assistant = make_assistant()
+
+    suggestion = asyncio.run(assistant.aextract_suggestion_chain(**SUGGESTION, deadline=time.monotonic() + 5))
+
+    assert suggestion == stub.response
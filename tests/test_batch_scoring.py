@@ -0,0 +1,69 @@
+import random
+
+import numpy as np
+import pytest
+
+from batch_scoring import BatchScorer
+from models import ConcernCard, StakeholderCard
+from score_state import ScoreState
+
+
+ATTRIBUTES = ("Security", "Cost", "Performance", "Usability")
+
+
+def random_game(rng):
+    stakeholders = [
+        StakeholderCard(f"S{i}", "goal", {attr: rng.randint(1, 5) for attr in rng.sample(ATTRIBUTES, 2)})
+        for i in range(2)
+    ]
+    concerns = []
+    for card_id in range(rng.randint(1, 5)):
+        options = {
+            f"O{option}": {attr: rng.randint(-3, 3) for attr in rng.sample(ATTRIBUTES, rng.randint(1, 3))}
+            for option in range(rng.randint(1, 3))
+        }
+        concerns.append(ConcernCard(card_id, f"C{card_id}", options))
+    return stakeholders, concerns
+
+
+def scored_one_by_one(stakeholders, concerns, selection):
+    state = ScoreState(stakeholders)
+    for card, choice in zip(concerns, selection):
+        if choice >= 0:
+            state.append(card.design_options()[list(card.design_options())[choice]])
+    return state.score()
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_batch_scores_match_the_game_scoring(seed):
+    rng = random.Random(seed)
+    stakeholders, concerns = random_game(rng)
+    scorer = BatchScorer(stakeholders, concerns)
+    # every complete sequence, and random partial ones
+    selections = scorer.all_selections().tolist() + [
+        [rng.randint(-1, len(card.design_options()) - 1) for card in concerns] for _ in range(20)]
+
+    scores = scorer.score(selections)
+
+    assert scores.tolist() == [scored_one_by_one(stakeholders, concerns, selection) for selection in selections]
+
+
+def test_qa_scores_are_indexed_by_the_vocabulary():
+    stakeholders = [StakeholderCard("Owner", "Profit", {"Security": 2})]
+    concerns = [ConcernCard(1, "c", {"Encrypt": {"Security": 3, "Cost": -1}, "Ignore": {"Cost": 1}})]
+    scorer = BatchScorer(stakeholders, concerns)
+
+    totals = scorer.qa_scores([[0], [1], [-1]])
+
+    columns = [scorer.vocabulary.code("Security"), scorer.vocabulary.code("Cost")]
+    assert totals[:, columns].tolist() == [[3, -1], [0, 1], [0, 0]]
+    assert scorer.score([[0], [1], [-1]]).tolist() == [-1, 0, 0]
+    assert scorer.all_selections().tolist() == [[0], [1]]
+
+
+@pytest.mark.parametrize("selections", [[[2]], [[-2]], [[0, 0]], [0]])
+def test_invalid_selections_are_refused(selections):
+    scorer = BatchScorer([StakeholderCard("Owner", "Profit", {"Security": 2})],
+                         [ConcernCard(1, "c", {"Encrypt": {"Security": 3}, "Ignore": {"Cost": 1}})])
+    with pytest.raises(IndexError):
+        scorer.qa_scores(np.array(selections))
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from card_library import CardLibrary, CardLibraryError, load_library, validate_library
+from configuration import Configuration
+
+
+MINIMAL_DECK = {
+    "project": {"name": "Web shop", "purpose": "Sell online"},
+    "stakeholders": [{"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": 2}}],
+    "concerns": [{"card_id": 1, "concern": "Breach", "design_decisions": {"Encrypt": {"Security": 3}}}],
+}
+
+
+def write_deck(tmp_path, deck):
+    path = tmp_path / "deck.json"
+    path.write_text(json.dumps(deck), encoding="utf-8")
+    return str(path)
+
+
+def test_minimal_deck_loads(tmp_path):
+    library = load_library(write_deck(tmp_path, MINIMAL_DECK), cache=False)
+
+    assert [card.card_id for card in library.table["concerns"]] == [1]
+    assert library.options_affecting("Security")[0][1:] == ("Encrypt", 3)
+
+
+def test_missing_card_id_is_a_library_error(tmp_path):
+    deck = json.loads(json.dumps(MINIMAL_DECK))
+    del deck["concerns"][0]["card_id"]
+
+    with pytest.raises(CardLibraryError) as error:
+        load_library(write_deck(tmp_path, deck), cache=False)
+    assert error.value.errors == ["concerns[0].card_id: expected a non-negative integer"]
+
+
+def deck_with(**changes):
+    deck = json.loads(json.dumps(MINIMAL_DECK))
+    deck.update(changes)
+    return deck
+
+
+@pytest.mark.parametrize("deck, error", [
+    ([], "expected an object with project, stakeholders, concerns and, optionally, players and events"),
+    (deck_with(rules={}), "unknown sections rules"),
+    (deck_with(project={"name": "Web shop", "purpose": "Sell online", "budget": 1}), "project: unknown fields budget"),
+    (deck_with(project={"name": " ", "purpose": "Sell online"}), "project.name: expected a non-empty string"),
+    (deck_with(players=[{"first_name": "Ada", "last_name": "Lovelace"}]),
+     "players: number of players must be between 2 and 4"),
+    (deck_with(stakeholders=[]), "stakeholders: number of stakeholders must be between 1 and 2"),
+    (deck_with(stakeholders=[{"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": 6}}]),
+     "stakeholders[0].quality_attributes.Security: expected an integer priority between 1 and 5"),
+    (deck_with(stakeholders=[{"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": True}}]),
+     "stakeholders[0].quality_attributes.Security: expected an integer priority between 1 and 5"),
+    (deck_with(concerns=[{"card_id": 1, "concern": "Breach", "design_decisions": {"Security": 128}}]),
+     "concerns[0].design_decisions.Security: expected an integer impact between -128 and 127"),
+    (deck_with(concerns=[{"card_id": 1, "concern": "Breach", "design_decisions": {}}]),
+     "concerns[0].design_decisions: expected a non-empty object of quality attribute impacts"),
+    (deck_with(concerns=[{"card_id": 1, "concern": "Breach", "design_decisions": {"Encrypt": {"Security": 3}},
+                          "cost": 2}]),
+     "concerns[0]: unknown fields cost"),
+    (deck_with(events=[{"title": "Audit", "description": "An audit", "consequence": "Fines",
+                        "quality_attributes": "Security"}]),
+     "events[0].quality_attributes: expected a list of quality attribute names"),
+])
+def test_invalid_library_is_rejected(deck, error):
+    errors = validate_library(deck, Configuration())
+
+    assert error in errors
+    with pytest.raises(CardLibraryError) as raised:
+        CardLibrary.from_data(deck)
+    assert raised.value.errors == errors
+
+
+def test_duplicate_card_ids_are_rejected():
+    concern = MINIMAL_DECK["concerns"][0]
+
+    errors = validate_library(deck_with(concerns=[concern, dict(concern, concern="Leak")]), Configuration())
+
+    assert errors == ["concerns[1].card_id: duplicate card id 1"]
+
+
+def test_every_problem_is_reported(tmp_path):
+    deck = deck_with(project={"name": ""}, concerns=[{"card_id": -1, "concern": "Breach",
+                                                      "design_decisions": {"Encrypt": {"Security": 3}}}])
+
+    with pytest.raises(CardLibraryError) as error:
+        load_library(write_deck(tmp_path, deck), cache=False)
+    assert error.value.errors == [
+        "project.name: expected a non-empty string",
+        "project.purpose: expected a non-empty string",
+        "concerns[0].card_id: expected a non-negative integer",
+    ]
+
+
+def test_invalid_json_is_a_library_error(tmp_path):
+    path = tmp_path / "deck.json"
+    path.write_text("{", encoding="utf-8")
+
+    with pytest.raises(CardLibraryError):
+        load_library(str(path), cache=False)
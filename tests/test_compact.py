@@ -0,0 +1,85 @@
+import pytest
+
+from compact import GameSnapshot, pack_impacts, unpack_impacts
+from simulator import load_table
+
+
+TABLE = {
+    "players": [{"first_name": "Ada", "last_name": "Lovelace"}, {"first_name": "Alan", "last_name": "Turing"}],
+    "project": {"name": "Web shop", "purpose": "Sell online"},
+    "stakeholders": [
+        {"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": 2, "Cost": 1}},
+        {"role": "User", "goal": "Ease", "quality_attributes": {"Usability": 3}},
+    ],
+    "concerns": [
+        {"card_id": 7, "concern": "Breach", "design_decisions": {"Encrypt": {"Security": 3, "Cost": -2},
+                                                                 "Ignore": {"Cost": 1}}},
+        {"card_id": 0, "concern": "Login", "design_decisions": {"Usability": -1, "Security": 127}},
+    ],
+    "events": [
+        {"title": "Audit", "description": "An audit", "consequence": "Fines", "quality_attributes": ["Security"]},
+        {"title": "Outage", "description": "Down", "consequence": "Angry users"},
+    ],
+}
+
+
+def test_snapshot_round_trip():
+    table = load_table(TABLE)
+    decisions = [{"Security": 3, "Cost": -2}, {"Usability": -1, "Security": 127}, {"Legacy": -128}]
+
+    snapshot = GameSnapshot.loads(GameSnapshot(table, decisions, 2).dumps())
+
+    assert snapshot.decisions == decisions
+    assert snapshot.current_concern_index == 2
+    restored = snapshot.table
+    assert [(p.first_name, p.last_name) for p in restored["players"]] == [("Ada", "Lovelace"), ("Alan", "Turing")]
+    assert (restored["project"].name, restored["project"].purpose) == ("Web shop", "Sell online")
+    assert [(s.role, s.goal, s.quality_attributes) for s in restored["stakeholders"]] == \
+        [(s.role, s.goal, s.quality_attributes) for s in table["stakeholders"]]
+    assert [(c.card_id, c.concern, c.design_decisions) for c in restored["concerns"]] == \
+        [(c.card_id, c.concern, c.design_decisions) for c in table["concerns"]]
+    assert restored["concerns"][1].design_options() == table["concerns"][1].design_options()
+    assert [(e.title, e.description, e.consequence, list(e.quality_attributes)) for e in restored["events"]] == \
+        [("Audit", "An audit", "Fines", ["Security"]), ("Outage", "Down", "Angry users", [])]
+
+
+def test_snapshots_of_a_table_share_the_cards():
+    table = load_table(TABLE)
+    first = GameSnapshot.loads(GameSnapshot(table, [], 0).dumps())
+    second = GameSnapshot.loads(GameSnapshot(table, [{"Cost": 1}], 1).dumps())
+
+    assert first.table is second.table
+
+
+def test_impact_out_of_range_raises_overflow():
+    table = load_table(TABLE)
+    with pytest.raises(OverflowError):
+        GameSnapshot(table, [{"Cost": 128}], 1).dumps()
+    with pytest.raises(OverflowError):
+        GameSnapshot(table, [{"Cost": -129}], 1).dumps()
+
+
+def test_not_a_snapshot():
+    with pytest.raises(ValueError):
+        GameSnapshot.loads(b"\0" * 16)
+
+
+def test_pack_impacts_round_trip():
+    codes = {"Security": 0, "Cost": 1, "Usability": 2}
+    impacts = {"Usability": -3, "Security": 5}
+
+    attributes, values = pack_impacts(impacts, codes)
+
+    assert unpack_impacts(attributes, values, list(codes)) == impacts
+
+
+def test_table_changed_in_place_is_encoded_again():
+    table = load_table(TABLE)
+    GameSnapshot(table).dumps()
+    table["concerns"] = table["concerns"][:1]
+    table["project"].name = "Bookshop"
+
+    restored = GameSnapshot.loads(GameSnapshot(table).dumps()).table
+
+    assert [card.card_id for card in restored["concerns"]] == [7]
+    assert restored["project"].name == "Bookshop"
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from conftest import STAKEHOLDERS, SUGGESTION
+
+
+def test_chains_are_prepared_once_per_template_and_system_prompt(make_assistant, monkeypatch):
+    assistant = make_assistant()
+    built = []
+    monkeypatch.setattr(assistant, "create_chain", lambda template: built.append(template) or object())
+
+    chain = assistant.get_chain("suggestion")
+    assert assistant.get_chain("suggestion") is chain
+    assert assistant.get_chain("review_suggestion") is not chain
+    assert len(built) == 2
+
+    # a new system prompt or a re-registered template prepares a new chain
+    assistant.template = "You are a terse assistant."
+    assert assistant.get_chain("suggestion") is not chain
+    assistant.register_template("suggestion", "Suggest for {project_description}.")
+    assistant.get_chain("suggestion")
+    assert built[-1] == "Suggest for {project_description}."
+    assert len(built) == 4
+
+    with pytest.raises(KeyError):
+        assistant.get_chain("unknown")
+
+
+def test_prompts_are_rendered_without_langchain(make_assistant):
+    assistant = make_assistant()
+    assistant.register_template("greeting", "Hello {player}.")
+    assert assistant.render_prompt("greeting", player="Ada") == "Human: Hello Ada."
+
+    prompt = assistant.render_prompt(
+        "suggestion", project_description="Web shop: Sell online", stakeholders_info=STAKEHOLDERS,
+        current_design_decisions="No decisions yet.", current_qa_scores="Security: 0", ongoing_events="No events.",
+        concern_card_description="Breach", design_options={"Encrypt": {"Security": 3}}, examples="")
+    assert prompt.startswith("Human: ") and "Web shop: Sell online" in prompt and "Breach" in prompt
+
+
+def test_async_requests_run_concurrently_up_to_the_bound(stub, make_assistant):
+    stub.first_token_delay = 0.2
+    assistant = make_assistant(configuration={"max_concurrent_requests": 2})
+    peak = 0
+
+    async def games():
+        nonlocal peak
+        calls = asyncio.gather(*(assistant.aextract_suggestion_chain(**dict(SUGGESTION, ongoing_events=f"Event {i}."))
+                                 for i in range(6)))
+        calls = asyncio.ensure_future(calls)
+        while not calls.done():
+            peak = max(peak, assistant.running_requests)
+            await asyncio.sleep(0.01)
+        return calls.result()
+
+    start = time.monotonic()
+    suggestions = asyncio.run(games())
+    elapsed = time.monotonic() - start
+
+    assert suggestions == [stub.response] * 6
+    assert stub.requests == 6
+    assert peak == 2
+    # three rounds of two requests, rather than six one after the other
+    assert 0.55 < elapsed < 1.1
+
+
+def test_async_review_suggestion(stub, make_assistant):
+    assistant = make_assistant()
+    review = asyncio.run(assistant.aextract_review_suggestion_chain(
+        "Web shop: Sell online", STAKEHOLDERS, "Breach: Encrypt", "Security: 3", "Audit."))
+    assert review == stub.response
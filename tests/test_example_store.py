@@ -0,0 +1,118 @@
+import asyncio
+import json
+import random
+
+from conftest import SUGGESTION
+from example_store import ExampleStore, FewShotExample, load_example_store
+from game_journal import GameJournal
+from simulator import load_table
+
+
+EXAMPLES = [
+    FewShotExample("Database breach exposes customer data",
+                   {"Encrypt records": {"Security": 3, "Cost": -1}, "Accept risk": {"Cost": 1}}, "Encrypt records"),
+    FewShotExample("Checkout page is slow at peak load",
+                   {"Add a cache": {"Performance": 2, "Cost": -1}, "Buy servers": {"Performance": 1, "Cost": -2}},
+                   "Add a cache"),
+    FewShotExample("Login form is hard to use on phones",
+                   {"Redesign form": {"Usability": 2, "Cost": -1}, "Keep form": {}}, "Redesign form"),
+    FewShotExample("Backups are never tested", {"Test restores": {"Availability": 2}, "Skip": {}}, "Test restores"),
+]
+
+BREACH = ("Customer data breach in the database", {"Encrypt data": {"Security": 2, "Cost": -1}, "Do nothing": {}})
+
+
+def make_store(examples=EXAMPLES, **settings):
+    store = ExampleStore(**settings)
+    for example in examples:
+        store.add(example)
+    return store
+
+
+def test_the_most_similar_examples_are_selected_first():
+    store = make_store()
+
+    selected = store.select(*BREACH)
+
+    assert selected[0] is EXAMPLES[0]
+    assert EXAMPLES[3] not in selected
+    assert store.select("Quarterly party planning", {"Pizza": {"Morale": 1}}) == []
+    assert store.stats()["selections"] == 2
+
+
+def test_selection_is_bounded_by_k_and_the_token_budget():
+    store = make_store(k=3)
+    assert len(store.select("Slow login and data breach", {"Cache": {"Performance": 1}}, k=1)) == 1
+    assert store.select(*BREACH, token_budget=EXAMPLES[0].tokens - 1)[:1] != [EXAMPLES[0]]
+    assert sum(example.tokens for example in store.select(*BREACH, token_budget=40)) <= 40
+
+
+def test_examples_with_the_same_features_are_shown_once():
+    concern, options = EXAMPLES[0].concern, EXAMPLES[0].options
+    taken = [FewShotExample(concern, options, option, source="game.daj")
+             for option in ("Accept risk", "Accept risk", "Encrypt records")]
+
+    store = make_store(taken)
+    assert store.stats()["profiles"] == 1
+    assert [example.option for example in store.select(*BREACH)] == ["Accept risk"]
+
+    store.add(FewShotExample(concern, options, "Encrypt records", "Encrypt, breaches are costly."))
+    assert [example.answer for example in store.select(*BREACH)] == ["Encrypt, breaches are costly."]
+
+
+def test_dense_and_sparse_features_select_the_same_examples():
+    rng = random.Random(0)
+    words = [f"w{i}" for i in range(40)]
+    attributes = ["Security", "Cost", "Performance", "Usability", "Availability"]
+
+    def random_card():
+        concern = " ".join(rng.sample(words, 4))
+        options = {f"{rng.choice(words)} option {i}": {rng.choice(attributes): rng.choice([-2, -1, 1, 2])}
+                   for i in range(2)}
+        return concern, options
+
+    examples = [FewShotExample(*random_card(), option=f"o{i}") for i in range(300)]
+    dense, sparse = make_store(examples, k=5, dense_features=128), make_store(examples, k=5, dense_features=0)
+    for _ in range(50):
+        concern, options = random_card()
+        assert [example.text for example in dense.select(concern, options)] == \
+            [example.text for example in sparse.select(concern, options)]
+
+
+def test_examples_are_loaded_from_files_and_journals(tmp_path):
+    examples_path = tmp_path / "examples.json"
+    examples_path.write_text(json.dumps({"examples": [
+        {"concern": "Backups are never tested", "options": ["Test restores", "Skip"], "option": "Test restores"}]}))
+    journal_path = str(tmp_path / "game.daj")
+    table = load_table({
+        "players": [{"first_name": "Ada", "last_name": "Lovelace"}],
+        "project": {"name": "Web shop", "purpose": "Sell online"},
+        "stakeholders": [{"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": 2, "Cost": 1}}],
+        "concerns": [{"card_id": 1, "concern": "Database breach",
+                      "design_decisions": {"Cheap": {"Cost": 2}, "Safe": {"Security": 3, "Cost": -1}}}],
+    })
+    with GameJournal(journal_path) as journal:
+        journal.start(table, 0.0, 1800.0)
+        journal.suggestion(0, "Take Safe, security first.")
+        journal.decision(0, {"Security": 3, "Cost": -1}, [{"Security": 3, "Cost": -1}], option="Safe")
+        journal.end(2)
+
+    store = load_example_store([str(examples_path), journal_path])
+
+    assert [(example.option, example.source) for example in store.examples] == \
+        [("Test restores", "expert"), ("Safe", journal_path)]
+    assert store.examples[1].answer == "Take Safe, security first."
+    assert store.examples[1].priorities == {"Security": 2, "Cost": 1}
+    assert ExampleStore().add_journal(journal_path, min_score=3) == 0
+
+
+def test_selected_examples_are_sent_in_the_suggestion_prompt(stub, make_assistant):
+    prompts = []
+    completion = stub._completion
+    stub._completion = lambda request: prompts.append(request["prompt"]) or completion(request)
+    assistant = make_assistant(example_store=make_store())
+
+    asyncio.run(assistant.aextract_suggestion_chain(**dict(SUGGESTION, concern_card_description=BREACH[0])))
+
+    assert "Examples of Past Decisions on Similar Concerns" in prompts[0]
+    assert EXAMPLES[0].text in prompts[0]
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from game_journal import DECISION, END, GameJournal, JournalError, JournalReader, restore
+from simulator import load_table
+
+
+TABLE = {
+    "players": [{"first_name": "Ada", "last_name": "Lovelace"}],
+    "project": {"name": "Web shop", "purpose": "Sell online"},
+    "stakeholders": [{"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": 2, "Cost": 1}}],
+    "concerns": [
+        {"card_id": card_id, "concern": f"Concern {card_id}",
+         "design_decisions": {"Cheap": {"Cost": 2}, "Safe": {"Security": 3, "Cost": -1}}}
+        for card_id in range(6)
+    ],
+}
+
+
+def record_game(path, decisions, snapshot_interval=2, end=None):
+    table = load_table(TABLE)
+    taken = []
+    with GameJournal(path, snapshot_interval) as journal:
+        journal.start(table, 0.0, 1800.0)
+        for index, decision in enumerate(decisions):
+            journal.turn(0, index, float(index))
+            taken.append(decision)
+            journal.decision(index, decision, taken)
+        if end is not None:
+            journal.end(end)
+    return taken
+
+
+def test_restore_replays_after_the_latest_snapshot(tmp_path):
+    path = str(tmp_path / "game.daj")
+    decisions = record_game(path, [{"Cost": 2}, {"Security": 3, "Cost": -1}, {"Cost": 2}])
+
+    reader = JournalReader(path)
+    assert len(reader.snapshots) == 1
+    assert [kind for kind, _, _ in reader.tail()].count(DECISION) == 1
+
+    state = restore(path)
+    assert state.decisions == decisions
+    assert state.current_concern_index == 3
+    assert (state.start_time, state.end_time) == (0.0, 1800.0)
+    assert [card.card_id for card in state.table["concerns"]] == list(range(6))
+    assert not state.finished
+
+
+def test_start_only_journal_restores_the_cards(tmp_path):
+    path = str(tmp_path / "game.daj")
+    record_game(path, [])
+
+    reader = JournalReader(path)
+    assert reader.started and not reader.snapshots
+    state = restore(path)
+    assert state.decisions == [] and state.current_concern_index == 0
+    assert state.table["project"].name == "Web shop"
+    assert state.table["players"][0].first_name == "Ada"
+
+
+def test_torn_tail_is_ignored_then_cut_off_on_reopen(tmp_path):
+    path = str(tmp_path / "game.daj")
+    decisions = record_game(path, [{"Cost": 2}, {"Cost": 2}, {"Security": 3, "Cost": -1}])
+    complete = os.path.getsize(path)
+    with open(path, "ab") as journal_file:
+        # the header and half the payload of a record, as left by a crash mid-write
+        journal_file.write(bytes([DECISION, 40, 0, 0, 0, 1, 2, 3, 4]) + b'{"concern_index":3')
+
+    reader = JournalReader(path)
+    assert reader.end == complete
+    assert restore(path).decisions == decisions
+
+    with GameJournal(path, 2) as journal:
+        assert os.path.getsize(path) == complete
+        journal.decision(3, {"Cost": 2}, decisions + [{"Cost": 2}])
+    state = restore(path)
+    assert state.decisions == decisions + [{"Cost": 2}]
+    assert state.current_concern_index == 4
+
+
+def test_corrupted_record_ends_the_journal(tmp_path):
+    path = str(tmp_path / "game.daj")
+    record_game(path, [{"Cost": 2}])
+    with open(path, "r+b") as journal_file:
+        journal_file.seek(-1, os.SEEK_END)
+        journal_file.write(b"\0")
+
+    assert [kind for kind, _, _ in JournalReader(path).all()].count(DECISION) == 0
+
+
+def test_finished_game_keeps_its_score(tmp_path):
+    path = str(tmp_path / "game.daj")
+    record_game(path, [{"Cost": 2}], end=3)
+
+    reader = JournalReader(path)
+    assert reader.ended and reader.records[-1][0] == END
+    state = restore(path)
+    assert state.finished and state.score == 3
+
+
+def test_not_a_journal(tmp_path):
+    path = tmp_path / "game.daj"
+    path.write_bytes(b"nope")
+    with pytest.raises(JournalError):
+        restore(str(path))
+    path.write_bytes(b"DAJ1")
+    with pytest.raises(JournalError):
+        restore(str(path))
@@ -0,0 +1,136 @@
+import asyncio
+import http.client
+import json
+
+import pytest
+
+from game_server import GameServer
+
+
+TABLE = {
+    "players": [{"first_name": "Ada", "last_name": "Lovelace"}, {"first_name": "Alan", "last_name": "Turing"}],
+    "project": {"name": "Web shop", "purpose": "Sell online"},
+    "stakeholders": [{"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": 2, "Cost": 1}}],
+    "concerns": [
+        {"card_id": 1, "concern": "Breach", "design_decisions": {"Encrypt": {"Security": 3}, "Ignore": {"Cost": 1}}},
+        {"card_id": 2, "concern": "Load", "design_decisions": {"Cache": {"Cost": -1}, "Scale": {"Cost": 2}}},
+    ],
+    "events": [
+        {"title": "Audit", "description": "An audit", "consequence": "Fines", "quality_attributes": ["Security"]},
+        {"title": "Outage", "description": "Down", "consequence": "Angry users", "quality_attributes": ["Uptime"]},
+    ],
+}
+
+
+def send(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8") if body is not None else b""
+        connection.request(method, path, data, {"Content-Length": str(len(data))})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def serve(make_assistant, scenario):
+    # runs the scenario, a coroutine function of the server and a request function, against a running server
+    async def main():
+        server = GameServer(make_assistant(), port=0)
+        await server.start()
+        loop = asyncio.get_running_loop()
+
+        def request(method, path, body=None):
+            return loop.run_in_executor(None, send, server.port, method, path, body)
+
+        try:
+            return await scenario(server, request)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+def test_game_is_played_through_the_api(stub, make_assistant):
+    async def scenario(server, request):
+        status, state = await request("POST", "/tables", TABLE)
+        assert status == 201 and state["options"] == ["Encrypt", "Ignore"]
+        table = f"/tables/{state['table_id']}"
+
+        status, answer = await request("POST", f"{table}/suggestion", {})
+        assert (status, answer["suggestion"]) == (200, stub.response)
+        status, answer = await request("POST", f"{table}/suggestion", {"structured": True, "priority": "prefetch"})
+        assert status == 200 and answer["suggestion"]["option"] == "Encrypt"
+
+        status, state = await request("POST", f"{table}/decision", {"option": answer["suggestion"]["option"]})
+        assert (status, state["qa_scores"]["Security"], state["played"]) == (200, 3, 1)
+
+        status, answer = await request("POST", f"{table}/review", {"event": 1})
+        assert (status, answer) == (200, {"review": None, "affected_decisions": 0})
+        status, answer = await request("POST", f"{table}/review", {"event": 0})
+        assert (status, answer) == (200, {"review": stub.response, "affected_decisions": 1})
+
+        status, metrics = await request("GET", "/metrics")
+        assert status == 200 and metrics["active_tables"] == 1
+        assert (await request("DELETE", table))[0] == 200
+        assert (await request("GET", table))[0] == 404
+
+    serve(make_assistant, scenario)
+
+
+@pytest.mark.parametrize("method, path, body, status", [
+    ("POST", "/tables", {"project": {"name": "Web shop"}}, 400),
+    ("POST", "/tables", b"{", 400),
+    ("POST", "/tables", [1], 400),
+    ("GET", "/nowhere", None, 404),
+    ("GET", "/tables/unknown", None, 404),
+])
+def test_bad_requests_are_answered_with_an_error(make_assistant, method, path, body, status):
+    async def scenario(server, request):
+        return await request(method, path, body)
+
+    answer = serve(make_assistant, scenario)
+    assert answer[0] == status and "error" in answer[1]
+
+
+@pytest.mark.parametrize("action, body", [
+    ("suggestion", {"priority": "urgent"}),
+    ("suggestion", {"priority": 1}),
+    ("suggestion", {"timeout": "soon"}),
+    ("suggestion", {"structured": "yes"}),
+    ("decision", {"option": "Unknown"}),
+    ("decision", {"option": ["Encrypt"]}),
+    ("review", {"event": 5}),
+])
+def test_invalid_table_requests_are_bad_requests(make_assistant, action, body):
+    async def scenario(server, request):
+        table = server.create_table(TABLE)
+        return await request("POST", f"/tables/{table.table_id}/{action}", body)
+
+    status, answer = serve(make_assistant, scenario)
+    assert status == 400 and "error" in answer
+
+
+def test_unexpected_errors_are_internal_errors(make_assistant):
+    async def scenario(server, request):
+        table = server.create_table(TABLE)
+        table.state = lambda: 1 / 0
+        return await request("GET", f"/tables/{table.table_id}")
+
+    status, answer = serve(make_assistant, scenario)
+    assert status == 500 and "ZeroDivisionError" in answer["error"]
+
+
+def test_review_reports_its_own_event_during_a_concurrent_suggestion(stub, make_assistant):
+    stub.first_token_delay = 0.2
+
+    async def scenario(server, request):
+        table = server.create_table(TABLE)
+        table.decide("Encrypt")
+        path = f"/tables/{table.table_id}"
+        return await asyncio.gather(request("POST", f"{path}/review", {"event": 0}),
+                                    request("POST", f"{path}/suggestion", {}))
+
+    (review_status, review), (suggestion_status, _) = serve(make_assistant, scenario)
+    assert (review_status, suggestion_status) == (200, 200)
+    assert review == {"review": stub.response, "affected_decisions": 1}
@@ -0,0 +1,82 @@
+import socket
+import threading
+import time
+
+from instrumentation import Instrumentation, MetricsRegistry, OTLPSpanSink
+
+
+def test_registry_breaks_metrics_down_by_key_attributes():
+    registry = MetricsRegistry()
+    instrumentation = Instrumentation(registry)
+    instrumentation.record("assistant.call", 1.0, template="suggestion", model="a", cache="hit")
+    instrumentation.record("assistant.call", 3.0, template="suggestion", model="b")
+    instrumentation.record("assistant.call", 5.0, model="b", template="suggestion", attempt=2)
+    instrumentation.count("server.reviews_skipped", table="t1")
+    instrumentation.count("server.reviews_skipped", table="t2")
+    instrumentation.count("server.reviews_skipped", table="t2")
+    instrumentation.count("assistant.fallbacks")
+    instrumentation.observe("ollama.tokens_per_second", 40.0, model="a")
+
+    snapshot = registry.snapshot()
+    stages = snapshot["stages"]
+    assert stages["assistant.call"]["count"] == 3 and stages["assistant.call"]["mean"] == 3.0
+    assert stages["assistant.call{model=a,template=suggestion}"]["count"] == 1
+    assert stages["assistant.call{model=b,template=suggestion}"]["mean"] == 4.0
+    assert len(stages) == 3
+    assert snapshot["counters"] == {"server.reviews_skipped": 3, "server.reviews_skipped{table=t1}": 1,
+                                    "server.reviews_skipped{table=t2}": 2, "assistant.fallbacks": 1}
+    assert snapshot["values"]["ollama.tokens_per_second{model=a}"]["max"] == 40.0
+
+
+def test_registry_keys_are_configurable():
+    registry = MetricsRegistry(keys=("priority",))
+    Instrumentation(registry).count("scheduler.dropped", priority=2, model="a")
+    assert registry.snapshot()["counters"] == {"scheduler.dropped": 1, "scheduler.dropped{priority=2}": 1}
+
+
+def test_otlp_emit_does_not_wait_for_the_export():
+    sink = OTLPSpanSink(batch_size=2)
+    exported = []
+    release = threading.Event()
+
+    def export(spans):
+        release.wait(5)
+        exported.extend(spans)
+
+    sink._export = export
+    instrumentation = Instrumentation(sink)
+    start = time.monotonic()
+    for _ in range(5):
+        with instrumentation.span("game.turn", table="t1"):
+            pass
+    assert time.monotonic() - start < 1
+    assert exported == []
+    release.set()
+    instrumentation.close()
+    assert len(exported) == 5 and sink.dropped == 0
+    assert {"key": "table", "value": {"stringValue": "t1"}} in exported[0]["attributes"]
+
+
+def test_otlp_drops_batches_beyond_max_pending():
+    sink = OTLPSpanSink(batch_size=1, max_pending=1)
+    release = threading.Event()
+    sink._export = lambda spans: release.wait(5)
+    instrumentation = Instrumentation(sink)
+    for _ in range(4):
+        instrumentation.record("game.turn", 0.1)
+    # at most one batch is being exported and one is waiting, the others find the queue full
+    assert sink.dropped in (2, 3)
+    release.set()
+    instrumentation.close()
+
+
+def test_otlp_counts_spans_the_collector_did_not_receive():
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        port = listener.getsockname()[1]
+    sink = OTLPSpanSink(endpoint=f"http://127.0.0.1:{port}/v1/traces", batch_size=2)
+    instrumentation = Instrumentation(sink)
+    for _ in range(3):
+        instrumentation.record("game.turn", 0.1)
+    instrumentation.close()
+    assert sink.dropped == 3
@@ -0,0 +1,187 @@
+import pytest
+
+from ollama_client import OllamaError
+from ollama_pool import CLOSED, HALF_OPEN, OPEN, NoBackendAvailable, OllamaPool
+
+
+class FakeClient:
+    def __init__(self, name):
+        self.name = name
+        self.down = False
+        self.prompts = []
+
+    def _answer(self, prompt, context):
+        self.prompts.append(prompt)
+        if self.down:
+            raise ConnectionRefusedError(f"{self.name} is down")
+        return {"response": self.name, "context": list(context or ()) + [len(self.prompts)], "done": True}
+
+    def generate(self, prompt, context=None, system=None, format=None, **options):
+        return self._answer(prompt, context)
+
+    def stream(self, prompt, context=None, system=None, format=None, **options):
+        answer = self._answer(prompt, context)
+        yield {"response": answer["response"], "done": False}
+        yield {"response": "", "context": answer["context"], "done": True}
+
+    def tags(self):
+        if self.down:
+            raise ConnectionRefusedError(f"{self.name} is down")
+        return ["llama2:latest"]
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def pool():
+    pool = OllamaPool(["http://a", "http://b"], "llama2", probe_interval=None, failure_threshold=2,
+                      reset_timeout=30.0, retries=0)
+    for backend in pool.backends:
+        backend.client = FakeClient(backend.url)
+    yield pool
+    pool.close()
+
+
+def clients(pool):
+    return [backend.client for backend in pool.backends]
+
+
+def fail(pool, backend, times):
+    # sends requests to one backend only, by keeping the other one busy
+    other = pool.backends[1 - pool.backends.index(backend)]
+    other.outstanding += 100
+    backend.client.down = True
+    for _ in range(times):
+        with pytest.raises(ConnectionRefusedError):
+            pool.generate("hello")
+    backend.client.down = False
+    other.outstanding -= 100
+
+
+def expire(pool, backend):
+    backend.opened_at -= pool.reset_timeout
+
+
+def test_circuit_opens_after_consecutive_failures(pool):
+    a, b = pool.backends
+
+    fail(pool, a, 1)
+    assert a.state == CLOSED
+    fail(pool, a, 1)
+    assert a.state == OPEN and a.consecutive_failures == 2
+
+    for _ in range(3):
+        assert pool.generate("hello")["response"] == "http://b"
+    assert a.failures == 2 and b.completed == 3
+
+
+def test_success_resets_the_failure_count(pool):
+    a, _ = pool.backends
+    fail(pool, a, 1)
+    pool.backends[1].outstanding += 100
+    pool.generate("hello")
+    pool.backends[1].outstanding -= 100
+    fail(pool, a, 1)
+
+    assert a.state == CLOSED and a.consecutive_failures == 1
+
+
+def test_request_errors_do_not_count_against_the_backend(pool):
+    a, _ = pool.backends
+
+    def bad_request(prompt, context=None, system=None, format=None, **options):
+        raise OllamaError("model not found", status=404)
+
+    a.client.generate = bad_request
+    pool.backends[1].outstanding += 100
+    for _ in range(3):
+        with pytest.raises(OllamaError):
+            pool.generate("hello")
+
+    assert a.state == CLOSED and a.failures == 0
+
+
+def test_open_circuit_lets_a_single_trial_through_after_the_reset_timeout(pool):
+    a, b = pool.backends
+    fail(pool, a, 2)
+    expire(pool, a)
+    b.outstanding += 100
+
+    # the trial request is in flight: the half-open backend takes no other request
+    chosen = pool._choose("llama2", [])
+    assert chosen is a and a.state == HALF_OPEN
+    assert pool._choose("llama2", []) is b
+    pool._finish(b, 0.0)
+    pool._finish(a, 0.0)
+
+    assert a.state == CLOSED and a.consecutive_failures == 0
+
+
+def test_failed_trial_opens_the_circuit_again(pool):
+    a, b = pool.backends
+    fail(pool, a, 2)
+    expire(pool, a)
+
+    fail(pool, a, 1)
+    assert a.state == OPEN
+
+    # the circuit waits another reset_timeout
+    b.outstanding += 100
+    assert pool.generate("hello")["response"] == "http://b"
+    b.state = OPEN
+    b.opened_at = a.opened_at
+    with pytest.raises(NoBackendAvailable):
+        pool.generate("hello")
+    assert len(a.client.prompts) == 3
+
+
+def test_successful_probe_only_half_opens_the_circuit(pool):
+    a, b = pool.backends
+    fail(pool, a, 2)
+
+    pool.probe()
+
+    assert a.state == HALF_OPEN
+    b.outstanding += 100
+    pool.generate("hello")
+    assert a.state == CLOSED
+
+
+def test_failed_probes_open_the_circuit(pool):
+    a, b = pool.backends
+    a.client.down = True
+
+    pool.probe()
+    pool.probe()
+
+    assert a.state == OPEN and b.state == CLOSED
+    assert pool.tags() == ["llama2"]
+
+
+def test_failed_request_is_retried_on_another_backend(pool):
+    a, b = pool.backends
+    pool.retries = 1
+    a.client.down = True
+    b.outstanding += 1
+
+    assert pool.generate("hello")["response"] == "http://b"
+    assert (a.failures, a.retried, b.completed) == (1, 1, 1)
+
+
+def test_context_goes_back_to_its_backend(pool):
+    a, b = pool.backends
+    b.outstanding += 1
+    first = pool.generate("hello")
+    assert first["response"] == "http://a"
+    b.outstanding -= 1
+    a.outstanding += 1
+
+    assert pool.generate("again", context=first["context"])["response"] == "http://a"
+    chunks = list(pool.stream("more", context=first["context"]))
+    assert chunks[0]["response"] == "http://a"
+
+    # an open circuit sends the context elsewhere
+    a.outstanding -= 1
+    fail(pool, a, 2)
+    assert pool.generate("again", context=first["context"])["response"] == "http://b"
@@ -0,0 +1,118 @@
+import builtins
+import threading
+import time
+
+from conftest import STAKEHOLDERS
+from instrumentation import Instrumentation
+from main import DecidArchGame
+from models import ConcernCard, Player, ProjectCard
+from prefetch import SuggestionPrefetcher
+from scheduler import PREFETCH, current_scheduling
+
+
+class Records:
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+    def counted(self, name):
+        return sum(record["value"] for record in self.records if record["type"] == "counter" and record["name"] == name)
+
+
+def test_take_returns_the_speculation_of_the_same_inputs():
+    prefetcher = SuggestionPrefetcher(lambda **inputs: f"for {inputs['card']}")
+
+    prefetcher.prefetch(card=1)
+    assert prefetcher.take(timeout=5, card=1) == "for 1"
+    prefetcher.prefetch(card=2)
+    assert prefetcher.take(timeout=5, card=3) is None
+    assert prefetcher.take(timeout=5, card=2) is None
+    assert (prefetcher.hits, prefetcher.misses) == (1, 2)
+    prefetcher.close()
+
+
+def test_speculation_is_scheduled_as_a_prefetch_with_a_deadline():
+    contexts = []
+    prefetcher = SuggestionPrefetcher(lambda **inputs: contexts.append(current_scheduling()), timeout=10)
+
+    prefetcher.prefetch(card=1)
+    prefetcher.take(timeout=5, card=1)
+
+    assert contexts[0]["priority"] == PREFETCH
+    assert 9 < contexts[0]["deadline"] - time.monotonic() <= 10
+    prefetcher.close()
+
+
+def test_running_stale_speculation_does_not_hold_up_the_next_one():
+    release = threading.Event()
+
+    def fetch(card):
+        if card == 1:
+            release.wait(5)
+        return f"for {card}"
+
+    prefetcher = SuggestionPrefetcher(fetch)
+    prefetcher.prefetch(card=1)
+    time.sleep(0.05)
+    prefetcher.prefetch(card=2)
+
+    assert prefetcher.take(timeout=1, card=2) == "for 2"
+    release.set()
+    prefetcher.close()
+
+
+def make_game(make_assistant, deadline):
+    records = Records()
+    game = DecidArchGame()
+    game.configuration.suggestion_deadline = deadline
+    game.players = [Player("Ada", "Lovelace"), Player("Alan", "Turing")]
+    game.project_card = ProjectCard("Web shop", "Sell online")
+    game.stakeholder_cards = list(STAKEHOLDERS)
+    game.concern_cards = [ConcernCard(card_id, f"Concern {card_id}", {"Encrypt": {"Security": 3, "Cost": -1},
+                                                                      "Ignore": {"Cost": 1}})
+                          for card_id in range(3)]
+    game.reset_score_state()
+    game._assistant = make_assistant(instrumentation=Instrumentation(records))
+    game._session = game._assistant.start_session()
+    return game, records
+
+
+def test_turn_deadline_covers_the_wait_for_a_failing_prefetch(make_assistant, monkeypatch, capsys):
+    game, _ = make_game(make_assistant, deadline=0.3)
+
+    def fetch(**inputs):
+        time.sleep(0.5)
+        raise ConnectionError("Ollama is down")
+
+    game._prefetcher = SuggestionPrefetcher(fetch)
+    game._prefetcher.prefetch(**game.suggestion_inputs(game.concern_cards[0]))
+    monkeypatch.setattr(builtins, "input", lambda prompt: "2")
+
+    start = time.monotonic()
+    game.play_turn(game.players[0])
+
+    assert time.monotonic() - start < 0.45
+    assert "Suggestion: Suggested design option: Ignore." in capsys.readouterr().out
+    assert game.decision_template == [{"Cost": 1}]
+    game.prefetcher.close()
+
+
+def test_tokens_saved_are_counted_once_per_turn(make_assistant, monkeypatch, capsys):
+    game, records = make_game(make_assistant, deadline=5)
+    game._prefetcher = SuggestionPrefetcher(lambda **inputs: "prefetched")
+    monkeypatch.setattr(builtins, "input", lambda prompt: "1")
+
+    saved = []
+    for player in game.players:
+        game.suggestion_inputs(game.concern_cards[game.current_concern_index])
+        saved.append(game.context_builder.last_report["tokens_saved"])
+        game.play_turn(player)
+
+    assert records.counted("prompt.tokens_saved") == sum(saved)
+    assert "Suggestion: prefetched" in capsys.readouterr().out
+    game.prefetcher.close()
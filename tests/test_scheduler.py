@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scheduler import BATCH, INTERACTIVE, PREFETCH, DeadlineExceeded, LLMScheduler, SchedulerOverloaded
+
+
+class Counters:
+    def __init__(self):
+        self.counts = {}
+        self.records = []
+
+    def count(self, name, **attributes):
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def record(self, name, value, **attributes):
+        self.records.append(name)
+
+
+# requests in arrival order: (session, priority)
+ARRIVALS = [("a", BATCH), ("a", INTERACTIVE), ("a", INTERACTIVE), ("a", INTERACTIVE), ("b", PREFETCH),
+            ("b", INTERACTIVE), ("c", INTERACTIVE), ("c", BATCH)]
+# strict priority, then round-robin across the sessions in their order of arrival
+SERVED = [("a", INTERACTIVE), ("b", INTERACTIVE), ("c", INTERACTIVE), ("a", INTERACTIVE), ("a", INTERACTIVE),
+          ("b", PREFETCH), ("a", BATCH), ("c", BATCH)]
+
+
+def wait_until(condition):
+    limit = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < limit
+        time.sleep(0.001)
+
+
+def test_blocking_requests_are_served_by_priority_then_round_robin():
+    instrumentation = Counters()
+    scheduler = LLMScheduler(max_concurrent=1, max_queued_per_session=4, instrumentation=instrumentation)
+    served = []
+
+    def request(session, priority):
+        with scheduler.slot(session, priority):
+            served.append((session, priority))
+
+    scheduler.acquire()
+    threads = []
+    for number, (session, priority) in enumerate(ARRIVALS, 1):
+        thread = threading.Thread(target=request, args=(session, priority))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler.queued() == number)
+    scheduler.release()
+    for thread in threads:
+        thread.join(5)
+
+    assert served == SERVED
+    assert scheduler.running == 0 and scheduler.queued() == 0
+    assert instrumentation.records.count("scheduler.wait") == len(ARRIVALS)
+
+
+def test_async_requests_are_served_by_priority_then_round_robin():
+    scheduler = LLMScheduler(max_concurrent=1, max_queued_per_session=4)
+    served = []
+
+    async def request(session, priority):
+        async with scheduler.aslot(session, priority):
+            served.append((session, priority))
+            await asyncio.sleep(0)
+
+    async def main():
+        await scheduler.aacquire()
+        tasks = []
+        for number, (session, priority) in enumerate(ARRIVALS, 1):
+            tasks.append(asyncio.ensure_future(request(session, priority)))
+            while scheduler.queued() < number:
+                await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+
+    asyncio.run(main())
+
+    assert served == SERVED
+    assert scheduler.running == 0 and scheduler.queued() == 0
+
+
+def test_queued_counts_by_priority():
+    scheduler = LLMScheduler(max_concurrent=1)
+    scheduler.acquire()
+    threads = [threading.Thread(target=scheduler.acquire, args=(session, priority))
+               for session, priority in [("a", PREFETCH), ("b", PREFETCH), ("c", BATCH)]]
+    for number, thread in enumerate(threads, 1):
+        thread.start()
+        wait_until(lambda: scheduler.queued() == number)
+
+    assert [scheduler.queued(priority) for priority in (INTERACTIVE, PREFETCH, BATCH)] == [0, 2, 1]
+    # each granted request holds the slot until it is released
+    for thread in threads:
+        scheduler.release()
+        thread.join(5)
+        assert not thread.is_alive()
+    scheduler.release()
+    assert scheduler.running == 0 and scheduler.queued() == 0
+
+
+def test_expired_request_is_dropped_without_leaking_a_slot():
+    instrumentation = Counters()
+    scheduler = LLMScheduler(max_concurrent=1, instrumentation=instrumentation)
+    scheduler.acquire()
+
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire("a", deadline=time.monotonic() + 0.05)
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scheduler.aacquire("a", deadline=time.monotonic() + 0.05))
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire("a", deadline=time.monotonic() - 1)
+
+    assert scheduler.queued() == 0
+    scheduler.release()
+    assert scheduler.running == 0
+    assert instrumentation.counts == {"scheduler.dropped": 3}
+    with scheduler.slot("a", deadline=time.monotonic() + 1):
+        assert scheduler.running == 1
+
+
+def test_request_expiring_in_the_queue_is_skipped():
+    scheduler = LLMScheduler(max_concurrent=1)
+    served = []
+    errors = []
+
+    def request(session, deadline):
+        try:
+            with scheduler.slot(session, deadline=deadline):
+                served.append(session)
+        except DeadlineExceeded:
+            errors.append(session)
+
+    scheduler.acquire()
+    late = threading.Thread(target=request, args=("late", time.monotonic() + 0.05))
+    late.start()
+    wait_until(lambda: scheduler.queued() == 1)
+    on_time = threading.Thread(target=request, args=("on time", None))
+    on_time.start()
+    wait_until(lambda: scheduler.queued() == 2)
+    late.join(5)
+    scheduler.release()
+    on_time.join(5)
+
+    assert (served, errors) == (["on time"], ["late"])
+    assert scheduler.running == 0 and scheduler.queued() == 0
+
+
+def test_full_queues_refuse_requests():
+    instrumentation = Counters()
+    scheduler = LLMScheduler(max_concurrent=1, max_queued=3, max_queued_per_session=2,
+                             instrumentation=instrumentation)
+    scheduler.acquire()
+    threads = [threading.Thread(target=scheduler.acquire, args=(session,)) for session in ("a", "a", "b")]
+    for number, thread in enumerate(threads[:2], 1):
+        thread.start()
+        wait_until(lambda: scheduler.queued() == number)
+
+    with pytest.raises(SchedulerOverloaded, match="this session"):
+        asyncio.run(scheduler.aacquire("a"))
+    threads[2].start()
+    wait_until(lambda: scheduler.queued() == 3)
+    with pytest.raises(SchedulerOverloaded, match="Too many queued LLM requests.$"):
+        scheduler.acquire("c")
+
+    assert instrumentation.counts == {"scheduler.rejected": 2}
+    # each granted request holds the slot until it is released, the second "a" after "b"
+    for thread in (threads[0], threads[2], threads[1]):
+        scheduler.release()
+        thread.join(5)
+        assert not thread.is_alive()
+    scheduler.release()
+    assert scheduler.running == 0 and scheduler.queued() == 0
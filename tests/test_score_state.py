@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from models import StakeholderCard
+from score_state import ScoreState
+
+
+STAKEHOLDERS = [
+    StakeholderCard("Owner", "Profit", {"Security": 2, "Cost": 1}),
+    StakeholderCard("User", "Ease", {"Usability": 3, "Security": 1}),
+]
+
+
+def random_decision(rng):
+    return {attr: rng.randint(-2, 3) for attr in rng.sample(["Security", "Cost", "Usability", "Performance"], 2)}
+
+
+def recomputed(decisions):
+    state = ScoreState(STAKEHOLDERS)
+    for decision in decisions:
+        state.append(decision)
+    return state
+
+
+def assert_consistent(state, decisions):
+    expected = recomputed(decisions)
+    assert state.decisions == decisions
+    assert {attr: score for attr, score in state.qa_scores.items() if score} == \
+        {attr: score for attr, score in expected.qa_scores.items() if score}
+    assert state.score() == expected.score()
+    assert state.decisions_by_attribute == expected.decisions_by_attribute
+    assert state.decisions_text() == expected.decisions_text()
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_append_revise_undo_match_recomputation(seed):
+    rng = random.Random(seed)
+    state = ScoreState(STAKEHOLDERS)
+    # the decisions after each operation, to check undo against
+    history = [[]]
+    for _ in range(40):
+        operation = rng.random()
+        if operation < 0.5 or not state.decisions:
+            state.append(random_decision(rng))
+        elif operation < 0.8:
+            state.revise(rng.randrange(len(state.decisions)), random_decision(rng))
+        else:
+            state.undo()
+            history.pop()
+            assert_consistent(state, history[-1])
+            continue
+        history.append(list(state.decisions))
+        assert_consistent(state, history[-1])
+
+    while len(history) > 1:
+        state.undo()
+        history.pop()
+        assert_consistent(state, history[-1])
+    with pytest.raises(IndexError):
+        state.undo()
+
+
+def test_negative_score_loses_until_revised():
+    state = ScoreState(STAKEHOLDERS)
+    state.append({"Security": 4, "Usability": 4})
+    assert state.score() == (4 - 2) + (4 - 1) + (4 - 3)
+    state.append({"Cost": -1})
+    assert state.score() == -1
+    state.revise(1, {"Cost": 2})
+    assert state.score() == (4 - 2) + (4 - 1) + (4 - 3) + (2 - 1)
+    assert state.decisions_affecting(["Cost"]) == [1]
+    state.undo()
+    assert state.score() == -1
@@ -0,0 +1,89 @@
+import asyncio
+
+import semantic_cache
+from conftest import SUGGESTION
+from semantic_cache import SemanticSuggestionCache, canonical_text, mentioned_option, parse_scores
+
+
+def near(**changes):
+    return dict(SUGGESTION, **changes)
+
+
+def test_requests_are_canonicalized():
+    assert canonical_text("  Breach!  of the   DB.") == "breach of the db."
+    assert parse_scores("Security: 1, Cost: -2") == {"security": 1, "cost": -2}
+    assert parse_scores({"Security": "3"}) == {"security": 3}
+    assert mentioned_option("I suggest ignore, not encrypt.", ["Encrypt", "Ignore"]) == "Ignore"
+    assert mentioned_option("No idea.", ["Encrypt", "Ignore"]) is None
+
+
+def test_near_duplicates_are_answered_from_the_cache():
+    cache = SemanticSuggestionCache()
+    cache.store(cache.state("ns", **SUGGESTION), "Ignore it.")
+
+    match = cache.lookup(cache.state("ns", **near(concern_card_description="BREACH!",
+                                                 current_qa_scores="Security: 1, Cost: 0, Usability: 0")))
+    assert match.suggestion == "Ignore it." and match.similarity > 0.99
+    assert cache.stats()["hits"] == 1
+
+
+def test_requests_that_differ_in_structure_are_not_answered():
+    cache = SemanticSuggestionCache()
+    cache.store(cache.state("ns", **SUGGESTION), "Ignore it.")
+
+    for request, namespace in [
+        (SUGGESTION, "other model"),
+        (near(current_qa_scores="Security: 2, Cost: 0, Usability: 0"), "ns"),
+        (near(current_qa_scores="Security: 0, Cost: -1, Usability: 0"), "ns"),
+        (near(current_qa_scores="Security: 0, Cost: 0"), "ns"),
+        (near(design_options={"Encrypt": {"Security": 2, "Cost": -1}, "Ignore": {"Cost": 1}}), "ns"),
+        (near(project_description="Hospital records: keep patient data for decades"), "ns"),
+    ]:
+        assert cache.lookup(cache.state(namespace, **request)) is None
+    assert cache.stats()["misses"] == 6
+
+
+def test_false_hits_found_by_an_audit_are_replaced():
+    cache = SemanticSuggestionCache(audit_rate=1.0)
+    state = cache.state("ns", **SUGGESTION)
+    cache.store(state, "Encrypt the data.")
+    match = cache.lookup(state)
+
+    assert cache.should_audit()
+    assert not cache.audit(state, match, "Encrypt, as before.")
+    assert cache.audit(state, match, "Ignore it.")
+
+    assert cache.lookup(state).suggestion == "Ignore it."
+    stats = cache.stats()
+    assert (stats["audits"], stats["false_hits"], stats["false_hit_rate"], stats["size"]) == (2, 1, 0.5, 1)
+
+
+def test_entries_persist_and_are_evicted_by_last_use(monkeypatch, tmp_path):
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: next(clock))
+    path = str(tmp_path / "semantic.db")
+    # only identical texts are similar enough, so that each event has its own entry
+    cache = SemanticSuggestionCache(path, threshold=0.999, max_size=2)
+    for event in ("Audit.", "Outage."):
+        cache.store(cache.state("ns", **near(ongoing_events=event)), f"After {event}")
+    cache.lookup(cache.state("ns", **near(ongoing_events="Audit.")))
+    cache.store(cache.state("ns", **near(ongoing_events="Layoffs.")), "After Layoffs.")
+    cache.close()
+
+    cache = SemanticSuggestionCache(path, threshold=0.999, max_size=2)
+    assert cache.stats()["size"] == 2
+    assert cache.lookup(cache.state("ns", **near(ongoing_events="Outage."))) is None
+    assert cache.lookup(cache.state("ns", **near(ongoing_events="Audit."))).suggestion == "After Audit."
+    cache.close()
+
+
+def test_assistant_answers_near_duplicates_without_the_model(stub, make_assistant):
+    assistant = make_assistant(semantic_cache=SemanticSuggestionCache())
+
+    first = asyncio.run(assistant.aextract_suggestion_chain(**SUGGESTION))
+    second = asyncio.run(assistant.aextract_suggestion_chain(**near(concern_card_description="breach")))
+
+    assert first == second == stub.response
+    assert stub.requests == 1
+    counters = assistant.instrumentation.registry.snapshot()["counters"]
+    assert (counters["assistant.semantic_misses"], counters["assistant.semantic_hits"]) == (1, 1)
@@ -0,0 +1,66 @@
+import random
+
+import pytest
+
+from simulator import POLICIES, SimulatedGame, load_table, simulate, summarize
+
+
+TABLE = {
+    "project": {"name": "Web shop", "purpose": "Sell online"},
+    "stakeholders": [
+        {"role": "Owner", "goal": "Profit", "quality_attributes": {"Security": 2, "Cost": 1}},
+        {"role": "User", "goal": "Ease", "quality_attributes": {"Usability": 1}},
+    ],
+    "concerns": [
+        {"card_id": 1, "concern": "Breach", "design_decisions": {"Encrypt": {"Security": 3, "Cost": -1},
+                                                                 "Ignore": {"Cost": 1}}},
+        {"card_id": 2, "concern": "Load", "design_decisions": {"Cache": {"Cost": -1, "Usability": 2},
+                                                               "Scale": {"Cost": 2}}},
+        {"card_id": 3, "concern": "Login", "design_decisions": {"SSO": {"Usability": 2, "Security": 1},
+                                                                "Password": {"Security": -1, "Cost": 1}}},
+    ],
+}
+
+
+def test_simulation_is_reproducible_whatever_the_workers():
+    in_process = simulate(TABLE, "random", 200, seed=3, workers=1, chunk_size=30)
+    pooled = simulate(TABLE, "random", 200, seed=3, workers=2, chunk_size=30)
+
+    assert in_process == pooled
+    assert in_process["games"] == 200 and sum(in_process["distribution"].values()) == 200
+
+
+def test_optimal_policy_scores_at_least_as_well_as_the_others():
+    results = {name: simulate(TABLE, name, 50, workers=1) for name in ("random", "greedy", "advisor", "optimal")}
+
+    optimal = results["optimal"]
+    assert optimal["loss_rate"] == 0 and optimal["min"] == optimal["max"]
+    for name, result in results.items():
+        assert result["max"] <= optimal["max"], name
+
+
+def test_game_stops_when_the_time_is_over():
+    game = SimulatedGame(load_table(TABLE), random.Random(0))
+
+    result = game.play(POLICIES["greedy"], turn_duration=(1000.0, 1000.0))
+
+    assert result["played"] == 2 and result["duration"] == 2000.0
+
+
+def test_summary_of_no_games():
+    summary = summarize([])
+
+    assert summary["games"] == 0 and summary["distribution"] == {}
+    assert summary["mean"] is None and summary["loss_rate"] is None
+    assert simulate(TABLE, "greedy", 0, workers=1) == summary
+
+
+def test_summary_of_one_game():
+    summary = summarize([{"score": -1, "played": 2, "duration": 10.0}])
+
+    assert (summary["p50"], summary["p95"], summary["loss_rate"], summary["mean_played"]) == (-1, -1, 1.0, 2)
+
+
+def test_unknown_policy():
+    with pytest.raises(KeyError):
+        simulate(TABLE, "clairvoyant", 1, workers=1)
@@ -0,0 +1,68 @@
+import itertools
+import random
+
+import pytest
+
+from models import ConcernCard, StakeholderCard
+from score_state import ScoreState
+from solver import DecisionSolver
+
+
+ATTRIBUTES = ("Security", "Cost", "Performance", "Usability")
+
+
+def random_game(rng):
+    stakeholders = [
+        StakeholderCard(f"S{i}", "goal", {attr: rng.randint(1, 5) for attr in rng.sample(ATTRIBUTES, 2)})
+        for i in range(2)
+    ]
+    concerns = []
+    for card_id in range(rng.randint(1, 5)):
+        options = {
+            f"O{option}": {attr: rng.randint(-3, 3) for attr in rng.sample(ATTRIBUTES, rng.randint(1, 3))}
+            for option in range(rng.randint(1, 3))
+        }
+        concerns.append(ConcernCard(card_id, f"C{card_id}", options))
+    return stakeholders, concerns
+
+
+def brute_force(stakeholders, concerns, qa_scores):
+    best = None
+    for choices in itertools.product(*[list(card.design_options()) for card in concerns]):
+        state = ScoreState(stakeholders)
+        state.append(dict(qa_scores))
+        for card, choice in zip(concerns, choices):
+            state.append(card.design_options()[choice])
+        best = state.score() if best is None else max(best, state.score())
+    return best
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_solver_matches_brute_force(seed):
+    rng = random.Random(seed)
+    stakeholders, concerns = random_game(rng)
+    qa_scores = {attr: rng.randint(-1, 2) for attr in rng.sample(ATTRIBUTES + ("Legacy",), 2)}
+
+    solution = DecisionSolver(stakeholders, concerns).solve(qa_scores)
+
+    assert solution.score == brute_force(stakeholders, concerns, qa_scores)
+    # the reported choices reach the reported score
+    state = ScoreState(stakeholders)
+    state.append(dict(qa_scores))
+    for card, choice in zip(concerns, solution.choices):
+        state.append(card.design_options()[choice])
+    assert state.score() == solution.score
+
+
+def test_negative_carried_over_attribute_loses():
+    stakeholders = [StakeholderCard("Owner", "g", {"A": 1})]
+    concerns = [ConcernCard(1, "c", {"Up": {"A": 2}, "Down": {"A": -1}})]
+    state = ScoreState(stakeholders)
+    state.append({"Cost": -2})
+
+    solution = DecisionSolver(stakeholders, concerns).solve({"A": 0, "Cost": -2})
+
+    assert solution.score == -1
+    assert solution.qa_scores["Cost"] == -2
+    state.append(dict(concerns[0].design_options()[solution.choices[0]]))
+    assert state.score() == solution.score
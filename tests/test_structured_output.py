@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from conftest import SUGGESTION
+from structured_output import SuggestionFormatError, match_option, parse_suggestion, suggestion_schema
+
+
+OPTIONS = ["Encrypt data", "Use a CDN", "Use a cache"]
+
+
+def test_options_are_matched_leniently_but_unambiguously():
+    assert match_option("Use a CDN", OPTIONS) == "Use a CDN"
+    assert match_option("  encrypt DATA! ", OPTIONS) == "Encrypt data"
+    assert match_option("CDN", OPTIONS) == "Use a CDN"
+    assert match_option("Option: Use a cache", OPTIONS) == "Use a cache"
+    with pytest.raises(SuggestionFormatError):
+        match_option("Use a", OPTIONS)
+    with pytest.raises(SuggestionFormatError):
+        match_option("Rewrite everything", OPTIONS)
+    with pytest.raises(SuggestionFormatError):
+        match_option("", OPTIONS)
+
+
+def test_answers_are_parsed_from_json_even_when_wrapped():
+    suggestion = parse_suggestion('{"option": "cdn", "rationale": " Faster pages. "}', OPTIONS)
+    assert (suggestion.option, suggestion.rationale, suggestion.source) == ("Use a CDN", "Faster pages.", "llm")
+
+    wrapped = 'Here you go:\n```json\n{"option": "Encrypt data", "rationale": "Protects users."}\n```'
+    assert parse_suggestion(wrapped, OPTIONS).option == "Encrypt data"
+    assert suggestion.to_dict() == {"option": "Use a CDN", "rationale": "Faster pages.", "source": "llm",
+                                    "attempts": 1}
+
+
+@pytest.mark.parametrize("text", [
+    "Use a CDN because it is faster.",
+    '["Use a CDN"]',
+    '{"option": 3, "rationale": "Faster."}',
+    '{"option": "Use a CDN", "rationale": " "}',
+    '{"option": "Rewrite", "rationale": "Faster."}',
+])
+def test_unusable_answers_are_refused(text):
+    with pytest.raises(SuggestionFormatError):
+        parse_suggestion(text, OPTIONS)
+
+
+def test_schema_restricts_the_option_to_the_design_options():
+    schema = suggestion_schema(OPTIONS)
+    assert schema["properties"]["option"]["enum"] == OPTIONS
+    assert schema["required"] == ["option", "rationale"]
+
+
+def malformed_first(stub, count):
+    completion = stub._completion
+    answers = []
+
+    def answer(request):
+        answers.append(request)
+        return "I would encrypt." if len(answers) <= count else completion(request)
+
+    stub._completion = answer
+    return answers
+
+
+def test_structured_suggestion_from_the_model(stub, make_assistant):
+    assistant = make_assistant()
+    suggestion = asyncio.run(assistant.aextract_structured_suggestion(**SUGGESTION))
+    # the stub answers with the first option of the schema
+    assert (suggestion.option, suggestion.rationale, suggestion.attempts) == ("Encrypt", stub.response, 1)
+
+
+def test_malformed_answers_are_asked_again_a_bounded_number_of_times(stub, make_assistant):
+    assistant = make_assistant(configuration={"structured_output_retries": 2})
+
+    answers = malformed_first(stub, 1)
+    suggestion = asyncio.run(assistant.aextract_structured_suggestion(**SUGGESTION))
+    assert (suggestion.option, suggestion.attempts) == ("Encrypt", 2)
+    assert "could not be used" in answers[1]["prompt"]
+
+    answers = malformed_first(stub, 3)
+    with pytest.raises(SuggestionFormatError):
+        asyncio.run(assistant.aextract_structured_suggestion(**SUGGESTION))
+    assert len(answers) == 3
+    counters = assistant.instrumentation.registry.snapshot()["counters"]
+    assert counters["assistant.malformed_outputs"] == 4
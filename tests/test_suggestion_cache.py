@@ -0,0 +1,92 @@
+import asyncio
+import sqlite3
+
+import suggestion_cache
+from conftest import SUGGESTION
+from suggestion_cache import LRUSuggestionCache, SQLiteSuggestionCache, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_keys_do_not_depend_on_dict_order():
+    key = make_cache_key("m", "t", "s", options={"A": 1, "B": 2}, scores="x")
+    assert make_cache_key("m", "t", "s", scores="x", options={"B": 2, "A": 1}) == key
+    assert make_cache_key("other", "t", "s", options={"A": 1, "B": 2}, scores="x") != key
+    assert make_cache_key("m", "t2", "s", options={"A": 1, "B": 2}, scores="x") != key
+
+
+def test_lru_evicts_the_least_recently_used_entry():
+    cache = LRUSuggestionCache(max_size=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2, "hit_rate": 0.75}
+
+
+def test_entries_expire_after_their_ttl(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(suggestion_cache.time, "time", clock)
+    for cache in (LRUSuggestionCache(ttl=10), SQLiteSuggestionCache(str(tmp_path / "cache.db"), ttl=10)):
+        cache.set("a", "A")
+        clock.now += 5
+        assert cache.get("a") == "A"
+        clock.now += 6
+        assert cache.get("a") is None
+        assert cache.stats()["size"] == 0
+
+
+def test_sqlite_cache_persists_across_connections(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteSuggestionCache(path)
+    cache.set("a", "A")
+    cache.close()
+
+    cache = SQLiteSuggestionCache(path)
+    assert cache.get("a") == "A"
+    cache.clear()
+    assert cache.stats() == {"hits": 0, "misses": 0, "size": 0, "hit_rate": 0.0}
+    cache.close()
+
+
+def test_sqlite_hits_are_written_before_the_next_eviction(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(suggestion_cache.time, "time", clock)
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteSuggestionCache(path, max_size=2)
+    cache.set("a", "A")
+    clock.now += 1
+    cache.set("b", "B")
+    clock.now += 1
+    assert cache.get("a") == "A"
+
+    # the hit is kept in memory, not written
+    with sqlite3.connect(path) as reader:
+        assert reader.execute("SELECT used_at FROM suggestions WHERE key = 'a'").fetchone() == (1000.0,)
+
+    clock.now += 1
+    cache.set("c", "C")
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("A", None, "C")
+    cache.close()
+
+
+def test_identical_requests_are_answered_from_the_cache(stub, make_assistant):
+    assistant = make_assistant(suggestion_cache=LRUSuggestionCache())
+
+    first = asyncio.run(assistant.aextract_suggestion_chain(**SUGGESTION))
+    second = asyncio.run(assistant.aextract_suggestion_chain(**SUGGESTION))
+    other = asyncio.run(assistant.aextract_suggestion_chain(**dict(SUGGESTION, ongoing_events="Audit.")))
+
+    assert first == second == stub.response
+    assert other == stub.response
+    assert stub.requests == 2
+    assert assistant.suggestion_cache.stats()["hits"] == 1
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from conftest import SUGGESTION
+from suggestion_cache import LRUSuggestionCache
+
+
+def test_suggestion_is_streamed_token_by_token(stub, make_assistant):
+    stub.first_token_delay = 0.1
+    stub.token_delay = 0.01
+    assistant = make_assistant(suggestion_cache=LRUSuggestionCache())
+
+    stream = assistant.stream_suggestion_chain(**SUGGESTION, deadline=time.monotonic() + 5)
+    pieces = list(stream)
+
+    assert len(pieces) == len(stub.response.split(" ")) > 1
+    assert "".join(pieces) == stream.text == stub.response
+    assert not stream.used_fallback
+    assert 0.1 <= stream.time_to_first_token < stream.total_time
+    assert stream.metadata["eval_count"] == len(pieces)
+    stages = assistant.instrumentation.registry.snapshot()["stages"]
+    assert stages["assistant.time_to_first_token"]["count"] == 1
+
+    # the completed stream was cached and is replayed as a single piece
+    cached = assistant.stream_suggestion_chain(**SUGGESTION)
+    assert list(cached) == [stub.response]
+    assert stub.requests == 1
+
+
+def test_suggestion_is_streamed_asynchronously(stub, make_assistant):
+    stub.first_token_delay = 0.1
+    assistant = make_assistant()
+
+    async def read():
+        stream = assistant.astream_suggestion_chain(**SUGGESTION)
+        return stream, [piece async for piece in stream]
+
+    stream, pieces = asyncio.run(read())
+    assert "".join(pieces) == stub.response and len(pieces) > 1
+    assert 0.1 <= stream.time_to_first_token <= stream.total_time